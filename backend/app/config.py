@@ -9,7 +9,35 @@ if env_path.exists():
     load_dotenv(env_path)
 
 RPC_URL = os.getenv("RPC_URL") or os.getenv("SEPOLIA_RPC_URL")
+# Nhiều RPC endpoint (comma-separated), request được định tuyến tới endpoint khoẻ nhất.
+# Mặc định chỉ có RPC_URL.
+RPC_URLS = [u.strip() for u in (os.getenv("RPC_URLS") or "").split(",") if u.strip()]
+if not RPC_URLS and RPC_URL:
+    RPC_URLS = [RPC_URL]
+RPC_URL = RPC_URL or (RPC_URLS[0] if RPC_URLS else None)
+# Timeout mỗi HTTP request (giây)
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", 10))
+# Số keep-alive connection giữ cho mỗi RPC endpoint (HTTP session dùng chung trong process)
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", 20))
+# Read chưa có response sau khoảng này (ms) được gửi thêm tới endpoint thứ hai
+RPC_HEDGE_DELAY_MS = float(os.getenv("RPC_HEDGE_DELAY_MS", 300))
+# Endpoint lỗi liên tiếp bị xếp cuối trong khoảng này (giây)
+RPC_ERROR_COOLDOWN = float(os.getenv("RPC_ERROR_COOLDOWN", 30))
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dev.db")
+
+# SQLite: busy timeout (ms), page cache (KiB), mmap (bytes); reader pool cho request handlers
+# (writer là một connection riêng, chờ tối đa SQLITE_WRITER_POOL_TIMEOUT giây)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", 8))
+SQLITE_READ_POOL_OVERFLOW = int(os.getenv("SQLITE_READ_POOL_OVERFLOW", 8))
+SQLITE_WRITER_POOL_TIMEOUT = float(os.getenv("SQLITE_WRITER_POOL_TIMEOUT", 30))
+# Writer thread: gom mutation đang chờ thành một commit (đợi thêm tối đa BATCH_WAIT_MS sau mutation đầu)
+DB_WRITER_BATCH_WAIT_MS = float(os.getenv("DB_WRITER_BATCH_WAIT_MS", 2))
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", 256))
+# Queue đầy -> caller bị chặn (backpressure) thay vì dùng thêm bộ nhớ
+DB_WRITER_QUEUE_SIZE = int(os.getenv("DB_WRITER_QUEUE_SIZE", 10000))
 DEPLOYER_PRIVATE_KEY = os.getenv("DEPLOYER_PRIVATE_KEY")
 BACKEND_PORT = int(os.getenv("BACKEND_PORT", 5050))
 CHAIN_ID = int(os.getenv("CHAIN_ID", 11155111))
@@ -17,6 +45,79 @@ CHAIN_ID = int(os.getenv("CHAIN_ID", 11155111))
 # Contract address (required when createOnChain=true)
 DISASTER_FUND_ADDRESS = os.getenv("DISASTER_FUND_ADDRESS")
 
+# Donation event poller
+# Block bắt đầu khi chưa có checkpoint trong DB (mặc định: block hiện tại)
+POLLER_START_BLOCK = int(os.getenv("POLLER_START_BLOCK")) if os.getenv("POLLER_START_BLOCK") else None
+# Số block tối đa quét trong 1 vòng khi đang catch-up sau restart
+POLLER_MAX_BLOCKS_PER_CYCLE = int(os.getenv("POLLER_MAX_BLOCKS_PER_CYCLE", 5000))
+
+# Ingestion mode: "poll" (HTTP polling) hoặc "ws" (eth_subscribe logs qua WebSocket)
+INGESTION_MODE = os.getenv("INGESTION_MODE", "poll").strip().lower()
+WS_RPC_URL = os.getenv("WS_RPC_URL")
+# Runtime của poller: "thread" (Web3 blocking trong daemon thread) hoặc
+# "asyncio" (AsyncWeb3 task trong FastAPI lifespan, chỉ cho INGESTION_MODE=poll)
+INGESTION_RUNTIME = os.getenv("INGESTION_RUNTIME", "thread").strip().lower()
+# Thời gian poll HTTP (giây) trước khi thử kết nối lại WebSocket
+WS_RECONNECT_INTERVAL = int(os.getenv("WS_RECONNECT_INTERVAL", 30))
+
+# Chỉ index các block có ít nhất CONFIRMATION_DEPTH confirmations
+CONFIRMATION_DEPTH = int(os.getenv("CONFIRMATION_DEPTH", 5))
+# Số block gần nhất giữ lại hash để phát hiện reorg / tìm block chung khi rollback
+REORG_WINDOW = int(os.getenv("REORG_WINDOW", 128))
+
+# eth_getLogs chunking (số block mỗi request, tự điều chỉnh trong [MIN, MAX])
+LOG_SCAN_INITIAL_CHUNK = int(os.getenv("LOG_SCAN_INITIAL_CHUNK", 2000))
+LOG_SCAN_MIN_CHUNK = int(os.getenv("LOG_SCAN_MIN_CHUNK", 10))
+LOG_SCAN_MAX_CHUNK = int(os.getenv("LOG_SCAN_MAX_CHUNK", 10000))
+# Số eth_getLogs chạy đồng thời (async ingestion / backfill)
+LOG_SCAN_CONCURRENCY = int(os.getenv("LOG_SCAN_CONCURRENCY", 4))
+# Lỗi rate limit (HTTP 429) khi quét logs: thử lại tối đa N lần, backoff bắt đầu từ X giây (gấp đôi mỗi lần)
+LOG_SCAN_RATE_LIMIT_RETRIES = int(os.getenv("LOG_SCAN_RATE_LIMIT_RETRIES", 6))
+LOG_SCAN_RATE_LIMIT_BACKOFF = float(os.getenv("LOG_SCAN_RATE_LIMIT_BACKOFF", 1))
+
+# Nonce manager: đồng bộ nonce với node tối đa mỗi NONCE_SYNC_INTERVAL giây; transaction đã gửi
+# mà node không thấy sau NONCE_DROP_TIMEOUT giây được coi là bị drop (nonce được cấp lại)
+NONCE_SYNC_INTERVAL = float(os.getenv("NONCE_SYNC_INTERVAL", 30))
+NONCE_DROP_TIMEOUT = float(os.getenv("NONCE_DROP_TIMEOUT", 180))
+
+# Transaction outbox: số thread theo dõi receipt, chu kỳ kiểm tra (giây), số confirmations,
+# thời gian chờ trước khi replace bằng gas price cao hơn và số lần replace / gửi tối đa
+TX_WATCHER_WORKERS = int(os.getenv("TX_WATCHER_WORKERS", 4))
+TX_WATCH_INTERVAL = float(os.getenv("TX_WATCH_INTERVAL", 3))
+TX_CONFIRMATIONS = int(os.getenv("TX_CONFIRMATIONS", 1))
+TX_REPLACE_AFTER = float(os.getenv("TX_REPLACE_AFTER", 180))
+TX_MAX_REPLACEMENTS = int(os.getenv("TX_MAX_REPLACEMENTS", 3))
+TX_MAX_SEND_ATTEMPTS = int(os.getenv("TX_MAX_SEND_ATTEMPTS", 5))
+
+# Fee oracle: chu kỳ lấy mẫu eth_feeHistory (giây), thời gian cache tối đa, số block lấy mẫu;
+# gas limit = estimate_gas của từng transaction cộng thêm GAS_LIMIT_MARGIN (tỉ lệ)
+FEE_ORACLE_INTERVAL = float(os.getenv("FEE_ORACLE_INTERVAL", 4))
+FEE_CACHE_TTL = float(os.getenv("FEE_CACHE_TTL", 12))
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", 10))
+GAS_LIMIT_MARGIN = float(os.getenv("GAS_LIMIT_MARGIN", 0.2))
+
+# Đọc state campaign on-chain: địa chỉ Multicall3 (rỗng = không dùng, chỉ JSON-RPC batch)
+# và số block cũ hơn head mà một kết quả getCampaign còn được dùng lại (0 = chỉ trong cùng block head)
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+CAMPAIGN_STATE_CACHE_BLOCKS = int(os.getenv("CAMPAIGN_STATE_CACHE_BLOCKS", 0))
+
+# Đối soát DB với contract: chu kỳ (giây, 0 = tắt), sai lệch cho phép (wei, tổng DB là số nguyên chính xác),
+# tự backfill campaign bị thiếu event
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", 3600))
+RECONCILE_TOLERANCE_WEI = int(os.getenv("RECONCILE_TOLERANCE_WEI", 0))
+RECONCILE_AUTO_BACKFILL = os.getenv("RECONCILE_AUTO_BACKFILL", "true").lower() in ("1", "true", "yes")
+
+# Điền amount_gwei / amount_wei_rem cho rows cũ: số rows mỗi transaction (chạy nền qua db_writer)
+WEI_BACKFILL_BATCH = int(os.getenv("WEI_BACKFILL_BATCH", 2000))
+
+# Historical backfill: block deploy contract (điểm bắt đầu mặc định), số worker và kích thước mỗi range
+DEPLOY_BLOCK = int(os.getenv("DEPLOY_BLOCK")) if os.getenv("DEPLOY_BLOCK") else None
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", 4))
+BACKFILL_RANGE_SIZE = int(os.getenv("BACKFILL_RANGE_SIZE", 100000))
+
+# Số block timestamp giữ trong LRU cache dùng chung
+BLOCK_TIMESTAMP_CACHE_SIZE = int(os.getenv("BLOCK_TIMESTAMP_CACHE_SIZE", 4096))
+
 # CORS origins (comma-separated)
 # Mặc định cho phép localhost:3000 và 127.0.0.1:3000
 default_origins = "http://localhost:3000,http://127.0.0.1:3000"
@@ -1,11 +1,32 @@
 from sqlmodel import Session, select
-from sqlalchemy import func
-from .models import Campaign, Donation, WithdrawLog, AuditLog
+from sqlalchemy import func, insert, delete, update, bindparam
+from sqlalchemy.dialects import sqlite, postgresql
+from datetime import datetime
+from .models import (
+    Campaign, Donation, WithdrawLog, AuditLog, CampaignTotals, IndexerCheckpoint, IndexedBlock, BackfillJob,
+    BackfillRange, TxOutbox,
+)
+from .services.campaign_resolver import campaign_resolver
+
+WEI_PER_GWEI = 10**9
+
+def wei_parts(amount_wei) -> dict:
+    """amount_gwei / amount_wei_rem (hai INTEGER) của một số wei"""
+    value = int(amount_wei)
+    return {"amount_gwei": value // WEI_PER_GWEI, "amount_wei_rem": value % WEI_PER_GWEI}
+
+def _sum_wei(model):
+    """Hai SUM (gwei, phần dư) - ghép lại bằng _wei(); không tràn INTEGER như SUM trên wei"""
+    return func.coalesce(func.sum(model.amount_gwei), 0), func.coalesce(func.sum(model.amount_wei_rem), 0)
+
+def _wei(gwei, rem) -> int:
+    return int(gwei or 0) * WEI_PER_GWEI + int(rem or 0)
 
 def create_campaign(db: Session, *, campaign: Campaign) -> Campaign:
     db.add(campaign)
     db.commit()
     db.refresh(campaign)
+    campaign_resolver.register(campaign.onchain_id, campaign.id)
     return campaign
 
 def get_campaign(db: Session, campaign_id: int) -> Campaign | None:
@@ -39,8 +60,13 @@ def update_onchain_info(
     c.onchain_id = onchain_id
     db.add(c)
     db.commit()
+    campaign_resolver.register(onchain_id, campaign_id)
 
 def create_donation(db: Session, *, donation: Donation) -> Donation:
+    donation.donor_address_lower = donation.donor_address.lower()
+    for key, value in wei_parts(donation.amount_wei).items():
+        setattr(donation, key, value)
+    _add_donation_totals(db, [donation.dict()])
     db.add(donation)
     db.commit()
     db.refresh(donation)
@@ -60,25 +86,27 @@ def get_donation_by_tx_hash(db: Session, tx_hash: str) -> Donation | None:
     return db.exec(select(Donation).where(Donation.tx_hash == tx_hash)).first()
 
 def get_campaign_stats(db: Session, campaign_id: int):
-    total_raised = db.exec(
-        select(func.sum(Donation.amount_eth))
-        .where(Donation.campaign_id == campaign_id)
-    ).first() or 0.0
-
-    donor_count = db.exec(
-        select(func.count(func.distinct(Donation.donor_address)))
-        .where(Donation.campaign_id == campaign_id)
-    ).first() or 0
-
-    donation_count = db.exec(
-        select(func.count(Donation.id))
-        .where(Donation.campaign_id == campaign_id)
-    ).first() or 0
-    
+    """Stats của campaign từ campaign_totals (một row, không aggregate bảng donation)"""
+    totals = db.get(CampaignTotals, campaign_id)
+    raised_wei = int(totals.total_raised_wei) if totals else 0
+    withdrawn_wei = int(totals.total_withdrawn_wei) if totals else 0
     return {
-        "total_raised": total_raised,
-        "donor_count": donor_count,
-        "donation_count": donation_count,
+        "total_raised": raised_wei / 10**18,
+        "donor_count": totals.donor_count if totals else 0,
+        "donation_count": totals.donation_count if totals else 0,
+        "total_withdrawn": withdrawn_wei / 10**18,
+        "total_raised_wei": raised_wei,
+        "total_withdrawn_wei": withdrawn_wei,
+        "last_block": totals.last_block if totals else None,
+    }
+
+def get_totals_summary(db: Session) -> dict:
+    """Tổng của mọi campaign từ campaign_totals (một row mỗi campaign)"""
+    totals = db.exec(select(CampaignTotals)).all()
+    return {
+        "total_raised_wei": sum(int(t.total_raised_wei) for t in totals),
+        "total_withdrawn_wei": sum(int(t.total_withdrawn_wei) for t in totals),
+        "donation_count": sum(t.donation_count for t in totals),
     }
 
 def update_campaign_status(db: Session, campaign_id: int, status: str) -> None:
@@ -113,7 +141,7 @@ def get_donations_by_donor(db: Session, donor_address: str, limit: int = 100) ->
     return list(
         db.exec(
             select(Donation)
-            .where(func.lower(Donation.donor_address) == normalized_address)
+            .where(Donation.donor_address_lower == normalized_address)
             .order_by(Donation.timestamp.desc())
             .limit(limit)
         ).all()
@@ -121,6 +149,9 @@ def get_donations_by_donor(db: Session, donor_address: str, limit: int = 100) ->
 
 def create_withdraw_log(db: Session, *, withdraw_log: WithdrawLog) -> WithdrawLog:
     """Create a withdraw log entry"""
+    for key, value in wei_parts(withdraw_log.amount_wei).items():
+        setattr(withdraw_log, key, value)
+    _add_withdraw_totals(db, [withdraw_log.dict()])
     db.add(withdraw_log)
     db.commit()
     db.refresh(withdraw_log)
@@ -137,6 +168,99 @@ def get_withdraw_logs_by_campaign(db: Session, campaign_id: int, limit: int = 10
         ).all()
     )
 
+def get_last_event_block(db: Session, model, campaign_id: int) -> int | None:
+    """Block lớn nhất đã index cho campaign (Donation hoặc WithdrawLog), None nếu chưa có"""
+    return db.exec(select(func.max(model.block_number)).where(model.campaign_id == campaign_id)).first()
+
+def get_campaign_event_totals(db: Session, max_block: int | None = None) -> list[dict]:
+    """
+    Tổng donation / withdrawal theo campaign on-chain trong MỘT query (hai subquery GROUP BY join vào campaign).
+    max_block: chỉ tính event tới block này (vd. checkpoint của poller).
+    """
+    donated_gwei, donated_rem = _sum_wei(Donation)
+    withdrawn_gwei, withdrawn_rem = _sum_wei(WithdrawLog)
+    donations = select(
+        Donation.campaign_id.label("campaign_id"),
+        donated_gwei.label("gwei"),
+        donated_rem.label("rem"),
+        func.count(Donation.id).label("count"),
+    )
+    withdrawals = select(
+        WithdrawLog.campaign_id.label("campaign_id"),
+        withdrawn_gwei.label("gwei"),
+        withdrawn_rem.label("rem"),
+        func.count(WithdrawLog.id).label("count"),
+    )
+    if max_block is not None:
+        donations = donations.where(Donation.block_number <= max_block)
+        withdrawals = withdrawals.where(WithdrawLog.block_number <= max_block)
+    d = donations.group_by(Donation.campaign_id).subquery()
+    w = withdrawals.group_by(WithdrawLog.campaign_id).subquery()
+
+    rows = db.exec(
+        select(
+            Campaign.id, Campaign.onchain_id,
+            d.c.gwei, d.c.rem, d.c.count, w.c.gwei, w.c.rem, w.c.count,
+        )
+        .outerjoin(d, d.c.campaign_id == Campaign.id)
+        .outerjoin(w, w.c.campaign_id == Campaign.id)
+        .where(Campaign.onchain_id.isnot(None))
+    ).all()
+    return [
+        {
+            "campaign_id": campaign_id,
+            "onchain_id": onchain_id,
+            "donated_wei": _wei(d_gwei, d_rem),
+            "donation_count": donation_count or 0,
+            "withdrawn_wei": _wei(w_gwei, w_rem),
+            "withdrawal_count": withdrawal_count or 0,
+        }
+        for campaign_id, onchain_id, d_gwei, d_rem, donation_count, w_gwei, w_rem, withdrawal_count in rows
+    ]
+
+def sum_event_wei(db: Session, model, campaign_id: int) -> int:
+    """
+    Tổng wei chính xác của Donation / WithdrawLog thuộc campaign: SUM trong SQL cho các row đã có
+    amount_gwei / amount_wei_rem, cộng amount_wei (chuỗi, chính xác) của các row wei backfill
+    chưa điền tới - tổng không bị thiếu trong lúc backfill đang chạy.
+    """
+    gwei, rem = db.exec(select(*_sum_wei(model)).where(model.campaign_id == campaign_id)).one()
+    pending = db.exec(
+        select(model.amount_wei).where(model.campaign_id == campaign_id).where(model.amount_gwei.is_(None))
+    ).all()
+    return _wei(gwei, rem) + sum(int(amount_wei) for amount_wei in pending)
+
+def has_pending_wei_parts(db: Session) -> bool:
+    """Còn row chưa có amount_gwei / amount_wei_rem (database cũ, backfill chưa xong)"""
+    return any(
+        db.exec(select(model.id).where(model.amount_gwei.is_(None)).limit(1)).first() is not None
+        for model in (Donation, WithdrawLog)
+    )
+
+def backfill_wei_parts(db: Session, model, after_id: int, limit: int) -> int | None:
+    """
+    Điền amount_gwei / amount_wei_rem cho tối đa `limit` rows có id > after_id (duyệt theo id).
+    Không commit. Trả về id cuối đã xét (truyền vào lần gọi sau), None khi đã hết bảng.
+    """
+    rows = db.exec(
+        select(model.id, model.amount_wei, model.amount_gwei)
+        .where(model.id > after_id)
+        .order_by(model.id)
+        .limit(limit)
+    ).all()
+    if not rows:
+        return None
+    params = [{"row_id": row_id, **wei_parts(amount_wei)} for row_id, amount_wei, gwei in rows if gwei is None]
+    if params:
+        table = model.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values(amount_gwei=bindparam("amount_gwei"), amount_wei_rem=bindparam("amount_wei_rem")),
+            params,
+        )
+    return rows[-1][0]
+
 def create_audit_log(db: Session, *, audit_log: AuditLog) -> AuditLog:
     """Create an audit log entry"""
     db.add(audit_log)
@@ -152,3 +276,326 @@ def get_audit_logs(db: Session, limit: int = 100, action: str | None = None, use
     if username:
         query = query.where(AuditLog.username == username)
     return list(db.exec(query.order_by(AuditLog.timestamp.desc()).limit(limit)).all())
+
+
+def _bulk_insert_ignore_tx_hash(db: Session, model, rows: list[dict]) -> int:
+    """
+    INSERT nhiều rows trong transaction hiện tại, bỏ qua rows trùng tx_hash.
+    Không commit - caller quyết định ranh giới transaction.
+    """
+    if not rows:
+        return 0
+    # created_at là default phía Python (default_factory) nên phải tự điền
+    now = datetime.utcnow()
+    rows = [{"created_at": now, **wei_parts(r["amount_wei"]), **r} for r in rows]
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing(index_elements=["tx_hash"])
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing(index_elements=["tx_hash"])
+    else:
+        # Dialect khác: lọc tx_hash đã tồn tại bằng một query
+        existing = set(db.exec(
+            select(model.tx_hash).where(model.tx_hash.in_([r["tx_hash"] for r in rows]))
+        ).all())
+        rows = [r for r in rows if r["tx_hash"] not in existing]
+        if not rows:
+            return 0
+        stmt = insert(table)
+    result = db.execute(stmt, rows)
+    return max(result.rowcount or 0, 0)
+
+def _new_event_rows(db: Session, model, rows: list[dict]) -> list[dict]:
+    """Rows có tx_hash chưa có trong DB (và không trùng trong batch) - chỉ các rows này được cộng vào totals"""
+    unique = list({r["tx_hash"]: r for r in rows}.values())
+    if not unique:
+        return []
+    existing = set(db.exec(
+        select(model.tx_hash).where(model.tx_hash.in_([r["tx_hash"] for r in unique]))
+    ).all())
+    return [r for r in unique if r["tx_hash"] not in existing]
+
+def _load_totals(db: Session, campaign_ids) -> dict[int, CampaignTotals]:
+    """CampaignTotals của các campaign (tạo row mới nếu chưa có), đã add vào session"""
+    ids = set(campaign_ids)
+    totals = {t.campaign_id: t for t in db.exec(select(CampaignTotals).where(CampaignTotals.campaign_id.in_(ids))).all()}
+    for campaign_id in ids - set(totals):
+        totals[campaign_id] = CampaignTotals(campaign_id=campaign_id)
+    now = datetime.utcnow()
+    for t in totals.values():
+        t.updated_at = now
+        db.add(t)
+    return totals
+
+def _add_donation_totals(db: Session, rows: list[dict]) -> None:
+    """
+    Cộng donations mới (chưa insert) vào campaign_totals; donor mới = chưa có donation nào ở campaign đó
+    (so theo donor_address_lower: checksummed và lowercase là cùng một donor, như rebuild_campaign_totals)
+    """
+    if not rows:
+        return
+    campaign_ids = {r["campaign_id"] for r in rows}
+    known_donors = set(db.exec(
+        select(Donation.campaign_id, Donation.donor_address_lower)
+        .where(Donation.campaign_id.in_(campaign_ids))
+        .where(Donation.donor_address_lower.in_({r["donor_address_lower"] for r in rows}))
+        .distinct()
+    ).all())
+    totals = _load_totals(db, campaign_ids)
+    for r in rows:
+        t = totals[r["campaign_id"]]
+        t.total_raised_wei = str(int(t.total_raised_wei) + int(r["amount_wei"]))
+        t.donation_count += 1
+        t.last_block = max(t.last_block, r["block_number"])
+        donor = (r["campaign_id"], r["donor_address_lower"])
+        if donor not in known_donors:
+            known_donors.add(donor)
+            t.donor_count += 1
+
+def _add_withdraw_totals(db: Session, rows: list[dict]) -> None:
+    if not rows:
+        return
+    totals = _load_totals(db, {r["campaign_id"] for r in rows})
+    for r in rows:
+        t = totals[r["campaign_id"]]
+        t.total_withdrawn_wei = str(int(t.total_withdrawn_wei) + int(r["amount_wei"]))
+        t.last_block = max(t.last_block, r["block_number"])
+
+def bulk_insert_donations(db: Session, rows: list[dict]) -> int:
+    """
+    Bulk insert donations (dicts of Donation columns), ignoring duplicate tx_hash.
+    campaign_totals được cập nhật trong cùng transaction.
+    """
+    rows = [{"donor_address_lower": r["donor_address"].lower(), **r} for r in _new_event_rows(db, Donation, rows)]
+    _add_donation_totals(db, rows)
+    return _bulk_insert_ignore_tx_hash(db, Donation, rows)
+
+def bulk_insert_withdraw_logs(db: Session, rows: list[dict]) -> int:
+    """Bulk insert withdraw logs (dicts of WithdrawLog columns), ignoring duplicate tx_hash; cập nhật campaign_totals"""
+    rows = _new_event_rows(db, WithdrawLog, rows)
+    _add_withdraw_totals(db, rows)
+    return _bulk_insert_ignore_tx_hash(db, WithdrawLog, rows)
+
+def rebuild_campaign_totals(db: Session, campaign_ids=None) -> int:
+    """
+    Tính lại campaign_totals từ donation / withdrawlog (tất cả campaign, hoặc chỉ campaign_ids)
+    bằng hai query GROUP BY. Cần amount_gwei / amount_wei_rem đã được điền (xem backfill_wei_parts).
+    Không commit. Trả về số campaign đã ghi.
+    """
+    donated_gwei, donated_rem = _sum_wei(Donation)
+    withdrawn_gwei, withdrawn_rem = _sum_wei(WithdrawLog)
+    donations = select(
+        Donation.campaign_id, donated_gwei, donated_rem, func.count(Donation.id),
+        func.count(func.distinct(Donation.donor_address_lower)), func.max(Donation.block_number),
+    )
+    withdrawals = select(WithdrawLog.campaign_id, withdrawn_gwei, withdrawn_rem, func.max(WithdrawLog.block_number))
+    clear = delete(CampaignTotals)
+    if campaign_ids is not None:
+        campaign_ids = set(campaign_ids)
+        donations = donations.where(Donation.campaign_id.in_(campaign_ids))
+        withdrawals = withdrawals.where(WithdrawLog.campaign_id.in_(campaign_ids))
+        clear = clear.where(CampaignTotals.campaign_id.in_(campaign_ids))
+
+    now = datetime.utcnow()
+    totals: dict[int, dict] = {}
+    def entry(campaign_id: int) -> dict:
+        if campaign_id not in totals:
+            totals[campaign_id] = {
+                "campaign_id": campaign_id, "total_raised_wei": "0", "donation_count": 0, "donor_count": 0,
+                "total_withdrawn_wei": "0", "last_block": 0, "updated_at": now,
+            }
+        return totals[campaign_id]
+
+    for campaign_id, gwei, rem, count, donors, last_block in db.execute(donations.group_by(Donation.campaign_id)):
+        t = entry(campaign_id)
+        t.update(total_raised_wei=str(_wei(gwei, rem)), donation_count=count, donor_count=donors)
+        t["last_block"] = max(t["last_block"], last_block or 0)
+    for campaign_id, gwei, rem, last_block in db.execute(withdrawals.group_by(WithdrawLog.campaign_id)):
+        t = entry(campaign_id)
+        t["total_withdrawn_wei"] = str(_wei(gwei, rem))
+        t["last_block"] = max(t["last_block"], last_block or 0)
+
+    db.execute(clear)
+    # Object CampaignTotals đã load trong session không còn đúng sau khi ghi bằng Core
+    for obj in [o for o in db.identity_map.values() if isinstance(o, CampaignTotals)]:
+        db.expunge(obj)
+    if totals:
+        db.execute(insert(CampaignTotals), list(totals.values()))
+    return len(totals)
+
+def get_indexer_checkpoint(db: Session, contract_address: str) -> IndexerCheckpoint | None:
+    """Get the indexing cursor for a contract address"""
+    return db.exec(
+        select(IndexerCheckpoint).where(IndexerCheckpoint.contract_address == contract_address.lower())
+    ).first()
+
+def save_indexer_checkpoint(db: Session, contract_address: str, last_block: int, commit: bool = True) -> IndexerCheckpoint:
+    """Create or move the indexing cursor for a contract address"""
+    cp = get_indexer_checkpoint(db, contract_address)
+    if not cp:
+        cp = IndexerCheckpoint(contract_address=contract_address.lower(), last_block=last_block)
+    cp.last_block = last_block
+    cp.updated_at = datetime.utcnow()
+    db.add(cp)
+    if commit:
+        db.commit()
+    return cp
+
+
+def record_indexed_block(db: Session, contract_address: str, block_number: int, block_hash: str, keep: int) -> None:
+    """Lưu hash của block đã index và xoá các bản ghi cũ hơn `keep` block. Không commit."""
+    address = contract_address.lower()
+    db.execute(
+        delete(IndexedBlock)
+        .where(IndexedBlock.contract_address == address)
+        .where((IndexedBlock.block_number >= block_number) | (IndexedBlock.block_number < block_number - keep))
+    )
+    db.add(IndexedBlock(contract_address=address, block_number=block_number, block_hash=block_hash.lower()))
+
+def get_indexed_blocks(db: Session, contract_address: str) -> list[IndexedBlock]:
+    """Các block hash đã lưu, mới nhất trước"""
+    return list(db.exec(
+        select(IndexedBlock)
+        .where(IndexedBlock.contract_address == contract_address.lower())
+        .order_by(IndexedBlock.block_number.desc())
+    ).all())
+
+def rollback_indexed_range(db: Session, contract_address: str, ancestor_block: int) -> tuple[int, int]:
+    """
+    Xoá donations/withdrawals và block hash sau ancestor_block, đưa checkpoint về ancestor_block.
+    Trả về (số donations đã xoá, số withdrawals đã xoá).
+    """
+    affected = set(db.exec(select(Donation.campaign_id).where(Donation.block_number > ancestor_block).distinct()).all())
+    affected |= set(db.exec(select(WithdrawLog.campaign_id).where(WithdrawLog.block_number > ancestor_block).distinct()).all())
+    removed_donations = db.execute(delete(Donation).where(Donation.block_number > ancestor_block)).rowcount
+    removed_withdraws = db.execute(delete(WithdrawLog).where(WithdrawLog.block_number > ancestor_block)).rowcount
+    # Reorg hiếm: tính lại totals của các campaign bị ảnh hưởng
+    if affected:
+        rebuild_campaign_totals(db, affected)
+    db.execute(
+        delete(IndexedBlock)
+        .where(IndexedBlock.contract_address == contract_address.lower())
+        .where(IndexedBlock.block_number > ancestor_block)
+    )
+    save_indexer_checkpoint(db, contract_address, ancestor_block, commit=False)
+    db.commit()
+    return removed_donations or 0, removed_withdraws or 0
+
+
+def create_backfill_job(
+    db: Session,
+    contract_address: str,
+    from_block: int,
+    to_block: int,
+    range_size: int,
+    workers: int,
+    requested_by: str | None = None,
+    onchain_campaign_id: int | None = None,
+    drift: str | None = None,
+) -> BackfillJob:
+    """Tạo job backfill và chia [from_block, to_block] thành các range range_size block"""
+    job = BackfillJob(
+        contract_address=contract_address.lower(),
+        onchain_campaign_id=onchain_campaign_id,
+        drift=drift,
+        from_block=from_block,
+        to_block=to_block,
+        workers=workers,
+        requested_by=requested_by,
+    )
+    db.add(job)
+    db.flush()
+    start = from_block
+    while start <= to_block:
+        end = min(to_block, start + range_size - 1)
+        db.add(BackfillRange(job_id=job.id, from_block=start, to_block=end, last_block=start - 1))
+        start = end + 1
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_backfill_job(db: Session, job_id: int) -> BackfillJob | None:
+    return db.get(BackfillJob, job_id)
+
+def list_backfill_jobs(db: Session, limit: int = 20) -> list[BackfillJob]:
+    return list(db.exec(select(BackfillJob).order_by(BackfillJob.id.desc()).limit(limit)).all())
+
+def get_active_backfill_campaigns(db: Session) -> set[int]:
+    """onchain_campaign_id của các backfill theo campaign chưa kết thúc"""
+    return set(db.exec(
+        select(BackfillJob.onchain_campaign_id)
+        .where(BackfillJob.onchain_campaign_id.isnot(None))
+        .where(BackfillJob.status.in_(["pending", "running"]))
+    ).all())
+
+def get_last_reconcile_backfills(db: Session) -> dict[int, BackfillJob]:
+    """Job backfill gần nhất do reconciliation tạo (có drift) cho mỗi onchain_campaign_id"""
+    jobs = db.exec(
+        select(BackfillJob)
+        .where(BackfillJob.onchain_campaign_id.isnot(None))
+        .where(BackfillJob.drift.isnot(None))
+        .order_by(BackfillJob.id)
+    ).all()
+    return {job.onchain_campaign_id: job for job in jobs}
+
+def get_backfill_ranges(db: Session, job_id: int) -> list[BackfillRange]:
+    return list(db.exec(
+        select(BackfillRange).where(BackfillRange.job_id == job_id).order_by(BackfillRange.from_block)
+    ).all())
+
+def update_backfill_status(db: Session, model, row_id: int, status: str, error: str | None = None) -> None:
+    """Đổi status của BackfillJob / BackfillRange"""
+    row = db.get(model, row_id)
+    if not row:
+        return
+    row.status = status
+    row.error = error
+    if isinstance(row, BackfillRange):
+        row.updated_at = datetime.utcnow()
+    elif status in ("completed", "failed"):
+        row.finished_at = datetime.utcnow()
+    db.add(row)
+    db.commit()
+
+
+def create_tx_intent(db: Session, *, intent: TxOutbox) -> TxOutbox:
+    db.add(intent)
+    db.commit()
+    db.refresh(intent)
+    return intent
+
+def get_tx_intent(db: Session, intent_id: int) -> TxOutbox | None:
+    return db.get(TxOutbox, intent_id)
+
+def list_tx_intents(
+    db: Session, statuses: list[str] | None = None, campaign_id: int | None = None, limit: int = 100
+) -> list[TxOutbox]:
+    query = select(TxOutbox)
+    if statuses:
+        query = query.where(TxOutbox.status.in_(statuses))
+    if campaign_id is not None:
+        query = query.where(TxOutbox.campaign_id == campaign_id)
+    return list(db.exec(query.order_by(TxOutbox.id).limit(limit)).all())
+
+def get_pending_withdraw_campaigns(db: Session) -> set[int]:
+    """campaign_id có withdraw intent chưa kết thúc (queued / sent): chưa có trong WithdrawLog"""
+    return set(db.exec(
+        select(TxOutbox.campaign_id)
+        .where(TxOutbox.kind == "withdraw")
+        .where(TxOutbox.campaign_id.isnot(None))
+        .where(TxOutbox.status.in_(["queued", "sent"]))
+    ).all())
+
+def update_tx_intent(db: Session, intent_id: int, commit: bool = True, **kwargs) -> TxOutbox | None:
+    intent = db.get(TxOutbox, intent_id)
+    if not intent:
+        return None
+    for key, value in kwargs.items():
+        setattr(intent, key, value)
+    intent.updated_at = datetime.utcnow()
+    db.add(intent)
+    if commit:
+        db.commit()
+        db.refresh(intent)
+    return intent
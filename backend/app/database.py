@@ -1,14 +1,80 @@
-from sqlmodel import SQLModel, create_engine, Session
-from .config import DATABASE_URL
+from sqlmodel import SQLModel, create_engine, Session, select
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from .config import (
+    DATABASE_URL,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    SQLITE_READ_POOL_SIZE,
+    SQLITE_READ_POOL_OVERFLOW,
+    SQLITE_WRITER_POOL_TIMEOUT,
+)
 from .models import User, PasswordResetOTP  # Import models để SQLModel tạo tables
 import sqlite3
 from pathlib import Path
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+def _is_file_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and url.rstrip("/") not in ("sqlite:", "sqlite")
+
+
+def _sqlite_on_connect(dbapi_connection, connection_record):
+    """
+    Pragmas cho mỗi connection SQLite:
+    - WAL: reader không bị chặn bởi writer (và ngược lại), commit chỉ append vào WAL;
+    - synchronous=NORMAL: fsync ở checkpoint thay vì mỗi commit (an toàn với WAL);
+    - busy_timeout: chờ lock thay vì lỗi "database is locked" ngay;
+    - mmap / cache_size: đọc từ page cache thay vì syscall.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")  # số âm = KiB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _sqlite_writer_on_connect(dbapi_connection, connection_record):
+    _sqlite_on_connect(dbapi_connection, connection_record)
+    # Tự quản lý transaction để mở bằng BEGIN IMMEDIATE (xem _sqlite_writer_begin)
+    dbapi_connection.isolation_level = None
+
+
+def _sqlite_writer_begin(conn):
+    # Lấy write lock ngay đầu transaction: không bị SQLITE_BUSY khi nâng từ read lên write
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+if _is_file_sqlite(DATABASE_URL):
+    # Reader pool cho request handlers + một connection writer cho ingestion commits
+    engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=SQLITE_READ_POOL_OVERFLOW,
+    )
+    event.listen(engine, "connect", _sqlite_on_connect)
+
+    writer_engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=SQLITE_WRITER_POOL_TIMEOUT,
+    )
+    event.listen(writer_engine, "connect", _sqlite_writer_on_connect)
+    event.listen(writer_engine, "begin", _sqlite_writer_begin)
+else:
+    connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+    engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+    writer_engine = engine
 
 def run_migrations():
     """Tự động chạy migration khi cần thiết"""
@@ -20,7 +86,7 @@ def run_migrations():
         return  # Database chưa tồn tại, sẽ được tạo tự động
     
     try:
-        conn = sqlite3.connect(str(db_path))
+        conn = sqlite3.connect(str(db_path), timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
         cursor = conn.cursor()
         
         # Kiểm tra và thêm columns vào campaign
@@ -104,6 +170,60 @@ def run_migrations():
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_withdrawlog_tx_hash ON withdrawlog(tx_hash)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_withdrawlog_campaign_id ON withdrawlog(campaign_id)")
         
+        # Thêm fees (EIP-1559) và raw_tx vào txoutbox
+        try:
+            cursor.execute("PRAGMA table_info(txoutbox)")
+            outbox_columns = [row[1] for row in cursor.fetchall()]
+            if outbox_columns and "fees" not in outbox_columns:
+                cursor.execute("ALTER TABLE txoutbox ADD COLUMN fees TEXT NOT NULL DEFAULT '{}'")
+            if outbox_columns and "raw_tx" not in outbox_columns:
+                cursor.execute("ALTER TABLE txoutbox ADD COLUMN raw_tx TEXT")
+        except Exception as e:
+            print(f"⚠️ Warning when checking txoutbox columns: {e}")
+        
+        # Backfill theo campaign (reconciliation)
+        try:
+            cursor.execute("PRAGMA table_info(backfilljob)")
+            backfill_columns = [row[1] for row in cursor.fetchall()]
+            if backfill_columns and "onchain_campaign_id" not in backfill_columns:
+                cursor.execute("ALTER TABLE backfilljob ADD COLUMN onchain_campaign_id INTEGER")
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_backfilljob_onchain_campaign_id ON backfilljob(onchain_campaign_id)")
+            if backfill_columns and "drift" not in backfill_columns:
+                cursor.execute("ALTER TABLE backfilljob ADD COLUMN drift TEXT")
+        except Exception as e:
+            print(f"⚠️ Warning when checking backfilljob columns: {e}")
+        
+        # Index cho các query donation / withdraw log / audit log thường dùng
+        try:
+            cursor.execute("PRAGMA table_info(donation)")
+            donation_columns = [row[1] for row in cursor.fetchall()]
+            if donation_columns:
+                if "donor_address_lower" not in donation_columns:
+                    cursor.execute("ALTER TABLE donation ADD COLUMN donor_address_lower TEXT")
+                    print("✅ Added 'donor_address_lower' column to donation table")
+                cursor.execute("UPDATE donation SET donor_address_lower = lower(donor_address) WHERE donor_address_lower IS NULL")
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_donation_donor_address_lower_timestamp ON donation(donor_address_lower, timestamp)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_donation_campaign_id_timestamp ON donation(campaign_id, timestamp)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_donation_campaign_id_donor_address ON donation(campaign_id, donor_address)")
+            # Wei dạng hai INTEGER (gwei, phần dư); rows cũ được điền nền bởi services/wei_backfill
+            for table in ("donation", "withdrawlog"):
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = [row[1] for row in cursor.fetchall()]
+                if columns and "amount_gwei" not in columns:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN amount_gwei INTEGER")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN amount_wei_rem INTEGER")
+                    print(f"✅ Added 'amount_gwei', 'amount_wei_rem' columns to {table} table")
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='withdrawlog'")
+            if cursor.fetchone():
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_withdrawlog_campaign_id_timestamp ON withdrawlog(campaign_id, timestamp)")
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='auditlog'")
+            if cursor.fetchone():
+                cursor.execute("CREATE INDEX IF NOT EXISTS ix_auditlog_timestamp_action_username ON auditlog(timestamp, action, username)")
+            # Cập nhật thống kê cho query planner khi cần (rẻ nếu không có gì thay đổi)
+            cursor.execute("PRAGMA optimize")
+        except Exception as e:
+            print(f"⚠️ Warning when creating indexes: {e}")
+        
         conn.commit()
         conn.close()
     except Exception as e:
@@ -116,6 +236,20 @@ def init_db():
     run_migrations()
     # Tạo tables mới (nếu chưa có)
     SQLModel.metadata.create_all(engine)
+    # Database có từ trước campaign_totals: tính totals một lần từ các event đã có
+    from .crud import rebuild_campaign_totals
+    from .models import CampaignTotals, Donation, WithdrawLog
+    with Session(engine) as session:
+        if session.exec(select(CampaignTotals.campaign_id).limit(1)).first() is None and (
+            session.exec(select(Donation.id).limit(1)).first() is not None
+            or session.exec(select(WithdrawLog.id).limit(1)).first() is not None
+        ):
+            # rebuild cộng amount_gwei / amount_wei_rem: điền xong trước
+            from .services.wei_backfill import run_wei_backfill
+            run_wei_backfill()
+            count = rebuild_campaign_totals(session)
+            session.commit()
+            print(f"✅ Rebuilt campaign_totals for {count} campaigns")
 
 def get_session():
     with Session(engine) as session:
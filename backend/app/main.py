@@ -11,11 +11,15 @@ import logging
 from .database import init_db
 from .routes import campaigns, auth, admin
 from .services.web3_service import start_donation_event_poller_thread
+from .services.async_ingester import start_async_ingestion, stop_async_ingestion
 from .services.auto_disburse import start_auto_disburse_thread
+from .services.tx_outbox import start_tx_outbox_thread
+from .services.reconciliation import start_reconciliation_thread
+from .services.wei_backfill import start_wei_backfill_thread
 # nếu có auth router thì bật dòng dưới
 # from .routes import auth
 
-from .config import BACKEND_PORT, FRONTEND_ORIGINS
+from .config import BACKEND_PORT, FRONTEND_ORIGINS, INGESTION_MODE, INGESTION_RUNTIME
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -28,9 +32,20 @@ async def lifespan(app: FastAPI):
     # Startup
     init_db()
     print("✅ Database initialized")
+    # Rows cũ chưa có amount_gwei / amount_wei_rem: điền nền, app vẫn phục vụ request
+    try:
+        if start_wei_backfill_thread():
+            print("🔢 Wei backfill started")
+    except Exception as e:
+        print("⚠️ Failed to start wei backfill:", e)
     # Start background donation event poller (if configured)
+    ingestion = None
     try:
-        start_donation_event_poller_thread()
+        if INGESTION_RUNTIME == "asyncio" and INGESTION_MODE == "poll":
+            # AsyncWeb3 task trên event loop của app, dừng cooperative khi shutdown
+            ingestion = start_async_ingestion()
+        else:
+            start_donation_event_poller_thread()
         print("🔎 Donation event poller started")
     except Exception as e:
         print("⚠️ Failed to start donation poller:", e)
@@ -42,9 +57,25 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print("⚠️ Failed to start auto-disburse job:", e)
 
+    # Start transaction outbox (gửi transaction + theo dõi receipt)
+    try:
+        start_tx_outbox_thread()
+        print("📤 Transaction outbox started")
+    except Exception as e:
+        print("⚠️ Failed to start transaction outbox:", e)
+
+    # Start reconciliation job (DB vs on-chain totals)
+    try:
+        if start_reconciliation_thread():
+            print("🧮 Reconciliation job started")
+    except Exception as e:
+        print("⚠️ Failed to start reconciliation job:", e)
+
     yield
 
     # Shutdown (nếu cần)
+    if ingestion:
+        await stop_async_ingestion(*ingestion)
     print("🛑 Application shutdown")
 
 
@@ -1,5 +1,6 @@
 from typing import Optional
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 class Campaign(SQLModel, table=True):
@@ -22,12 +23,25 @@ class Campaign(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Donation(SQLModel, table=True):
+    __table_args__ = (
+        # List donations của campaign (ORDER BY timestamp DESC) và thống kê donor theo campaign
+        Index("ix_donation_campaign_id_timestamp", "campaign_id", "timestamp"),
+        Index("ix_donation_campaign_id_donor_address", "campaign_id", "donor_address"),
+        # Lịch sử donate của một ví (get_donations_by_donor)
+        Index("ix_donation_donor_address_lower_timestamp", "donor_address_lower", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     campaign_id: int = Field(foreign_key="campaign.id")
     onchain_campaign_id: Optional[int] = None
     donor_address: str
-    amount_eth: float
+    donor_address_lower: Optional[str] = None  # lowercase, cho query theo donor
+    amount_eth: float  # chỉ để hiển thị
     amount_wei: str  # Store as string to avoid precision issues
+    # amount_wei = amount_gwei * 10**9 + amount_wei_rem: hai INTEGER để SUM chính xác trong SQL
+    # (một cột wei tràn INTEGER 64-bit của SQLite từ ~9.2 ETH)
+    amount_gwei: Optional[int] = None
+    amount_wei_rem: Optional[int] = None
     tx_hash: str = Field(unique=True, index=True)
     block_number: int
     timestamp: datetime
@@ -35,6 +49,10 @@ class Donation(SQLModel, table=True):
 
 
 class AuditLog(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_auditlog_timestamp_action_username", "timestamp", "action", "username"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     action: str
     user_address: Optional[str] = None
@@ -45,18 +63,113 @@ class AuditLog(SQLModel, table=True):
 
 class WithdrawLog(SQLModel, table=True):
     """Lưu lịch sử rút tiền từ blockchain"""
+    __table_args__ = (
+        Index("ix_withdrawlog_campaign_id_timestamp", "campaign_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     campaign_id: int = Field(foreign_key="campaign.id")
     onchain_campaign_id: Optional[int] = None
     owner_address: str
-    amount_eth: float
+    amount_eth: float  # chỉ để hiển thị
     amount_wei: str
+    amount_gwei: Optional[int] = None  # như Donation
+    amount_wei_rem: Optional[int] = None
     tx_hash: str = Field(unique=True, index=True)
     block_number: int
     timestamp: datetime
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class CampaignTotals(SQLModel, table=True):
+    """
+    Tổng donation / withdrawal của campaign, cập nhật trong cùng transaction với insert event
+    (đọc stats không phải aggregate lại bảng donation). Rebuild: python rebuild_campaign_totals.py
+    """
+    __tablename__ = "campaign_totals"
+
+    campaign_id: int = Field(primary_key=True)
+    total_raised_wei: str = "0"  # string như amount_wei (vượt giới hạn INTEGER của SQLite)
+    donation_count: int = 0
+    donor_count: int = 0
+    total_withdrawn_wei: str = "0"
+    last_block: int = 0  # block lớn nhất của event đã cộng vào
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class IndexerCheckpoint(SQLModel, table=True):
+    """Block cuối cùng đã index cho mỗi contract (để poller resume sau restart)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    contract_address: str = Field(unique=True, index=True)  # lowercase
+    last_block: int
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class IndexedBlock(SQLModel, table=True):
+    """Hash của các block đã index gần đây (phát hiện reorg)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    contract_address: str = Field(index=True)  # lowercase
+    block_number: int = Field(index=True)
+    block_hash: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class BackfillJob(SQLModel, table=True):
+    """Một lần backfill lịch sử event [from_block, to_block] cho contract"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    contract_address: str = Field(index=True)  # lowercase
+    onchain_campaign_id: Optional[int] = Field(default=None, index=True)  # chỉ event của campaign này (topic1)
+    from_block: int
+    to_block: int
+    status: str = Field(default="pending")  # pending, running, completed, failed
+    # Job do reconciliation tạo: sai lệch "raised_diff/withdrawn_diff" (wei) lúc tạo job
+    drift: Optional[str] = None
+    workers: int = 1
+    requested_by: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+
+class BackfillRange(SQLModel, table=True):
+    """Một range của BackfillJob; last_block là checkpoint riêng của range (resume giữa chừng)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="backfilljob.id", index=True)
+    from_block: int
+    to_block: int
+    last_block: int  # block cuối đã commit, from_block - 1 khi chưa quét
+    status: str = Field(default="pending")  # pending, running, completed, failed
+    donations_saved: int = 0
+    withdrawals_saved: int = 0
+    error: Optional[str] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TxOutbox(SQLModel, table=True):
+    """Transaction server-signed đang chờ gửi / chờ receipt (outbox bền vững qua restart)"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(index=True)  # withdraw, set_active
+    campaign_id: Optional[int] = Field(default=None, index=True)
+    onchain_campaign_id: Optional[int] = None
+    payload: str = "{}"  # JSON tham số của contract call
+    status: str = Field(default="queued", index=True)  # queued, sent, confirmed, failed
+    nonce: Optional[int] = None
+    gas_price: Optional[int] = None  # maxFeePerGas (EIP-1559) hoặc gasPrice (legacy) của lần gửi mới nhất
+    fees: str = "{}"  # JSON: các field fee của lần gửi mới nhất (cho replacement)
+    tx_hash: Optional[str] = Field(default=None, index=True)  # hash của lần gửi mới nhất
+    tx_hashes: str = "[]"  # JSON: mọi hash đã gửi (bản gốc + replacements)
+    raw_tx: Optional[str] = None  # raw tx đã sign của lần gửi mới nhất, lưu TRƯỚC khi broadcast
+    send_attempts: int = 0
+    replacements: int = 0
+    block_number: Optional[int] = None
+    error: Optional[str] = None
+    requested_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    confirmed_at: Optional[datetime] = None
+
+
 class User(SQLModel, table=True):
     """Người dùng hệ thống"""
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -6,9 +6,14 @@ from sqlalchemy import or_, and_, func
 from typing import Optional, List
 from pydantic import BaseModel
 from app.database import get_session
-from app.models import User, AuditLog
+from app.models import User, AuditLog, Campaign
 from app.dependencies.auth import admin_required, get_current_user
-from app.crud import create_audit_log
+from app.crud import create_audit_log, list_backfill_jobs
+from app.services.backfill import plan_backfill, start_backfill_thread, backfill_progress, is_backfill_running
+from app.services.rpc_provider import rpc_health_snapshot
+from app.services.web3_service import make_service
+from app.services.db_writer import db_writer
+from app.services.reconciliation import reconcile_campaigns, last_reconciliation_report
 from app.utils.roles import ROLE_ADMIN, ROLE_USER
 import logging
 
@@ -44,6 +49,12 @@ class UserListResponse(BaseModel):
     total: int
 
 
+class BackfillRequest(BaseModel):
+    from_block: Optional[int] = None  # mặc định DEPLOY_BLOCK
+    to_block: Optional[int] = None  # mặc định checkpoint của poller
+    workers: Optional[int] = None  # mặc định BACKFILL_WORKERS
+
+
 # =========================================================
 # ADMIN: List all users
 # =========================================================
@@ -195,7 +206,7 @@ def update_user_api(
             username=username,
             details=f"user_id={user_id}, username={user.username}, changes={', '.join(update_details)}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for update_user: {e}")
     
@@ -247,7 +258,7 @@ def delete_user_api(
             username=username,
             details=f"user_id={user_id}, username={user.username} (soft delete)"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for delete_user: {e}")
     
@@ -288,7 +299,7 @@ def toggle_user_active_api(
             username=username,
             details=f"user_id={user_id}, username={user.username}, is_active: {old_active} -> {user.is_active}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for toggle_user_active: {e}")
     
@@ -299,3 +310,156 @@ def toggle_user_active_api(
         "is_active": user.is_active,
     }
 
+
+# =========================================================
+# ADMIN: Historical event backfill
+# =========================================================
+@router.post("/backfill")
+def start_backfill_api(
+    payload: BackfillRequest,
+    db: Session = Depends(get_session),
+    admin_user=Depends(admin_required),
+):
+    """Chia [from_block, to_block] thành các range và backfill song song trong background"""
+    username = admin_user.get("sub")
+    if payload.workers is not None and not 1 <= payload.workers <= 32:
+        raise HTTPException(status_code=400, detail="workers must be between 1 and 32")
+
+    try:
+        job = plan_backfill(payload.from_block, payload.to_block, payload.workers, requested_by=username)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error planning backfill: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start backfill: {str(e)}")
+
+    start_backfill_thread(job.id)
+
+    try:
+        audit = AuditLog(
+            action="start_backfill",
+            username=username,
+            details=f"job_id={job.id}, blocks={job.from_block}-{job.to_block}, workers={job.workers}"
+        )
+        db_writer.submit(create_audit_log, audit_log=audit)
+    except Exception as e:
+        logger.warning(f"Failed to write audit log for start_backfill: {e}")
+
+    return backfill_progress(job.id)
+
+
+@router.get("/backfill")
+def list_backfill_api(
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_session),
+    admin_user=Depends(admin_required),
+):
+    """Các job backfill gần nhất"""
+    return [
+        {
+            "job_id": job.id,
+            "status": job.status,
+            "running": is_backfill_running(job.id),
+            "from_block": job.from_block,
+            "to_block": job.to_block,
+            "workers": job.workers,
+            "requested_by": job.requested_by,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+        for job in list_backfill_jobs(db, limit=limit)
+    ]
+
+
+@router.get("/backfill/{job_id}")
+def get_backfill_progress_api(
+    job_id: int,
+    admin_user=Depends(admin_required),
+):
+    """Tiến độ backfill: range / block đã quét, số event đã lưu"""
+    progress = backfill_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    return progress
+
+
+@router.post("/backfill/{job_id}/resume")
+def resume_backfill_api(
+    job_id: int,
+    admin_user=Depends(admin_required),
+):
+    """Resume job bị dừng / lỗi: chỉ quét lại các range chưa completed, từ checkpoint của range"""
+    progress = backfill_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    if progress["running"]:
+        raise HTTPException(status_code=409, detail="Backfill job is already running")
+    if progress["status"] == "completed":
+        return progress
+
+    start_backfill_thread(job_id)
+    return backfill_progress(job_id)
+
+
+# =========================================================
+# ADMIN: RPC endpoint health
+# =========================================================
+@router.get("/rpc-health")
+def rpc_health_api(admin_user=Depends(admin_required)):
+    """Latency / error rate của từng RPC endpoint (RPC_URLS)"""
+    return {"endpoints": rpc_health_snapshot()}
+
+
+# =========================================================
+# ADMIN: On-chain campaign state
+# =========================================================
+@router.get("/onchain-campaigns")
+def onchain_campaigns_api(
+    db: Session = Depends(get_session),
+    admin_user=Depends(admin_required),
+):
+    """State on-chain (getCampaign) của mọi campaign đã lên chain: một Multicall3 / batch eth_call"""
+    campaigns = db.exec(select(Campaign).where(Campaign.onchain_id.isnot(None))).all()
+    try:
+        states = make_service().get_campaigns_onchain([c.onchain_id for c in campaigns])
+    except Exception as e:
+        logger.exception(f"Error reading on-chain campaigns: {e}")
+        raise HTTPException(status_code=502, detail=f"Failed to read on-chain state: {str(e)}")
+
+    return [
+        {
+            "campaign_id": c.id,
+            "onchain_id": c.onchain_id,
+            "title": c.title,
+            "status": c.status,
+            "onchain": states.get(c.onchain_id),
+        }
+        for c in campaigns
+    ]
+
+
+# =========================================================
+# ADMIN: Reconciliation (DB vs on-chain totals)
+# =========================================================
+@router.post("/reconcile")
+def reconcile_api(
+    backfill: bool = Query(True, description="Tự backfill campaign bị thiếu event"),
+    admin_user=Depends(admin_required),
+):
+    """So sánh tổng donation / withdrawal trong DB với raised / withdrawn on-chain của mọi campaign"""
+    try:
+        return reconcile_campaigns(requested_by=admin_user.get("sub"), backfill=backfill)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Reconciliation failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Reconciliation failed: {str(e)}")
+
+
+@router.get("/reconcile")
+def last_reconcile_api(admin_user=Depends(admin_required)):
+    """Kết quả đối soát gần nhất (định kỳ hoặc thủ công)"""
+    report = last_reconciliation_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No reconciliation has run yet")
+    return report
@@ -15,6 +15,7 @@ from app.models import User, PasswordResetOTP, AuditLog
 from app.services.email_service import send_otp_email
 from app.dependencies.auth import get_current_user
 from app.crud import create_audit_log
+from app.services.db_writer import db_writer
 from datetime import datetime, timedelta
 import secrets
 import logging
@@ -101,7 +102,7 @@ def register(payload: RegisterRequest, db: Session = Depends(get_session)):
             username=payload.username,
             details=f"email={payload.email}, role={ROLE_USER}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for register: {e}")
     
@@ -135,7 +136,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_session)):
                     username=payload.username,
                     details="Invalid password"
                 )
-                create_audit_log(db, audit_log=audit)
+                db_writer.submit(create_audit_log, audit_log=audit)
             except Exception:
                 pass
             raise HTTPException(status_code=401, detail="Sai username hoặc password")
@@ -152,7 +153,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_session)):
                 username=payload.username,
                 details=f"role={user.role}"
             )
-            create_audit_log(db, audit_log=audit)
+            db_writer.submit(create_audit_log, audit_log=audit)
         except Exception as e:
             logger.warning(f"Failed to write audit log for login: {e}")
         
@@ -173,7 +174,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_session)):
                 username=payload.username,
                 details="Invalid credentials"
             )
-            create_audit_log(db, audit_log=audit)
+            db_writer.submit(create_audit_log, audit_log=audit)
         except Exception:
             pass
         raise HTTPException(status_code=401, detail="Sai username hoặc password")
@@ -190,7 +191,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_session)):
             username=payload.username,
             details=f"role={demo_user['role']} (demo user)"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for login: {e}")
 
@@ -265,7 +266,7 @@ def forgot_password(payload: ForgotPasswordRequest, db: Session = Depends(get_se
             username=payload.username,
             details=f"email={payload.email}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for forgot_password: {e}")
     
@@ -335,7 +336,7 @@ def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_sess
             username=payload.username,
             details=f"email={payload.email}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for reset_password: {e}")
     
@@ -414,7 +415,7 @@ def update_wallet_address(
             username=username,
             details=f"old_wallet={old_wallet}, new_wallet={wallet_address}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for update_wallet: {e}")
     
@@ -452,7 +453,7 @@ def remove_wallet_address(
             username=username,
             details=f"removed_wallet={old_wallet}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for delete_wallet: {e}")
     
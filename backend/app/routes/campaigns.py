@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import csv
 import io
 from datetime import datetime
+from decimal import Decimal
 from app.dependencies.auth import require_roles, admin_required, get_current_user
 from app.utils.roles import CAMPAIGN_CREATOR_ROLES
 
@@ -27,17 +29,25 @@ from ..crud import (
     create_donation,
     get_donations_by_campaign_id,
     get_campaign_stats,
+    get_totals_summary,
+    sum_event_wei,
     get_donation_by_tx_hash,
     update_campaign_status,
     update_campaign,
     get_donations_by_donor,
-    create_withdraw_log,
     get_withdraw_logs_by_campaign,
     create_audit_log,
     get_audit_logs,
+    bulk_insert_donations,
+    get_last_event_block,
+    get_tx_intent,
+    list_tx_intents,
 )
 from app.services.web3_service import make_service
+from app.services.tx_outbox import tx_outbox, tx_intent_dict
+from app.services.db_writer import db_writer
 from sqlmodel import Session as SyncSession, Session, select
+from web3 import Web3
 
 logger = logging.getLogger("uvicorn.error")
 
@@ -46,6 +56,11 @@ router = APIRouter(
     tags=["campaigns"],
 )
 
+
+def _wei_to_eth(amount_wei: int) -> Decimal:
+    """ETH để hiển thị (Decimal, giữ dấu âm của withdrawal)"""
+    return Decimal(amount_wei) / Decimal(10**18)
+
 # =========================================================
 # Background task: create campaign on blockchain
 # =========================================================
@@ -64,7 +79,7 @@ def _create_onchain_campaign(campaign_id: int):
                 goal_eth=float(campaign.target_amount),
             )
 
-            update_onchain_info(db, campaign_id, tx_hash, onchain_id)
+            db_writer.run(update_onchain_info, campaign_id, tx_hash, onchain_id)
             logger.info(
                 "On-chain campaign created | id=%s onchain_id=%s tx=%s",
                 campaign_id,
@@ -74,18 +89,15 @@ def _create_onchain_campaign(campaign_id: int):
             # record audit
             try:
                 audit = AuditLog(action="create_onchain", user_address=campaign.owner or "server", details=f"tx={tx_hash} onchain_id={onchain_id}")
-                db.add(audit)
-                db.commit()
+                db_writer.submit(create_audit_log, audit_log=audit)
             except Exception:
                 logger.warning("Failed to write audit log for on-chain create campaign %s", campaign_id)
     except Exception as e:
         logger.exception("Create on-chain campaign failed: %s", e)
         # write audit of failure
         try:
-            with SyncSession(engine) as db:
-                audit = AuditLog(action="create_onchain_failed", user_address="server", details=str(e))
-                db.add(audit)
-                db.commit()
+            audit = AuditLog(action="create_onchain_failed", user_address="server", details=str(e))
+            db_writer.submit(create_audit_log, audit_log=audit)
         except Exception:
             logger.warning("Failed to write audit log for on-chain create failure")
 
@@ -103,7 +115,6 @@ async def create_campaign_api(
     request: Request,
     background_tasks: BackgroundTasks,
     user=Depends(get_current_user),
-    db: Session = Depends(get_session),
 ):
     payload = CampaignCreate(**await request.json())
     username = user.get("sub")
@@ -123,7 +134,7 @@ async def create_campaign_api(
         disburse_threshold=payload.disburse_threshold,
     )
 
-    saved = create_campaign(db, campaign=campaign)
+    saved = await db_writer.run_async(create_campaign, campaign=campaign)
     
     # Audit log
     try:
@@ -132,7 +143,7 @@ async def create_campaign_api(
             username=username,
             details=f"campaign_id={saved.id}, title={saved.title}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception:
         logger.warning("Failed to write audit log for campaign creation")
 
@@ -162,14 +173,12 @@ def create_campaign_onchain_api(campaign_id: int, db: Session = Depends(get_sess
         )
 
         # update DB
-        update_onchain_info(db, campaign_id, tx_hash, onchain_id)
+        db_writer.run(update_onchain_info, campaign_id, tx_hash, onchain_id)
 
         # audit
         try:
-            with SyncSession(engine) as s:
-                a = AuditLog(action="create_onchain", user_address=campaign.owner or "server", details=f"tx={tx_hash} onchain_id={onchain_id}")
-                s.add(a)
-                s.commit()
+            a = AuditLog(action="create_onchain", user_address=campaign.owner or "server", details=f"tx={tx_hash} onchain_id={onchain_id}")
+            db_writer.submit(create_audit_log, audit_log=a)
         except Exception:
             logger.warning("Failed to persist audit log for onchain create")
 
@@ -178,10 +187,8 @@ def create_campaign_onchain_api(campaign_id: int, db: Session = Depends(get_sess
         logger.exception("Synchronous on-chain create failed for campaign %s: %s", campaign_id, e)
         # persist failure audit
         try:
-            with SyncSession(engine) as s:
-                a = AuditLog(action="create_onchain_failed", user_address="server", details=str(e))
-                s.add(a)
-                s.commit()
+            a = AuditLog(action="create_onchain_failed", user_address="server", details=str(e))
+            db_writer.submit(create_audit_log, audit_log=a)
         except Exception:
             logger.warning("Failed to persist audit failure log")
 
@@ -300,7 +307,7 @@ def export_donations_api(
                 username=username,
                 details=f"campaign_id={campaign_id}, format={format}"
             )
-            create_audit_log(db, audit_log=audit)
+            db_writer.submit(create_audit_log, audit_log=audit)
         except Exception as e:
             logger.warning(f"Failed to write audit log for export_donations: {e}")
         
@@ -310,11 +317,9 @@ def export_donations_api(
         
         # Tạo danh sách giao dịch donations
         transactions = []
-        total_donated = 0.0
         
         for donation in donations:
             try:
-                total_donated += float(donation.amount_eth) if donation.amount_eth else 0.0
                 # Xử lý timestamp an toàn
                 date_str = ""
                 if donation.timestamp:
@@ -329,10 +334,12 @@ def export_donations_api(
                 donor_addr = donation.donor_address or ""
                 desc = f"Quyên góp từ {donor_addr[:10]}...{donor_addr[-8:]}" if len(donor_addr) > 18 else f"Quyên góp từ {donor_addr}"
                 
+                amount_wei = int(donation.amount_wei or 0)
                 transactions.append({
                     "date": date_str,
                     "description": desc,
-                    "amount_eth": float(donation.amount_eth) if donation.amount_eth else 0.0,
+                    "amount_wei": amount_wei,
+                    "amount_eth": float(_wei_to_eth(amount_wei)),
                     "tx_hash": donation.tx_hash or "",
                     "block_number": int(donation.block_number) if donation.block_number else 0,
                     "donor_address": donor_addr,
@@ -344,11 +351,13 @@ def export_donations_api(
         # Sắp xếp theo thời gian (cũ nhất trước)
         transactions.sort(key=lambda x: x["date"])
         
-        # Tính số dư chạy (chỉ từ donations)
-        balance = 0.0
+        # Tính số dư chạy (chỉ từ donations) bằng wei nguyên; ETH chỉ để hiển thị
+        balance_wei = 0
         for tx in transactions:
-            balance += tx["amount_eth"]
-            tx["balance"] = balance
+            balance_wei += tx["amount_wei"]
+            tx["balance_wei"] = balance_wei
+            tx["balance"] = float(_wei_to_eth(balance_wei))
+        total_donated_wei = sum_event_wei(db, Donation, campaign_id)
         
         if format == "csv":
             # Tạo CSV file
@@ -371,8 +380,8 @@ def export_donations_api(
                 writer.writerow([
                     tx["date"],
                     tx["description"],
-                    f"{tx['amount_eth']:.6f}",
-                    f"{tx['balance']:.6f}",
+                    f"{_wei_to_eth(tx['amount_wei']):.6f}",
+                    f"{_wei_to_eth(tx['balance_wei']):.6f}",
                     tx["tx_hash"],
                     tx["block_number"],
                     tx["donor_address"],
@@ -381,7 +390,7 @@ def export_donations_api(
             # Footer với tổng kết
             writer.writerow([])
             writer.writerow(["TỔNG KẾT"])
-            writer.writerow(["Tổng quyên góp:", f"{total_donated:.6f} ETH"])
+            writer.writerow(["Tổng quyên góp:", f"{_wei_to_eth(total_donated_wei):.6f} ETH"])
             writer.writerow(["Số lượng donations:", len(donations)])
             writer.writerow(["Số lượng donors:", len(set(d.donor_address for d in donations if d.donor_address))])
             writer.writerow([])
@@ -406,6 +415,10 @@ def export_donations_api(
         else:  # JSON
             # Tạo JSON response
             import json
+            # Wei dạng string trong JSON (số nguyên lớn mất chính xác ở client JS)
+            for tx in transactions:
+                tx["amount_wei"] = str(tx["amount_wei"])
+                tx["balance_wei"] = str(tx["balance_wei"])
             result = {
                 "campaign": {
                     "id": campaign.id,
@@ -415,7 +428,8 @@ def export_donations_api(
                 },
                 "summary": {
                     "total_donations": len(donations),
-                    "total_donated": total_donated,
+                    "total_donated": float(_wei_to_eth(total_donated_wei)),
+                    "total_donated_wei": str(total_donated_wei),
                     "total_donors": len(set(d.donor_address for d in donations if d.donor_address)),
                     "note": "This report only includes donations. Withdrawal information is admin-only.",
                 },
@@ -479,7 +493,7 @@ async def update_campaign_api(
         update_data = payload.dict(exclude_unset=True)
     
     # Update campaign
-    updated = update_campaign(db, campaign_id, **update_data)
+    updated = await db_writer.run_async(update_campaign, campaign_id, **update_data)
     if not updated:
         raise HTTPException(status_code=404, detail="Campaign not found after update")
     
@@ -491,7 +505,7 @@ async def update_campaign_api(
             user_address=None,
             details=f"campaign_id={campaign_id}, fields={list(update_data.keys())}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning("Failed to write audit log for campaign update: %s", e)
     
@@ -523,7 +537,7 @@ async def toggle_visibility_api(
     if campaign.owner != username and role != "admin":
         return JSONResponse(status_code=403, content={"detail": "Not authorized"})
     
-    updated = update_campaign(db, campaign_id, is_visible=not campaign.is_visible)
+    updated = await db_writer.run_async(update_campaign, campaign_id, is_visible=not campaign.is_visible)
     
     # Audit log
     try:
@@ -532,7 +546,7 @@ async def toggle_visibility_api(
             username=username,
             details=f"campaign_id={campaign_id}, visible={updated.is_visible}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception:
         logger.warning("Failed to write audit log for visibility toggle")
     
@@ -583,7 +597,7 @@ def export_campaign_statement_api(
                 username=username,
                 details=f"campaign_id={campaign_id}, format={format}"
             )
-            create_audit_log(db, audit_log=audit)
+            db_writer.submit(create_audit_log, audit_log=audit)
         except Exception as e:
             logger.warning(f"Failed to write audit log for export_statement: {e}")
         
@@ -615,10 +629,12 @@ def export_campaign_statement_api(
                 donor_addr = donation.donor_address or ""
                 desc = f"Quyên góp từ {donor_addr[:10]}...{donor_addr[-8:]}" if len(donor_addr) > 18 else f"Quyên góp từ {donor_addr}"
                 
+                amount_wei = int(donation.amount_wei or 0)
                 transactions.append({
                     "date": date_str,
                     "description": desc,
-                    "amount_eth": float(donation.amount_eth) if donation.amount_eth else 0.0,
+                    "amount_wei": amount_wei,
+                    "amount_eth": float(_wei_to_eth(amount_wei)),
                     "type": "Donation",
                     "tx_hash": donation.tx_hash or "",
                     "block_number": int(donation.block_number) if donation.block_number else 0,
@@ -645,10 +661,12 @@ def export_campaign_statement_api(
                 owner_addr = withdraw.owner_address or ""
                 desc = f"Rút tiền đến {owner_addr[:10]}...{owner_addr[-8:]}" if len(owner_addr) > 18 else f"Rút tiền đến {owner_addr}"
                 
+                amount_wei = -int(withdraw.amount_wei or 0)  # Số âm cho withdrawal
                 transactions.append({
                     "date": date_str,
                     "description": desc,
-                    "amount_eth": -float(withdraw.amount_eth) if withdraw.amount_eth else 0.0,  # Số âm cho withdrawal
+                    "amount_wei": amount_wei,
+                    "amount_eth": float(_wei_to_eth(amount_wei)),
                     "type": "Withdrawal",
                     "tx_hash": withdraw.tx_hash or "",
                     "block_number": int(withdraw.block_number) if withdraw.block_number else 0,
@@ -661,11 +679,15 @@ def export_campaign_statement_api(
         # Sắp xếp theo thời gian (cũ nhất trước)
         transactions.sort(key=lambda x: x["date"])
         
-        # Tính số dư chạy (running balance)
-        balance = 0.0
+        # Tính số dư chạy (running balance) bằng wei nguyên; ETH chỉ để hiển thị
+        balance_wei = 0
         for tx in transactions:
-            balance += tx["amount_eth"]
-            tx["balance"] = balance
+            balance_wei += tx["amount_wei"]
+            tx["balance_wei"] = balance_wei
+            tx["balance"] = float(_wei_to_eth(balance_wei))
+        # Tổng chính xác tính trong SQL (mọi event của campaign)
+        total_donated_wei = sum_event_wei(db, Donation, campaign_id)
+        total_withdrawn_wei = sum_event_wei(db, WithdrawLog, campaign_id)
         
         if format == "csv":
             # Tạo CSV file
@@ -690,8 +712,8 @@ def export_campaign_statement_api(
                     tx["date"],
                     tx["description"],
                     tx["type"],
-                    f"{tx['amount_eth']:.6f}",
-                    f"{tx['balance']:.6f}",
+                    f"{_wei_to_eth(tx['amount_wei']):.6f}",
+                    f"{_wei_to_eth(tx['balance_wei']):.6f}",
                     tx["tx_hash"],
                     tx["block_number"],
                     tx.get("donor_address") or tx.get("owner_address", ""),
@@ -700,11 +722,9 @@ def export_campaign_statement_api(
             # Footer với tổng kết
             writer.writerow([])
             writer.writerow(["TỔNG KẾT"])
-            total_donated = sum(float(d.amount_eth) if d.amount_eth else 0.0 for d in donations)
-            total_withdrawn = sum(float(w.amount_eth) if w.amount_eth else 0.0 for w in withdrawals)
-            writer.writerow(["Tổng quyên góp:", f"{total_donated:.6f} ETH"])
-            writer.writerow(["Tổng rút tiền:", f"{total_withdrawn:.6f} ETH"])
-            writer.writerow(["Số dư hiện tại:", f"{balance:.6f} ETH"])
+            writer.writerow(["Tổng quyên góp:", f"{_wei_to_eth(total_donated_wei):.6f} ETH"])
+            writer.writerow(["Tổng rút tiền:", f"{_wei_to_eth(total_withdrawn_wei):.6f} ETH"])
+            writer.writerow(["Số dư hiện tại:", f"{_wei_to_eth(total_donated_wei - total_withdrawn_wei):.6f} ETH"])
             writer.writerow(["Số lượng donations:", len(donations)])
             writer.writerow(["Số lượng withdrawals:", len(withdrawals)])
             
@@ -726,8 +746,10 @@ def export_campaign_statement_api(
         else:  # JSON
             # Tạo JSON response
             import json
-            total_donated = sum(float(d.amount_eth) if d.amount_eth else 0.0 for d in donations)
-            total_withdrawn = sum(float(w.amount_eth) if w.amount_eth else 0.0 for w in withdrawals)
+            # Wei dạng string trong JSON (số nguyên lớn mất chính xác ở client JS)
+            for tx in transactions:
+                tx["amount_wei"] = str(tx["amount_wei"])
+                tx["balance_wei"] = str(tx["balance_wei"])
             
             result = {
                 "campaign": {
@@ -739,9 +761,12 @@ def export_campaign_statement_api(
                 "summary": {
                     "total_donations": len(donations),
                     "total_withdrawals": len(withdrawals),
-                    "total_donated": total_donated,
-                    "total_withdrawn": total_withdrawn,
-                    "current_balance": balance,
+                    "total_donated": float(_wei_to_eth(total_donated_wei)),
+                    "total_withdrawn": float(_wei_to_eth(total_withdrawn_wei)),
+                    "current_balance": float(_wei_to_eth(total_donated_wei - total_withdrawn_wei)),
+                    "total_donated_wei": str(total_donated_wei),
+                    "total_withdrawn_wei": str(total_withdrawn_wei),
+                    "current_balance_wei": str(total_donated_wei - total_withdrawn_wei),
                 },
                 "transactions": transactions,
             }
@@ -767,55 +792,55 @@ def export_campaign_statement_api(
 # =========================================================
 # ADMIN: Sync donations from blockchain
 # =========================================================
-def _sync_donations(campaign_id: int, onchain_id: int, username: str = "admin"):
+def _sync_donations(campaign_id: int, onchain_id: int, username: str = "admin") -> int:
+    """Ingest DonationReceived của campaign; lỗi đọc chain -> HTTP 502 (không báo sync thành công 0 event)"""
+    with SyncSession(engine) as db:
+        last_block = get_last_event_block(db, Donation, campaign_id)
     try:
-        with SyncSession(engine) as db:
-            svc = make_service()
-            events = svc.get_donation_events(onchain_id)
-            
-            synced_count = 0
-            for ev in events:
-                if get_donation_by_tx_hash(db, ev["tx_hash"]):
-                    continue
-
-                donation = Donation(
-                    campaign_id=campaign_id,
-                    onchain_campaign_id=onchain_id,
-                    donor_address=ev["donor"],
-                    amount_eth=ev["amount_eth"],
-                    amount_wei=str(ev["amount"]),
-                    tx_hash=ev["tx_hash"],
-                    block_number=ev["block_number"],
-                    timestamp=datetime.fromtimestamp(ev["timestamp"]),
-                )
-                create_donation(db, donation)
-                synced_count += 1
-
-            logger.info("Donation sync completed for campaign %s, synced %d donations", campaign_id, synced_count)
-            
-            # Audit log sau khi sync xong
-            try:
-                audit = AuditLog(
-                    action="sync_donations_completed",
-                    username=username,
-                    details=f"campaign_id={campaign_id}, synced_count={synced_count}"
-                )
-                db.add(audit)
-                db.commit()
-            except Exception as e:
-                logger.warning(f"Failed to write audit log for sync_donations_completed: {e}")
+        svc = make_service()
+        # Chỉ quét từ block cuối đã index của campaign (block đó quét lại: insert bỏ qua tx_hash trùng)
+        events = svc.get_donation_events(onchain_id, from_block=last_block)
     except Exception as e:
         logger.exception("Sync donation failed: %s", e)
+        raise HTTPException(status_code=502, detail=f"Failed to read donation events: {str(e)}")
+
+    # Một bulk insert (bỏ qua tx_hash đã có) thay vì query + commit từng event
+    rows = [
+        {
+            "campaign_id": campaign_id,
+            "onchain_campaign_id": onchain_id,
+            "donor_address": ev["donor"],
+            "amount_eth": ev["amount_eth"],
+            "amount_wei": str(ev["amount"]),
+            "tx_hash": ev["tx_hash"],
+            "block_number": ev["block_number"],
+            "timestamp": datetime.fromtimestamp(ev["timestamp"]),
+        }
+        for ev in events
+    ]
+    synced_count = db_writer.run(bulk_insert_donations, rows)
+
+    logger.info("Donation sync completed for campaign %s, synced %d donations", campaign_id, synced_count)
+
+    # Audit log sau khi sync xong
+    try:
+        audit = AuditLog(
+            action="sync_donations_completed",
+            username=username,
+            details=f"campaign_id={campaign_id}, synced_count={synced_count}"
+        )
+        db_writer.submit(create_audit_log, audit_log=audit)
+    except Exception as e:
+        logger.warning(f"Failed to write audit log for sync_donations_completed: {e}")
+    return synced_count
 
 
 @router.post(
     "/{campaign_id}/sync-donations",
-    status_code=202,
     dependencies=[Depends(admin_required)],
 )
 async def sync_donations_api(
     campaign_id: int,
-    background_tasks: BackgroundTasks,
     user=Depends(get_current_user),
     db: Session = Depends(get_session),
 ):
@@ -832,17 +857,13 @@ async def sync_donations_api(
             username=username,
             details=f"campaign_id={campaign_id}, onchain_id={campaign.onchain_id}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for sync donations: {e}")
 
-    background_tasks.add_task(
-        _sync_donations,
-        campaign_id,
-        campaign.onchain_id,
-        username,
-    )
-    return {"message": "Sync started"}
+    # Chạy trong thread (RPC + db_writer blocking); lỗi RPC trả về 502 thay vì "Sync started"
+    synced_count = await asyncio.to_thread(_sync_donations, campaign_id, campaign.onchain_id, username)
+    return {"message": "Sync completed", "synced_count": synced_count}
 
 
 # =========================================================
@@ -856,7 +877,6 @@ async def sync_donations_api(
 async def withdraw_api(
     campaign_id: int,
     request: Request,
-    background_tasks: BackgroundTasks,
     user=Depends(get_current_user),
     db: Session = Depends(get_session),
 ):
@@ -869,94 +889,16 @@ async def withdraw_api(
         return JSONResponse(status_code=400, content={"detail": "Campaign not on-chain"})
 
     username = user.get("sub") if user else "admin"
-    
-    # Send transaction synchronously to get tx_hash immediately
+
+    # Ghi intent vào outbox; worker gửi transaction và theo dõi receipt (không chặn event loop)
     try:
-        svc = make_service()
-        logger.info(f"Starting withdraw for campaign {campaign_id}, onchain_id={campaign.onchain_id}, amount={amount_eth} ETH")
-        
-        # Execute withdraw transaction (this waits for receipt)
-        tx_hash = svc.withdraw(campaign.onchain_id, amount_eth)
-        logger.info(f"Withdraw transaction confirmed: {tx_hash}")
-        
-        # Audit log immediately (before background task)
-        try:
-            audit = AuditLog(
-                action="withdraw",
-                username=username,
-                details=f"campaign_id={campaign_id}, amount={amount_eth} ETH, tx={tx_hash}"
-            )
-            create_audit_log(db, audit_log=audit)
-        except Exception as e:
-            logger.warning(f"Failed to write audit log for withdraw: {e}")
-        
-        # Background task to save event details and audit log
-        def _save_withdraw_details():
-            try:
-                with SyncSession(engine) as s:
-                    import time
-                    time.sleep(2)  # Wait 2 seconds for event to be indexed
-                    
-                    # Get withdraw event to get details
-                    latest_withdraw = None
-                    for attempt in range(3):
-                        try:
-                            withdraw_events = svc.get_withdraw_events(campaign.onchain_id)
-                            # Find the event matching our tx_hash
-                            for event in withdraw_events:
-                                if event.get('tx_hash') == tx_hash:
-                                    latest_withdraw = event
-                                    break
-                            
-                            if latest_withdraw:
-                                break
-                        except Exception as e:
-                            logger.warning(f"Attempt {attempt + 1} to get withdraw event failed: {e}")
-                        
-                        if attempt < 2:
-                            time.sleep(2)  # Wait 2 more seconds before retry
-                    
-                    if latest_withdraw:
-                        logger.info(f"Found withdraw event: {latest_withdraw}")
-                        # Check if already exists
-                        existing = s.exec(
-                            select(WithdrawLog).where(WithdrawLog.tx_hash == latest_withdraw['tx_hash'])
-                        ).first()
-                        
-                        if not existing:
-                            withdraw_log = WithdrawLog(
-                                campaign_id=campaign_id,
-                                onchain_campaign_id=campaign.onchain_id,
-                                owner_address=latest_withdraw['owner'],
-                                amount_eth=latest_withdraw['amount_eth'],
-                                amount_wei=str(latest_withdraw['amount']),
-                                tx_hash=latest_withdraw['tx_hash'],
-                                block_number=latest_withdraw['block_number'],
-                                timestamp=datetime.fromtimestamp(latest_withdraw['timestamp']),
-                            )
-                            create_withdraw_log(s, withdraw_log=withdraw_log)
-                            logger.info(f"Saved withdraw log: campaign_id={campaign_id}, tx={latest_withdraw['tx_hash']}")
-                        else:
-                            logger.info(f"Withdraw log already exists: {latest_withdraw['tx_hash']}")
-                    else:
-                        logger.warning(f"Could not find withdraw event for tx={tx_hash}. Event will be indexed by background poller.")
-                    
-                    # Note: Audit log đã được tạo ở trên (trước background task)
-                        
-            except Exception as e:
-                logger.exception(f"Failed to save withdraw details for campaign {campaign_id}: {e}")
-        
-        background_tasks.add_task(_save_withdraw_details)
-        
-        # Return success with tx_hash immediately
-        return {
-            "message": "Withdraw successful",
-            "success": True,
-            "tx_hash": tx_hash,
-            "amount_eth": amount_eth,
-            "campaign_id": campaign_id,
-        }
-        
+        intent = await tx_outbox.enqueue_async(
+            "withdraw",
+            {"onchain_id": campaign.onchain_id, "amount_wei": str(Web3.to_wei(Decimal(str(amount_eth)), "ether"))},
+            campaign_id=campaign_id,
+            onchain_campaign_id=campaign.onchain_id,
+            requested_by=username,
+        )
     except Exception as e:
         logger.exception(f"Withdraw failed for campaign {campaign_id}: {e}")
         return JSONResponse(
@@ -967,6 +909,65 @@ async def withdraw_api(
                 "detail": str(e)
             }
         )
+    logger.info(f"Queued withdraw for campaign {campaign_id}, onchain_id={campaign.onchain_id}, amount={amount_eth} ETH (tx_id={intent.id})")
+
+    # Audit log
+    try:
+        audit = AuditLog(
+            action="withdraw",
+            username=username,
+            details=f"campaign_id={campaign_id}, amount={amount_eth} ETH, tx_id={intent.id}"
+        )
+        db_writer.submit(create_audit_log, audit_log=audit)
+    except Exception as e:
+        logger.warning(f"Failed to write audit log for withdraw: {e}")
+
+    # Chờ ngắn (không chặn) để trả về tx_hash nếu đã broadcast
+    intent = await _wait_for_broadcast(intent.id)
+    return {
+        "message": "Withdraw submitted" if intent["status"] in ("sent", "confirmed") else "Withdraw queued",
+        "success": intent["status"] != "failed",
+        "tx_id": intent["id"],
+        "status": intent["status"],
+        "tx_hash": intent["tx_hash"],
+        "amount_eth": amount_eth,
+        "campaign_id": campaign_id,
+    }
+
+
+async def _wait_for_broadcast(intent_id: int, timeout: float = 5.0) -> dict:
+    """Poll outbox tới khi intent đã broadcast / failed hoặc hết timeout (tx_hash có từ lúc sign)"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        with SyncSession(engine) as s:
+            intent = tx_intent_dict(get_tx_intent(s, intent_id))
+        if intent["status"] != "queued" or asyncio.get_running_loop().time() >= deadline:
+            return intent
+        await asyncio.sleep(0.25)
+
+
+# =========================================================
+# ADMIN: Outbox transaction status
+# =========================================================
+@router.get(
+    "/{campaign_id}/transactions",
+    dependencies=[Depends(admin_required)],
+)
+def list_campaign_transactions_api(campaign_id: int, db: Session = Depends(get_session)):
+    """Các transaction server-signed (withdraw, set_active) của campaign"""
+    return [tx_intent_dict(i) for i in list_tx_intents(db, campaign_id=campaign_id)]
+
+
+@router.get(
+    "/{campaign_id}/transactions/{tx_id}",
+    dependencies=[Depends(admin_required)],
+)
+def get_campaign_transaction_api(campaign_id: int, tx_id: int, db: Session = Depends(get_session)):
+    """Trạng thái một transaction: queued -> sent -> confirmed / failed"""
+    intent = get_tx_intent(db, tx_id)
+    if not intent or intent.campaign_id != campaign_id:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return tx_intent_dict(intent)
 
 
 # =========================================================
@@ -980,7 +981,6 @@ async def withdraw_api(
 async def set_active_api(
     campaign_id: int,
     request: Request,
-    background_tasks: BackgroundTasks,
     user=Depends(get_current_user),
     db: Session = Depends(get_session),
 ):
@@ -999,21 +999,19 @@ async def set_active_api(
             username=username,
             details=f"campaign_id={campaign_id}, active={active}, onchain_id={campaign.onchain_id}"
         )
-        create_audit_log(db, audit_log=audit)
+        db_writer.submit(create_audit_log, audit_log=audit)
     except Exception as e:
         logger.warning(f"Failed to write audit log for set_active: {e}")
 
-    def _set_active():
-        svc = make_service()
-        svc.set_active(campaign.onchain_id, active)
-        update_campaign_status(
-            db,
-            campaign_id,
-            "active" if active else "closed",
-        )
-
-    background_tasks.add_task(_set_active)
-    return {"message": "Status updating"}
+    # Status campaign được cập nhật khi transaction confirmed (xem tx_outbox)
+    intent = await tx_outbox.enqueue_async(
+        "set_active",
+        {"onchain_id": campaign.onchain_id, "active": active},
+        campaign_id=campaign_id,
+        onchain_campaign_id=campaign.onchain_id,
+        requested_by=username,
+    )
+    return {"message": "Status updating", "tx_id": intent.id, "status": intent.status}
 
 
 # =========================================================
@@ -1040,18 +1038,19 @@ def get_reports_api(db: Session = Depends(get_session)):
         ).first() or 0
         logger.debug(f"Active campaigns: {active_campaigns}")
         
-        # Total raised and withdrawn
-        total_raised = db.exec(select(func.sum(Donation.amount_eth))).first() or 0.0
+        # Total raised / withdrawn / donations từ campaign_totals
+        summary = get_totals_summary(db)
+        total_raised = summary["total_raised_wei"] / 10**18
         logger.debug(f"Total raised: {total_raised}")
         
-        total_withdrawn = db.exec(select(func.sum(WithdrawLog.amount_eth))).first() or 0.0
+        total_withdrawn = summary["total_withdrawn_wei"] / 10**18
         logger.debug(f"Total withdrawn: {total_withdrawn}")
         
-        # Total donors and donations
-        total_donors = db.exec(select(func.count(func.distinct(Donation.donor_address)))).first() or 0
+        # Donor khác nhau trên mọi campaign (không cộng được từ donor_count của từng campaign)
+        total_donors = db.exec(select(func.count(func.distinct(Donation.donor_address_lower)))).first() or 0
         logger.debug(f"Total donors: {total_donors}")
         
-        total_donations = db.exec(select(func.count(Donation.id))).first() or 0
+        total_donations = summary["donation_count"]
         logger.debug(f"Total donations: {total_donations}")
         
         # Recent campaigns
@@ -0,0 +1,154 @@
+"""
+Asyncio-native donation event ingestion (INGESTION_RUNTIME=asyncio).
+
+Chạy như một task trong FastAPI lifespan trên AsyncWeb3 thay vì daemon thread +
+time.sleep. Các bước không phải RPC (window, reorg ancestor, decode, build rows, persist +
+checkpoint) là các helper dùng chung với run_ingestion_cycle; class này chỉ làm phần I/O:
+headers, known hashes và các chunk logs được fetch đồng thời, DB writes chạy qua
+asyncio.to_thread, shutdown cooperative.
+"""
+import asyncio
+import logging
+
+from web3 import AsyncWeb3
+
+from ..config import RPC_URL, DISASTER_FUND_ADDRESS
+from .block_cache import async_fetch_block_headers, async_get_block_timestamps
+from .log_scanner import AsyncLogRangeScanner
+from .rpc_provider import make_async_rpc_provider
+from .contract_registry import CONTRACT_ABI, contract_registry
+from .web3_service import (
+    INGESTED_EVENTS,
+    _load_poller_cursor,
+    plan_ingestion_window,
+    require_headers,
+    load_indexed_hashes,
+    is_reorg,
+    pick_reorg_ancestor,
+    rollback_reorg,
+    decode_ingested_logs,
+    build_ingested_rows,
+    persist_ingestion_window,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class AsyncDonationIngester:
+    def __init__(self, poll_interval: int = 8):
+        self.poll_interval = poll_interval
+        self.w3 = AsyncWeb3(make_async_rpc_provider())
+        try:
+            # add POA middleware if needed (Sepolia-like chains)
+            from web3.middleware import async_geth_poa_middleware
+
+            self.w3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        except Exception:
+            pass
+        registry = contract_registry()
+        self.contract_address = registry.address
+        self.decoders = registry.decoders(INGESTED_EVENTS)
+        self.log_filter = registry.log_filter(INGESTED_EVENTS)
+        self.scanner = AsyncLogRangeScanner(self.w3)
+        self.last_checked: int | None = None
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def run_cycle(self, latest: int) -> bool:
+        """Một vòng ingest (như run_ingestion_cycle); True nếu còn block chưa index (chạy tiếp ngay, không chờ)"""
+        w3 = self.w3
+        last_checked = self.last_checked
+        window = plan_ingestion_window(last_checked, latest)
+        if window is None:
+            return False
+        to_block, safe_head = window
+
+        # Headers (parentHash check + hash của to_block), known hashes và logs fetch đồng thời;
+        # logs bị bỏ nếu phát hiện reorg
+        headers, known, logs = await asyncio.gather(
+            async_fetch_block_headers(w3, sorted({last_checked + 1, to_block})),
+            asyncio.to_thread(load_indexed_hashes, self.contract_address),
+            self.scanner.scan(self.log_filter, last_checked + 1, to_block),
+        )
+        require_headers(headers, last_checked + 1, to_block)
+
+        if is_reorg(known, headers[last_checked + 1], last_checked):
+            ancestor = pick_reorg_ancestor(known, await async_fetch_block_headers(w3, sorted(known)))
+            await asyncio.to_thread(rollback_reorg, self.contract_address, ancestor, last_checked)
+            self.last_checked = ancestor
+            return True
+
+        value_events = decode_ingested_logs(w3, self.decoders, logs, last_checked + 1, to_block, latest)
+        timestamps = await async_get_block_timestamps(w3, [ev["blockNumber"] for _, ev in value_events])
+        donation_rows, withdraw_rows = build_ingested_rows(w3, value_events, timestamps)
+
+        # Thread pool, không chặn event loop
+        await asyncio.to_thread(
+            persist_ingestion_window,
+            self.contract_address, last_checked + 1, to_block, donation_rows, withdraw_rows, headers[to_block]["hash"],
+        )
+        self.last_checked = to_block
+        return to_block < safe_head
+
+    async def _wait(self, timeout: float) -> None:
+        """Chờ timeout giây hoặc tới khi có yêu cầu dừng"""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self) -> None:
+        while self.last_checked is None and not self._stop.is_set():
+            try:
+                head = await self.w3.eth.block_number
+                self.last_checked = await asyncio.to_thread(_load_poller_cursor, self.contract_address, head)
+            except Exception as e:
+                logger.error(f"Async donation ingester cannot load cursor: {e}")
+                await self._wait(self.poll_interval)
+        if self.last_checked is not None:
+            logger.info(f"Async donation ingester resuming after block {self.last_checked}")
+
+        while not self._stop.is_set():
+            catching_up = False
+            try:
+                catching_up = await self.run_cycle(await self.w3.eth.block_number)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Donation poller error: {e}")
+
+            if not catching_up:
+                await self._wait(self.poll_interval)
+        logger.info("Async donation ingester stopped")
+
+
+def start_async_ingestion(poll_interval: int = 8) -> tuple[AsyncDonationIngester, asyncio.Task] | None:
+    """Tạo ingestion task trên event loop hiện tại (gọi trong lifespan)"""
+    if not RPC_URL or not DISASTER_FUND_ADDRESS:
+        logger.warning("RPC_URL or DISASTER_FUND_ADDRESS not set; skipping event poller")
+        return None
+    if not CONTRACT_ABI:
+        logger.warning("Contract ABI not loaded; event poller will not run")
+        return None
+
+    ingester = AsyncDonationIngester(poll_interval)
+    if not any(name == "DonationReceived" for name, _ in ingester.decoders.values()):
+        logger.warning("DonationReceived event ABI not found; poller will not run")
+        return None
+
+    task = asyncio.create_task(ingester.run(), name="donation-ingester")
+    logger.info(f"Async donation ingester started for {DISASTER_FUND_ADDRESS}")
+    return ingester, task
+
+
+async def stop_async_ingestion(ingester: AsyncDonationIngester, task: asyncio.Task, timeout: float = 10) -> None:
+    """Cooperative shutdown: đợi vòng hiện tại xong, cancel nếu quá timeout"""
+    ingester.stop()
+    try:
+        await asyncio.wait_for(task, timeout=timeout)
+    except asyncio.TimeoutError:
+        task.cancel()
+    except Exception as e:
+        logger.warning(f"Async donation ingester ended with error: {e}")
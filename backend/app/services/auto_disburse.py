@@ -1,19 +1,26 @@
 """
 Background job để tự động rút tiền khi campaign đạt threshold
+
+Withdraw đi qua tx outbox (nonce / raw tx được lưu, receipt do watcher theo dõi); campaign
+còn withdraw intent queued / sent thì bỏ qua, vì số tiền đó chưa có trong WithdrawLog.
 """
 import logging
 import time
 import threading
+from decimal import Decimal
 from sqlmodel import Session, select
-from sqlalchemy import func
+from web3 import Web3
 from ..database import engine
-from ..models import Campaign, WithdrawLog, AuditLog
-from ..crud import get_campaign_stats, create_withdraw_log, create_audit_log, get_campaign
-from ..services.web3_service import make_service
-from datetime import datetime
+from ..models import Campaign, AuditLog
+from ..crud import get_campaign_stats, create_audit_log, get_campaign, get_pending_withdraw_campaigns
+from ..services.db_writer import db_writer
+from ..services.tx_outbox import tx_outbox
 
 logger = logging.getLogger("uvicorn.error")
 
+# Tối thiểu 0.01 ETH mới tự rút
+MIN_DISBURSE_WEI = Web3.to_wei(Decimal("0.01"), "ether")
+
 
 def auto_disburse_job(poll_interval: int = 60):
     """
@@ -32,65 +39,53 @@ def auto_disburse_job(poll_interval: int = 60):
                     .where(Campaign.status == "active")
                     .where(Campaign.onchain_id.isnot(None))
                 ).all()
+                pending = get_pending_withdraw_campaigns(db)
                 
                 for campaign in campaigns:
+                    if campaign.id in pending:
+                        logger.debug(f"Auto-disburse skipped for campaign {campaign.id}: withdraw still pending")
+                        continue
                     try:
-                        # Lấy stats
+                        # Lấy stats (wei chính xác từ campaign_totals)
                         stats = get_campaign_stats(db, campaign.id)
-                        total_raised = stats["total_raised"] or 0.0
+                        total_raised_wei = stats["total_raised_wei"]
                         
                         # Tính threshold
-                        threshold_amount = campaign.target_amount * campaign.disburse_threshold
+                        threshold_wei = Web3.to_wei(
+                            Decimal(str(campaign.target_amount)) * Decimal(str(campaign.disburse_threshold)), "ether"
+                        )
                         
                         # Kiểm tra nếu đã đạt threshold
-                        if total_raised >= threshold_amount:
+                        if total_raised_wei >= threshold_wei:
                             # Kiểm tra xem đã rút chưa (tránh rút nhiều lần)
-                            # Lấy tổng đã rút
-                            total_withdrawn = db.exec(
-                                select(func.sum(WithdrawLog.amount_eth))
-                                .where(WithdrawLog.campaign_id == campaign.id)
-                            ).first() or 0.0
-                            
-                            available = total_raised - total_withdrawn
+                            available_wei = total_raised_wei - stats["total_withdrawn_wei"]
                             
                             # Nếu còn tiền để rút và chưa rút hết
-                            if available > 0.01:  # Tối thiểu 0.01 ETH
+                            if available_wei > MIN_DISBURSE_WEI:
                                 logger.info(
                                     f"Auto-disburse triggered for campaign {campaign.id}: "
-                                    f"raised={total_raised}, threshold={threshold_amount}, available={available}"
+                                    f"raised={total_raised_wei} wei, threshold={threshold_wei} wei, available={available_wei} wei"
                                 )
                                 
                                 try:
-                                    svc = make_service()
-                                    # Rút toàn bộ số tiền available
-                                    tx_hash = svc.withdraw(campaign.onchain_id, available)
-                                    
-                                    # Lấy withdraw event để lưu log
-                                    withdraw_events = svc.get_withdraw_events(campaign.onchain_id)
-                                    latest_withdraw = withdraw_events[0] if withdraw_events else None
-                                    
-                                    if latest_withdraw:
-                                        withdraw_log = WithdrawLog(
-                                            campaign_id=campaign.id,
-                                            onchain_campaign_id=campaign.onchain_id,
-                                            owner_address=latest_withdraw['owner'],
-                                            amount_eth=latest_withdraw['amount_eth'],
-                                            amount_wei=str(latest_withdraw['amount']),
-                                            tx_hash=latest_withdraw['tx_hash'],
-                                            block_number=latest_withdraw['block_number'],
-                                            timestamp=datetime.fromtimestamp(latest_withdraw['timestamp']),
-                                        )
-                                        create_withdraw_log(db, withdraw_log=withdraw_log)
+                                    # Rút toàn bộ số tiền available (outbox gửi và ghi WithdrawLog khi confirmed)
+                                    intent = tx_outbox.enqueue(
+                                        "withdraw",
+                                        {"onchain_id": campaign.onchain_id, "amount_wei": str(available_wei)},
+                                        campaign_id=campaign.id,
+                                        onchain_campaign_id=campaign.onchain_id,
+                                        requested_by="system",
+                                    )
                                     
                                     # Audit log
                                     audit = AuditLog(
                                         action="auto_disburse",
                                         username="system",
-                                        details=f"campaign_id={campaign.id}, amount={available} ETH, tx={tx_hash}"
+                                        details=f"campaign_id={campaign.id}, amount={Web3.from_wei(available_wei, 'ether')} ETH, tx_id={intent.id}"
                                     )
-                                    create_audit_log(db, audit_log=audit)
+                                    db_writer.submit(create_audit_log, audit_log=audit)
                                     
-                                    logger.info(f"Auto-disburse successful: campaign {campaign.id}, tx={tx_hash}")
+                                    logger.info(f"Auto-disburse queued: campaign {campaign.id}, tx_id={intent.id}")
                                     
                                 except Exception as e:
                                     logger.exception(f"Auto-disburse failed for campaign {campaign.id}: {e}")
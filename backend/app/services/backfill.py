@@ -0,0 +1,264 @@
+"""
+Backfill lịch sử event của contract từ DEPLOY_BLOCK.
+
+[from_block, to_block] được chia thành các range BACKFILL_RANGE_SIZE block (BackfillRange)
+và quét song song trên một worker pool giới hạn. Mỗi worker dùng Web3 + LogRangeScanner
+riêng; mỗi chunk eth_getLogs được commit cùng checkpoint của range trong một transaction,
+nên job dừng giữa chừng có thể resume đúng từ block đã commit.
+
+Merge-on-commit: rows được insert với ON CONFLICT(tx_hash) DO NOTHING, nên backfill chạy
+song song với poller (hoặc chạy lại trên range đã index) không tạo bản ghi trùng.
+to_block mặc định là checkpoint của poller, phần sau đó do poller index.
+
+Chạy từ CLI: `python backfill_events.py` (xem backend/backfill_events.py).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session
+from web3 import Web3
+
+from ..config import (
+    CHAIN_ID,
+    DISASTER_FUND_ADDRESS,
+    DEPLOY_BLOCK,
+    POLLER_START_BLOCK,
+    CONFIRMATION_DEPTH,
+    BACKFILL_WORKERS,
+    BACKFILL_RANGE_SIZE,
+)
+from ..crud import (
+    create_backfill_job,
+    get_backfill_job,
+    get_backfill_ranges,
+    get_indexer_checkpoint,
+    save_indexer_checkpoint,
+    update_backfill_status,
+)
+from ..database import engine
+from ..models import BackfillJob, BackfillRange
+from .block_cache import block_timestamps
+from .db_writer import db_writer
+from .log_scanner import LogRangeScanner
+from .contract_registry import CONTRACT_ABI, ContractRegistry, get_registry
+from .web3_service import (
+    INGESTED_EVENTS,
+    build_ingested_rows,
+    campaign_topic,
+    decode_log,
+    insert_event_rows,
+    make_reader_web3,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+# Job đang chạy trong process này (tránh chạy trùng cùng một job)
+_running_jobs: set[int] = set()
+_running_lock = threading.Lock()
+
+
+def is_backfill_running(job_id: int) -> bool:
+    with _running_lock:
+        return job_id in _running_jobs
+
+
+def plan_backfill(
+    from_block: int | None = None,
+    to_block: int | None = None,
+    workers: int | None = None,
+    requested_by: str | None = None,
+    onchain_campaign_id: int | None = None,
+    drift: str | None = None,
+) -> BackfillJob:
+    """
+    Tạo BackfillJob + các range.
+    from_block mặc định: DEPLOY_BLOCK (hoặc POLLER_START_BLOCK, hoặc 0).
+    to_block mặc định: checkpoint của poller (hoặc safe head nếu poller chưa chạy).
+    onchain_campaign_id: chỉ quét event của campaign này (filter topic1 trên node).
+    drift: sai lệch mà reconciliation muốn sửa bằng job này.
+    """
+    if not DISASTER_FUND_ADDRESS:
+        raise ValueError("DISASTER_FUND_ADDRESS is missing")
+    if not CONTRACT_ABI:
+        raise ValueError("Contract ABI not loaded")
+
+    contract_address = Web3.to_checksum_address(DISASTER_FUND_ADDRESS)
+    safe_head = make_reader_web3().eth.block_number - CONFIRMATION_DEPTH
+
+    with Session(engine) as session:
+        if from_block is None:
+            from_block = DEPLOY_BLOCK if DEPLOY_BLOCK is not None else (POLLER_START_BLOCK or 0)
+        if to_block is None:
+            cp = get_indexer_checkpoint(session, contract_address)
+            to_block = cp.last_block if cp else safe_head
+        to_block = min(to_block, safe_head)
+        if from_block < 0 or from_block > to_block:
+            raise ValueError(f"Invalid backfill range {from_block}-{to_block} (safe head {safe_head})")
+
+        workers = max(1, int(workers or BACKFILL_WORKERS))
+        job = db_writer.run(
+            create_backfill_job, contract_address, from_block, to_block, BACKFILL_RANGE_SIZE, workers, requested_by,
+            onchain_campaign_id=onchain_campaign_id, drift=drift,
+        )
+        scope = f"campaign {onchain_campaign_id}" if onchain_campaign_id is not None else "all campaigns"
+        logger.info(f"Backfill job {job.id} planned: blocks {from_block}-{to_block}, {workers} workers, {scope}")
+        return job
+
+
+def _persist_chunk(range_id: int, scanned_to: int, donation_rows: list[dict], withdraw_rows: list[dict]) -> tuple[int, int]:
+    """Rows của một chunk + checkpoint của range trong một transaction (qua db_writer)"""
+    def write(session: Session) -> tuple[int, int]:
+        saved_donations, saved_withdraws = insert_event_rows(session, donation_rows, withdraw_rows)
+        job_range = session.get(BackfillRange, range_id)
+        job_range.last_block = scanned_to
+        job_range.donations_saved += saved_donations
+        job_range.withdrawals_saved += saved_withdraws
+        session.add(job_range)
+        return saved_donations, saved_withdraws
+
+    return db_writer.run(write)
+
+
+def _scan_range(job_range: tuple[int, int, int, int], registry: ContractRegistry, onchain_campaign_id: int | None) -> None:
+    """Quét một range từ checkpoint của nó tới to_block (chạy trong worker thread)"""
+    range_id, from_block, last_block, to_block = job_range
+    db_writer.run(update_backfill_status, BackfillRange, range_id, "running")
+
+    try:
+        w3 = make_reader_web3()
+        scanner = LogRangeScanner(w3)
+        decoders = registry.decoders(INGESTED_EVENTS)
+        log_filter = registry.log_filter(INGESTED_EVENTS)
+        if onchain_campaign_id is not None:
+            log_filter["topics"].append(campaign_topic(onchain_campaign_id))
+
+        for start, end, logs in scanner.iter_chunks(log_filter, last_block + 1, to_block):
+            events = []
+            for log in logs:
+                try:
+                    decoded = decode_log(w3, decoders, log)
+                    if decoded is not None and decoded[0] != "CampaignCreated":
+                        events.append(decoded)
+                except Exception as e:
+                    logger.warning(f"Failed to decode event: {e}")
+
+            timestamps = block_timestamps.get_many(w3, [ev["blockNumber"] for _, ev in events])
+            # Thiếu timestamp -> raise, không advance checkpoint của range; resume sẽ quét lại chunk này
+            donation_rows, withdraw_rows = build_ingested_rows(w3, events, timestamps)
+            _persist_chunk(range_id, end, donation_rows, withdraw_rows)
+
+        db_writer.run(update_backfill_status, BackfillRange, range_id, "completed")
+    except Exception as e:
+        logger.error(f"Backfill range {from_block}-{to_block} failed: {e}")
+        db_writer.run(update_backfill_status, BackfillRange, range_id, "failed", str(e))
+
+
+def run_backfill_job(job_id: int) -> BackfillJob:
+    """
+    Chạy (hoặc resume) job: các range chưa completed được quét trên worker pool.
+    Blocking; job chỉ completed khi mọi range completed.
+    """
+    with _running_lock:
+        if job_id in _running_jobs:
+            raise RuntimeError(f"Backfill job {job_id} is already running")
+        _running_jobs.add(job_id)
+
+    try:
+        with Session(engine) as session:
+            job = get_backfill_job(session, job_id)
+            if not job:
+                raise ValueError(f"Backfill job {job_id} not found")
+            contract_address = Web3.to_checksum_address(job.contract_address)
+            workers = job.workers
+            onchain_campaign_id = job.onchain_campaign_id
+            # (id, from_block, last_block, to_block): plain values dùng được ngoài session
+            pending = [
+                (r.id, r.from_block, r.last_block, r.to_block)
+                for r in get_backfill_ranges(session, job_id)
+                if r.status != "completed"
+            ]
+        db_writer.run(update_backfill_status, BackfillJob, job_id, "running")
+
+        registry = get_registry(CHAIN_ID, contract_address)
+        logger.info(f"Backfill job {job_id}: scanning {len(pending)} ranges with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"backfill-{job_id}") as pool:
+            list(pool.map(lambda r: _scan_range(r, registry, onchain_campaign_id), pending))
+
+        def finish(session: Session) -> BackfillJob:
+            ranges = get_backfill_ranges(session, job_id)
+            failed = [r for r in ranges if r.status != "completed"]
+            if failed:
+                update_backfill_status(
+                    session, BackfillJob, job_id, "failed", f"{len(failed)} of {len(ranges)} ranges failed"
+                )
+            else:
+                update_backfill_status(session, BackfillJob, job_id, "completed")
+                # Poller chưa từng chạy: tiếp tục từ cuối backfill thay vì từ head
+                # (không áp dụng cho backfill một campaign: các campaign khác chưa được quét)
+                if onchain_campaign_id is None and get_indexer_checkpoint(session, contract_address) is None:
+                    save_indexer_checkpoint(session, contract_address, get_backfill_job(session, job_id).to_block)
+            return get_backfill_job(session, job_id)
+
+        job = db_writer.run(finish)
+        logger.info(f"Backfill job {job_id} {job.status}")
+        return job
+    except Exception as e:
+        db_writer.run(update_backfill_status, BackfillJob, job_id, "failed", str(e))
+        raise
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job_id)
+
+
+def start_backfill_thread(job_id: int) -> None:
+    def target():
+        try:
+            run_backfill_job(job_id)
+        except Exception as e:
+            logger.error(f"Backfill job {job_id} error: {e}")
+
+    threading.Thread(target=target, daemon=True, name=f"backfill-{job_id}").start()
+
+
+def backfill_progress(job_id: int) -> dict | None:
+    """Tiến độ của job: số range / block đã quét, số event đã lưu"""
+    with Session(engine) as session:
+        job = get_backfill_job(session, job_id)
+        if not job:
+            return None
+        ranges = get_backfill_ranges(session, job_id)
+
+    blocks_total = job.to_block - job.from_block + 1
+    blocks_done = sum(r.last_block - r.from_block + 1 for r in ranges)
+    return {
+        "job_id": job.id,
+        "contract_address": job.contract_address,
+        "onchain_campaign_id": job.onchain_campaign_id,
+        "status": job.status,
+        "running": is_backfill_running(job.id),
+        "from_block": job.from_block,
+        "to_block": job.to_block,
+        "workers": job.workers,
+        "ranges_total": len(ranges),
+        "ranges_completed": sum(1 for r in ranges if r.status == "completed"),
+        "ranges_failed": sum(1 for r in ranges if r.status == "failed"),
+        "blocks_total": blocks_total,
+        "blocks_done": blocks_done,
+        "progress_percent": round(blocks_done * 100 / blocks_total, 2) if blocks_total else 100.0,
+        "donations_saved": sum(r.donations_saved for r in ranges),
+        "withdrawals_saved": sum(r.withdrawals_saved for r in ranges),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "ranges": [
+            {
+                "from_block": r.from_block,
+                "to_block": r.to_block,
+                "last_block": r.last_block,
+                "status": r.status,
+                "error": r.error,
+            }
+            for r in ranges
+        ],
+    }
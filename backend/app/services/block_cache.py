@@ -0,0 +1,217 @@
+"""
+Cache block_number -> timestamp dùng chung cho mọi đường ingest (poller, sync, backfill).
+
+Các block chưa có trong cache được lấy bằng một JSON-RPC batch request
+(eth_getBlockByNumber) thay vì gọi get_block riêng cho từng event.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable
+
+from web3 import Web3
+from web3._utils.request import make_post_request, async_make_post_request
+
+from ..config import BLOCK_TIMESTAMP_CACHE_SIZE
+
+logger = logging.getLogger("uvicorn.error")
+
+# Số request tối đa trong một batch (nhiều provider giới hạn ~100)
+MAX_BATCH_SIZE = 100
+# Số get_block chạy đồng thời khi fallback (async)
+MAX_CONCURRENT_HEADERS = 10
+
+
+class BlockTimestampCache:
+    """Bounded, thread-safe LRU of block number -> unix timestamp"""
+
+    def __init__(self, maxsize: int = BLOCK_TIMESTAMP_CACHE_SIZE):
+        self.maxsize = max(1, int(maxsize))
+        self._data: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, block_number: int) -> int | None:
+        with self._lock:
+            ts = self._data.get(block_number)
+            if ts is not None:
+                self._data.move_to_end(block_number)
+            return ts
+
+    def put(self, block_number: int, timestamp: int) -> None:
+        with self._lock:
+            self._data[block_number] = int(timestamp)
+            self._data.move_to_end(block_number)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_many(self, w3: Web3, block_numbers: Iterable[int]) -> dict[int, int]:
+        """
+        Timestamp cho tất cả block_numbers; các block thiếu được fetch bằng một batch.
+        Block không lấy được sẽ không có trong kết quả.
+        """
+        result = {}
+        missing = []
+        for n in sorted(set(int(b) for b in block_numbers)):
+            ts = self.get(n)
+            if ts is None:
+                missing.append(n)
+            else:
+                result[n] = ts
+
+        if missing:
+            fetched = fetch_block_timestamps(w3, missing)
+            for n, ts in fetched.items():
+                self.put(n, ts)
+            result.update(fetched)
+        return result
+
+
+def _batch_payload(block_numbers: list[int]) -> str:
+    return json.dumps([
+        {"jsonrpc": "2.0", "id": i, "method": "eth_getBlockByNumber", "params": [hex(n), False]}
+        for i, n in enumerate(block_numbers)
+    ])
+
+
+def _header_from_block(w3, blk) -> dict:
+    return {
+        "hash": w3.to_hex(blk["hash"]).lower(),
+        "parentHash": w3.to_hex(blk["parentHash"]).lower(),
+        "timestamp": int(blk["timestamp"]),
+    }
+
+
+def _supports_batch(provider) -> bool:
+    return hasattr(provider, "make_batch_request") or (
+        hasattr(provider, "endpoint_uri") and hasattr(provider, "get_request_kwargs")
+    )
+
+
+def _fetch_batch(w3: Web3, block_numbers: list[int]) -> dict[int, dict]:
+    provider = w3.provider
+    payload = _batch_payload(block_numbers)
+    if hasattr(provider, "make_batch_request"):
+        # MultiEndpointProvider: endpoint khoẻ nhất, có failover
+        raw = provider.make_batch_request(payload)
+    else:
+        raw = make_post_request(provider.endpoint_uri, payload, **dict(provider.get_request_kwargs()))
+    return _parse_batch(block_numbers, json.loads(raw))
+
+
+def _parse_batch(block_numbers: list[int], responses) -> dict[int, dict]:
+    if not isinstance(responses, list):
+        # Provider không hỗ trợ batch (trả về một error object)
+        raise ValueError(f"Batch request not supported: {responses}")
+
+    result = {}
+    for resp in responses:
+        block = resp.get("result")
+        idx = resp.get("id")
+        if block and isinstance(idx, int) and 0 <= idx < len(block_numbers):
+            result[block_numbers[idx]] = {
+                "hash": block["hash"].lower(),
+                "parentHash": block["parentHash"].lower(),
+                "timestamp": int(block["timestamp"], 16),
+            }
+    return result
+
+
+def fetch_block_headers(w3: Web3, block_numbers: list[int]) -> dict[int, dict]:
+    """
+    Header (hash, parentHash, timestamp) cho nhiều block: JSON-RPC batch với HTTP provider,
+    fallback get_block từng block nếu provider không hỗ trợ batch.
+    Timestamps lấy được cũng được đưa vào cache dùng chung.
+    """
+    result = {}
+    if _supports_batch(w3.provider):
+        for i in range(0, len(block_numbers), MAX_BATCH_SIZE):
+            chunk = block_numbers[i:i + MAX_BATCH_SIZE]
+            try:
+                result.update(_fetch_batch(w3, chunk))
+            except Exception as e:
+                logger.warning(f"Batch block header fetch failed, falling back to get_block: {e}")
+                break
+
+    for n in block_numbers:
+        if n in result:
+            continue
+        try:
+            blk = w3.eth.get_block(n)
+            if blk and blk.get("timestamp") is not None:
+                result[n] = _header_from_block(w3, blk)
+        except Exception as e:
+            logger.warning(f"Failed to get block {n}: {e}")
+
+    for n, header in result.items():
+        block_timestamps.put(n, header["timestamp"])
+    return result
+
+
+def fetch_block_timestamps(w3: Web3, block_numbers: list[int]) -> dict[int, int]:
+    """Timestamp cho nhiều block (xem fetch_block_headers)"""
+    return {n: h["timestamp"] for n, h in fetch_block_headers(w3, block_numbers).items()}
+
+
+async def async_fetch_block_headers(w3, block_numbers: list[int]) -> dict[int, dict]:
+    """
+    Bản async của fetch_block_headers cho AsyncWeb3: batch request, fallback
+    get_block đồng thời (tối đa MAX_CONCURRENT_HEADERS request cùng lúc).
+    """
+    result = {}
+    provider = w3.provider
+    if _supports_batch(provider):
+        chunks = [block_numbers[i:i + MAX_BATCH_SIZE] for i in range(0, len(block_numbers), MAX_BATCH_SIZE)]
+
+        async def fetch_chunk(chunk):
+            if hasattr(provider, "make_batch_request"):
+                raw = await provider.make_batch_request(_batch_payload(chunk))
+            else:
+                raw = await async_make_post_request(
+                    provider.endpoint_uri, _batch_payload(chunk), **dict(provider.get_request_kwargs())
+                )
+            return _parse_batch(chunk, json.loads(raw))
+
+        for fetched in await asyncio.gather(*(fetch_chunk(c) for c in chunks), return_exceptions=True):
+            if isinstance(fetched, Exception):
+                logger.warning(f"Batch block header fetch failed, falling back to get_block: {fetched}")
+                continue
+            result.update(fetched)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_HEADERS)
+
+    async def fetch_one(n):
+        async with semaphore:
+            try:
+                blk = await w3.eth.get_block(n)
+                if blk and blk.get("timestamp") is not None:
+                    result[n] = _header_from_block(w3, blk)
+            except Exception as e:
+                logger.warning(f"Failed to get block {n}: {e}")
+
+    await asyncio.gather(*(fetch_one(n) for n in block_numbers if n not in result))
+
+    for n, header in result.items():
+        block_timestamps.put(n, header["timestamp"])
+    return result
+
+
+async def async_get_block_timestamps(w3, block_numbers: Iterable[int]) -> dict[int, int]:
+    """Như BlockTimestampCache.get_many nhưng fetch các block thiếu bằng AsyncWeb3"""
+    result = {}
+    missing = []
+    for n in sorted(set(int(b) for b in block_numbers)):
+        ts = block_timestamps.get(n)
+        if ts is None:
+            missing.append(n)
+        else:
+            result[n] = ts
+    if missing:
+        fetched = await async_fetch_block_headers(w3, missing)
+        result.update({n: h["timestamp"] for n, h in fetched.items()})
+    return result
+
+
+# Cache dùng chung trong process
+block_timestamps = BlockTimestampCache()
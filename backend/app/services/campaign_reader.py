@@ -0,0 +1,222 @@
+"""
+Đọc state on-chain (getCampaign) của nhiều campaign trong một round trip.
+
+- Multicall3 (aggregate3, allowFailure=True) tại MULTICALL3_ADDRESS: một eth_call cho N campaign;
+- chain không có Multicall3 (không có code tại địa chỉ) -> một JSON-RPC batch gồm N eth_call;
+- provider không hỗ trợ batch -> eth_call tuần tự (như get_campaign_onchain cũ).
+Mọi call được ghim vào cùng một block nên kết quả nhất quán với nhau.
+
+Kết quả được cache theo campaign và block head lúc đọc: mặc định (CAMPAIGN_STATE_CACHE_BLOCKS=0)
+chỉ dùng lại khi head chưa đổi, nên một donation trực tiếp hiện ra ngay ở block kế tiếp mà không
+phải chờ ingester (vốn chỉ thấy event sau CONFIRMATION_DEPTH block). CAMPAIGN_STATE_CACHE_BLOCKS > 0
+cho phép dùng lại thêm từng ấy block; ingester (persist_ingested_events) và outbox vẫn invalidate
+campaign khi thấy DonationReceived / FundsWithdrawn / setActive của nó.
+"""
+import json
+import logging
+import threading
+
+from web3 import Web3
+from web3._utils.request import make_post_request
+from web3.exceptions import ContractLogicError
+
+from ..config import MULTICALL3_ADDRESS, CAMPAIGN_STATE_CACHE_BLOCKS
+from .block_cache import _supports_batch
+from .contract_registry import ContractRegistry
+
+logger = logging.getLogger("uvicorn.error")
+
+MULTICALL3_ABI = [{
+    "name": "aggregate3",
+    "type": "function",
+    "stateMutability": "payable",
+    "inputs": [{
+        "name": "calls",
+        "type": "tuple[]",
+        "components": [
+            {"name": "target", "type": "address"},
+            {"name": "allowFailure", "type": "bool"},
+            {"name": "callData", "type": "bytes"},
+        ],
+    }],
+    "outputs": [{
+        "name": "returnData",
+        "type": "tuple[]",
+        "components": [
+            {"name": "success", "type": "bool"},
+            {"name": "returnData", "type": "bytes"},
+        ],
+    }],
+}]
+
+# Số call tối đa trong một aggregate3 / một batch
+MAX_CALLS_PER_REQUEST = 200
+
+
+def _is_revert(error) -> bool:
+    """eth_call bị revert (campaign không tồn tại), khác với lỗi RPC / mạng"""
+    if isinstance(error, ContractLogicError):
+        return True
+    if isinstance(error, dict):
+        return error.get("code") == 3 or "revert" in str(error.get("message", "")).lower()
+    return False
+
+
+def campaign_state_dict(w3: Web3, values) -> dict:
+    owner, title, description, goal, raised, withdrawn, active = values
+    return {
+        "owner": owner,
+        "title": title,
+        "description": description,
+        "goal": float(w3.from_wei(goal, "ether")),
+        "raised": float(w3.from_wei(raised, "ether")),
+        "withdrawn": float(w3.from_wei(withdrawn, "ether")),
+        "active": active,
+        "goal_wei": int(goal),
+        "raised_wei": int(raised),
+        "withdrawn_wei": int(withdrawn),
+    }
+
+
+class CampaignStateReader:
+    def __init__(self, max_age_blocks: int = CAMPAIGN_STATE_CACHE_BLOCKS):
+        self.max_age_blocks = max_age_blocks
+        # onchain_id -> (block đã đọc, state)
+        self._cache: dict[int, tuple[int, dict]] = {}
+        self._lock = threading.Lock()
+        # địa chỉ multicall (lowercase) -> có code hay không (kiểm tra một lần)
+        self._multicall_available: dict[str, bool] = {}
+
+    def invalidate(self, onchain_ids) -> None:
+        with self._lock:
+            for onchain_id in onchain_ids:
+                self._cache.pop(int(onchain_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def read_many(self, w3: Web3, registry: ContractRegistry, onchain_ids, block: int | None = None) -> dict[int, dict]:
+        """
+        State của các campaign (onchain_id -> dict như get_campaign_onchain, thêm *_wei và block).
+        Campaign không tồn tại (call revert) không có trong kết quả; lỗi RPC được raise,
+        không bị coi là campaign không tồn tại.
+        block: đọc tại block cụ thể (không dùng / không ghi cache), vd. checkpoint của ingester.
+        """
+        ids = sorted({int(i) for i in onchain_ids})
+        if not ids:
+            return {}
+        if block is not None:
+            result = {}
+            for start in range(0, len(ids), MAX_CALLS_PER_REQUEST):
+                result.update(self._fetch(w3, registry, ids[start:start + MAX_CALLS_PER_REQUEST], block))
+            for state in result.values():
+                state["block"] = block
+            return result
+        head = w3.eth.block_number
+
+        result = {}
+        with self._lock:
+            for onchain_id in ids:
+                cached = self._cache.get(onchain_id)
+                if cached and 0 <= head - cached[0] <= self.max_age_blocks:
+                    result[onchain_id] = cached[1]
+        missing = [i for i in ids if i not in result]
+
+        for start in range(0, len(missing), MAX_CALLS_PER_REQUEST):
+            chunk = missing[start:start + MAX_CALLS_PER_REQUEST]
+            fetched = self._fetch(w3, registry, chunk, head)
+            with self._lock:
+                # Entry của block cũ không còn dùng được -> bỏ, cache không lớn dần theo số campaign đã xoá
+                stale = [i for i, (b, _) in self._cache.items() if head - b > self.max_age_blocks]
+                for onchain_id in stale:
+                    del self._cache[onchain_id]
+                for onchain_id, state in fetched.items():
+                    state["block"] = head
+                    self._cache[onchain_id] = (head, state)
+            result.update(fetched)
+        return result
+
+    def _fetch(self, w3: Web3, registry: ContractRegistry, onchain_ids: list[int], block: int) -> dict[int, dict]:
+        calldata = [registry.encode_call("getCampaign", i) for i in onchain_ids]
+        if self._has_multicall(w3):
+            try:
+                return self._fetch_multicall(w3, registry, onchain_ids, calldata, block)
+            except Exception as e:
+                logger.warning(f"Multicall3 getCampaign failed, falling back to batch eth_call: {e}")
+        if _supports_batch(w3.provider):
+            try:
+                return self._fetch_batch(w3, registry, onchain_ids, calldata, block)
+            except Exception as e:
+                logger.warning(f"Batch eth_call failed, falling back to sequential calls: {e}")
+
+        result = {}
+        for onchain_id, data in zip(onchain_ids, calldata):
+            try:
+                raw = w3.eth.call({"to": registry.address, "data": data}, block)
+            except Exception as e:
+                if not _is_revert(e):
+                    raise
+                logger.debug(f"getCampaign({onchain_id}) reverted: {e}")
+                continue
+            result[onchain_id] = campaign_state_dict(w3, registry.decode_output("getCampaign", raw))
+        return result
+
+    def _has_multicall(self, w3: Web3) -> bool:
+        if not MULTICALL3_ADDRESS:
+            return False
+        key = MULTICALL3_ADDRESS.lower()
+        if key not in self._multicall_available:
+            try:
+                code = w3.eth.get_code(Web3.to_checksum_address(MULTICALL3_ADDRESS))
+                self._multicall_available[key] = bool(code) and code not in (b"", "0x")
+            except Exception as e:
+                logger.warning(f"Unable to check Multicall3 code: {e}")
+                return False
+            if not self._multicall_available[key]:
+                logger.info(f"No Multicall3 at {MULTICALL3_ADDRESS}; using JSON-RPC batch for getCampaign")
+        return self._multicall_available[key]
+
+    def _fetch_multicall(
+        self, w3: Web3, registry: ContractRegistry, onchain_ids: list[int], calldata: list[str], block: int
+    ) -> dict[int, dict]:
+        multicall = w3.eth.contract(address=Web3.to_checksum_address(MULTICALL3_ADDRESS), abi=MULTICALL3_ABI)
+        calls = [(registry.address, True, Web3.to_bytes(hexstr=data)) for data in calldata]
+        returned = multicall.functions.aggregate3(calls).call(block_identifier=block)
+        result = {}
+        for onchain_id, (success, data) in zip(onchain_ids, returned):
+            if success and data:
+                result[onchain_id] = campaign_state_dict(w3, registry.decode_output("getCampaign", data))
+        return result
+
+    def _fetch_batch(
+        self, w3: Web3, registry: ContractRegistry, onchain_ids: list[int], calldata: list[str], block: int
+    ) -> dict[int, dict]:
+        payload = json.dumps([
+            {"jsonrpc": "2.0", "id": i, "method": "eth_call", "params": [{"to": registry.address, "data": data}, hex(block)]}
+            for i, data in enumerate(calldata)
+        ])
+        provider = w3.provider
+        if hasattr(provider, "make_batch_request"):
+            raw = provider.make_batch_request(payload)
+        else:
+            raw = make_post_request(provider.endpoint_uri, payload, **dict(provider.get_request_kwargs()))
+        responses = json.loads(raw)
+        if not isinstance(responses, list):
+            raise ValueError(f"Batch request not supported: {responses}")
+
+        result = {}
+        for resp in responses:
+            idx, data = resp.get("id"), resp.get("result")
+            if not isinstance(idx, int) or not (0 <= idx < len(onchain_ids)):
+                continue
+            if resp.get("error") and not _is_revert(resp["error"]):
+                raise ValueError(f"eth_call getCampaign({onchain_ids[idx]}) failed: {resp['error']}")
+            if not data or data == "0x":
+                continue
+            result[onchain_ids[idx]] = campaign_state_dict(w3, registry.decode_output("getCampaign", Web3.to_bytes(hexstr=data)))
+        return result
+
+
+# Cache state campaign dùng chung trong process
+campaign_state = CampaignStateReader()
@@ -0,0 +1,60 @@
+"""
+Map onchain_id -> campaign.id (local) trong bộ nhớ cho các đường ingest.
+
+Được load một lần từ DB và cập nhật khi create_campaign / update_onchain_info chạy,
+nên poller và sync không cần query Campaign cho từng event.
+"""
+import threading
+
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Campaign
+
+
+class CampaignResolver:
+    def __init__(self):
+        self._ids: dict[int, int] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, db: Session | None = None) -> None:
+        """(Re)load toàn bộ mapping từ DB"""
+        if db is None:
+            with Session(engine) as s:
+                rows = s.exec(select(Campaign.onchain_id, Campaign.id).where(Campaign.onchain_id.isnot(None))).all()
+        else:
+            rows = db.exec(select(Campaign.onchain_id, Campaign.id).where(Campaign.onchain_id.isnot(None))).all()
+        with self._lock:
+            self._ids = {int(onchain_id): int(campaign_id) for onchain_id, campaign_id in rows}
+            self._loaded = True
+
+    def register(self, onchain_id: int | None, campaign_id: int | None) -> None:
+        if onchain_id is None or campaign_id is None:
+            return
+        with self._lock:
+            self._ids[int(onchain_id)] = int(campaign_id)
+
+    def resolve(self, onchain_id: int, db: Session | None = None) -> int | None:
+        """
+        campaign.id local cho onchain_id, None nếu chưa có campaign nào liên kết.
+        Cache miss -> một query (campaign có thể được liên kết từ process khác).
+        """
+        if not self._loaded:
+            self.load(db)
+        campaign_id = self._ids.get(int(onchain_id))
+        if campaign_id is not None:
+            return campaign_id
+
+        query = select(Campaign.id).where(Campaign.onchain_id == int(onchain_id))
+        if db is None:
+            with Session(engine) as s:
+                campaign_id = s.exec(query).first()
+        else:
+            campaign_id = db.exec(query).first()
+        self.register(onchain_id, campaign_id)
+        return campaign_id
+
+
+# Resolver dùng chung trong process
+campaign_resolver = CampaignResolver()
@@ -0,0 +1,118 @@
+"""
+Registry bất biến cho contract DisasterFund, tạo một lần cho mỗi (chain, address).
+
+ABI được đọc một lần khi load module; registry giữ sẵn event ABI, topic0, bảng decoder
+topic0 -> (event name, ABI), selector / input / output types của các function.
+Mọi service method, poller (thread / asyncio / ws), backfill và outbox dùng chung
+registry thay vì tìm ABI tuyến tính và tính lại keccak mỗi lần.
+"""
+import json
+import threading
+from pathlib import Path
+from types import MappingProxyType
+
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector
+from web3 import Web3
+from web3._utils.abi import get_abi_input_types, get_abi_output_types
+
+from ..config import CHAIN_ID, DISASTER_FUND_ADDRESS
+
+
+def _find_abi_path() -> Path | None:
+    """
+    Find <repo_root>/abi/DisasterFund.json by walking up parent folders.
+    Your repo has: E:\\Disaster_Relief_Dapp\\abi\\DisasterFund.json
+    """
+    here = Path(__file__).resolve()
+    for p in here.parents:
+        candidate = p / "abi" / "DisasterFund.json"
+        if candidate.exists():
+            return candidate
+    return None
+
+ABI_PATH = _find_abi_path()
+CONTRACT_ABI = []
+if ABI_PATH:
+    artifact = json.loads(ABI_PATH.read_text(encoding="utf-8"))
+    CONTRACT_ABI = artifact.get("abi", [])
+
+
+class ContractRegistry:
+    """Metadata của một contract deployment; không đổi sau khi tạo"""
+
+    def __init__(self, chain_id: int, address: str, abi: list[dict]):
+        events, topics, decoders, functions, selectors = {}, {}, {}, {}, {}
+        for entry in abi:
+            name = entry.get("name")
+            if entry.get("type") == "event":
+                topic = Web3.to_hex(event_abi_to_log_topic(entry)).lower()
+                events[name] = entry
+                topics[name] = topic
+                decoders[topic] = (name, entry)
+            elif entry.get("type") == "function":
+                functions[name] = entry
+                selectors[name] = Web3.to_hex(function_abi_to_4byte_selector(entry))
+
+        set_ = super().__setattr__
+        set_("chain_id", int(chain_id))
+        set_("address", Web3.to_checksum_address(address))
+        set_("abi", tuple(abi))
+        set_("events", MappingProxyType(events))
+        set_("topics", MappingProxyType(topics))
+        set_("functions", MappingProxyType(functions))
+        set_("selectors", MappingProxyType(selectors))
+        set_("_decoders", MappingProxyType(decoders))
+        set_("_input_types", MappingProxyType({n: get_abi_input_types(f) for n, f in functions.items()}))
+        set_("_output_types", MappingProxyType({n: get_abi_output_types(f) for n, f in functions.items()}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ContractRegistry is immutable")
+
+    def decoders(self, event_names=None) -> MappingProxyType:
+        """Bảng topic0 (hex, lowercase) -> (event name, event ABI), giới hạn theo event_names nếu có"""
+        if event_names is None:
+            return self._decoders
+        return MappingProxyType({t: d for t, d in self._decoders.items() if d[0] in event_names})
+
+    def log_filter(self, event_names) -> dict:
+        """Filter eth_getLogs cho các event (topics[0] là danh sách -> OR giữa các signature)"""
+        return {"address": self.address, "topics": [[self.topics[n] for n in event_names if n in self.topics]]}
+
+    def encode_call(self, fn_name: str, *args) -> str:
+        """Calldata (hex) cho function call: selector + ABI-encoded arguments"""
+        data = abi_encode(list(self._input_types[fn_name]), list(args))
+        return self.selectors[fn_name] + data.hex()
+
+    def decode_output(self, fn_name: str, data: bytes) -> tuple:
+        return tuple(abi_decode(list(self._output_types[fn_name]), data))
+
+    def contract(self, w3):
+        """Contract object của web3 (dùng cho build_transaction); caller tự cache theo w3"""
+        return w3.eth.contract(address=self.address, abi=list(self.abi))
+
+
+_registries: dict[tuple[int, str], ContractRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(chain_id: int, address: str, abi: list[dict] | None = None) -> ContractRegistry:
+    key = (int(chain_id), address.lower())
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = ContractRegistry(chain_id, address, CONTRACT_ABI if abi is None else abi)
+            _registries[key] = registry
+        return registry
+
+
+def contract_registry() -> ContractRegistry:
+    """Registry của DisasterFund theo config (CHAIN_ID, DISASTER_FUND_ADDRESS)"""
+    if not DISASTER_FUND_ADDRESS:
+        raise ValueError("DISASTER_FUND_ADDRESS is missing")
+    if not CONTRACT_ABI:
+        raise ValueError(
+            "Contract ABI not found. Expected abi/DisasterFund.json at repo root. "
+            f"ABI_PATH tried: {ABI_PATH}"
+        )
+    return get_registry(CHAIN_ID, DISASTER_FUND_ADDRESS)
@@ -0,0 +1,160 @@
+"""
+Một writer thread duy nhất cho các mutation của database.
+
+Caller gửi mutation `fn(session, *args, **kwargs)` vào queue:
+- submit(): trả về Future ngay (fire-and-forget, vd. audit log);
+- run() / run_async(): chờ kết quả (thread / asyncio).
+Writer lấy mọi mutation đang chờ (tối đa DB_WRITER_MAX_BATCH, đợi thêm DB_WRITER_BATCH_WAIT_MS
+sau mutation đầu tiên) và chạy chúng trong MỘT transaction trên writer_engine: một commit
+(một fsync WAL) cho cả nhóm thay vì một commit cho mỗi caller.
+
+Mỗi mutation chạy trong SAVEPOINT riêng nên lỗi của một mutation không làm hỏng các mutation
+khác trong nhóm. Các hàm crud tự commit vẫn dùng được: trong SAVEPOINT, session.commit()
+chỉ release savepoint, commit thật do writer thực hiện. Future chỉ có kết quả sau khi commit
+của cả nhóm thành công; object trả về không bị expire (expire_on_commit=False).
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlmodel import Session
+
+from ..config import DB_WRITER_BATCH_WAIT_MS, DB_WRITER_MAX_BATCH, DB_WRITER_QUEUE_SIZE
+from ..database import writer_engine
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class _Mutation:
+    __slots__ = ("fn", "args", "kwargs", "future")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+    @property
+    def name(self) -> str:
+        return getattr(self.fn, "__name__", repr(self.fn))
+
+
+class DbWriter:
+    def __init__(
+        self,
+        batch_wait_ms: float = DB_WRITER_BATCH_WAIT_MS,
+        max_batch: int = DB_WRITER_MAX_BATCH,
+        queue_size: int = DB_WRITER_QUEUE_SIZE,
+    ):
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue[_Mutation] = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stats = {"mutations": 0, "failed": 0, "commits": 0, "max_batch_seen": 0}
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, daemon=True, name="db-writer")
+                    self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Đưa mutation vào queue; Future có kết quả của fn sau khi nhóm chứa nó được commit"""
+        if self._thread is not None and threading.current_thread() is self._thread:
+            # Mutation gọi lại writer sẽ tự chờ chính nó
+            raise RuntimeError("db_writer.submit() called from inside a mutation")
+        self._ensure_started()
+        mutation = _Mutation(fn, args, kwargs)
+        self._queue.put(mutation)
+        return mutation.future
+
+    def run(self, fn, *args, timeout: float | None = None, **kwargs):
+        """Gửi mutation và chờ commit (blocking, dùng trong thread)"""
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    async def run_async(self, fn, *args, **kwargs):
+        """Gửi mutation và await commit mà không chặn event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "queued": self._queue.qsize()}
+
+    # ---------------- writer thread ----------------
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit_group(batch)
+            except Exception as e:
+                logger.exception(f"DB writer group commit failed: {e}")
+                for mutation in batch:
+                    if not mutation.future.done():
+                        mutation.future.set_exception(e)
+
+    def _commit_group(self, batch: list[_Mutation]) -> None:
+        pending = [m for m in batch if m.future.set_running_or_notify_cancel()]
+        while pending:
+            done, failed, poisoned = [], [], None
+            with Session(writer_engine, expire_on_commit=False) as session:
+                session.begin()
+                for mutation in pending:
+                    savepoint = session.begin_nested()
+                    try:
+                        result = mutation.fn(session, *mutation.args, **mutation.kwargs)
+                        if savepoint.is_active:
+                            savepoint.commit()
+                        done.append((mutation, result))
+                    except Exception as e:
+                        logger.warning(f"DB write {mutation.name} failed: {e}")
+                        if savepoint.is_active:
+                            savepoint.rollback()
+                            failed.append((mutation, e))
+                        else:
+                            # fn đã commit (release savepoint) rồi mới lỗi: không tách được phần đã ghi
+                            poisoned = (mutation, e)
+                            break
+
+                if poisoned is not None:
+                    # Bỏ cả nhóm, chạy lại các mutation còn lại trong transaction mới
+                    session.rollback()
+                    for mutation, e in failed + [poisoned]:
+                        mutation.future.set_exception(e)
+                    excluded = {id(m) for m, _ in failed + [poisoned]}
+                    pending = [m for m in pending if id(m) not in excluded]
+                    self._record(len(failed) + 1, 0, 0)
+                    continue
+
+                session.commit()
+
+            for mutation, e in failed:
+                mutation.future.set_exception(e)
+            for mutation, result in done:
+                mutation.future.set_result(result)
+            self._record(len(failed), len(done), len(pending))
+            return
+
+    def _record(self, failed: int, succeeded: int, batch_size: int) -> None:
+        with self._lock:
+            self._stats["failed"] += failed
+            self._stats["mutations"] += succeeded
+            if batch_size:
+                self._stats["commits"] += 1
+                self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], batch_size)
+
+
+# Writer dùng chung trong process (writer_engine chỉ có một connection)
+db_writer = DbWriter()
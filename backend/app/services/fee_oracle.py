@@ -0,0 +1,128 @@
+"""
+Fee oracle EIP-1559 và gas limit cho các transaction server-signed.
+
+FeeOracle lấy mẫu eth_feeHistory trong background (mỗi FEE_ORACLE_INTERVAL giây) và cache
+base fee của block kế tiếp + các percentile priority fee; khi gửi transaction, fees được
+lấy từ cache (không thêm round trip). maxFeePerGas = 2 * base fee + tip, nên transaction
+vẫn vào block khi base fee tăng liên tiếp vài block mà chỉ trả đúng base fee thực tế.
+Chain không hỗ trợ eth_feeHistory -> fallback legacy gasPrice (cũng được cache).
+
+GasEstimator gọi estimate_gas cho TỪNG transaction (cộng thêm GAS_LIMIT_MARGIN), không cache:
+gas phụ thuộc storage (SSTORE zero -> nonzero tốn thêm ~20k gas, vd. setActive false -> true
+hay lần withdraw đầu tiên của campaign), và estimate còn là pre-check revert trước khi gửi.
+"""
+import logging
+import statistics
+import threading
+import time
+
+from ..config import (
+    FEE_ORACLE_INTERVAL,
+    FEE_CACHE_TTL,
+    FEE_HISTORY_BLOCKS,
+    GAS_LIMIT_MARGIN,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+# Percentile priority fee theo tốc độ
+PRIORITY_PERCENTILES = {"slow": 10, "standard": 50, "fast": 90}
+
+# Replacement phải tăng fee ít nhất 10% (geth); dùng 12.5%
+FEE_BUMP = 1.125
+
+
+class FeeOracle:
+    def __init__(self, interval: float = FEE_ORACLE_INTERVAL, ttl: float = FEE_CACHE_TTL):
+        self.interval = interval
+        self.ttl = ttl
+        self._w3 = None
+        self._snapshot: dict | None = None
+        self._sampled_at = 0.0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self, w3) -> dict:
+        percentiles = sorted(PRIORITY_PERCENTILES.values())
+        try:
+            history = w3.eth.fee_history(FEE_HISTORY_BLOCKS, "latest", percentiles)
+            # baseFeePerGas có thêm một phần tử: base fee của block kế tiếp
+            base_fee = int(history["baseFeePerGas"][-1])
+            rewards = history.get("reward") or []
+            tips = {}
+            for name, pct in PRIORITY_PERCENTILES.items():
+                idx = percentiles.index(pct)
+                samples = [int(r[idx]) for r in rewards if len(r) > idx]
+                tips[name] = int(statistics.median(samples)) if samples else 0
+            # Block rỗng cho reward = 0: giữ tối thiểu 1 wei để được ưu tiên
+            snapshot = {"base_fee": base_fee, "tips": {k: max(1, v) for k, v in tips.items()}}
+        except Exception as e:
+            logger.debug(f"eth_feeHistory unavailable, using legacy gasPrice: {e}")
+            snapshot = {"gas_price": int(w3.eth.gas_price)}
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._sampled_at = time.monotonic()
+        return snapshot
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._sample(self._w3)
+            except Exception as e:
+                logger.warning(f"Fee oracle sample failed: {e}")
+
+    def _ensure_started(self, w3) -> None:
+        self._w3 = w3
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, daemon=True, name="fee-oracle")
+                    self._thread.start()
+
+    def snapshot(self, w3) -> dict:
+        """Fee data mới nhất; lấy mẫu đồng bộ chỉ khi cache trống hoặc quá TTL"""
+        self._ensure_started(w3)
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._sampled_at < self.ttl:
+                return self._snapshot
+        return self._sample(w3)
+
+    def get_fees(self, w3, speed: str = "standard") -> dict:
+        """Các field fee cho build_transaction (EIP-1559, hoặc gasPrice trên chain legacy)"""
+        snap = self.snapshot(w3)
+        if "gas_price" in snap:
+            return {"gasPrice": snap["gas_price"]}
+        tip = snap["tips"].get(speed, snap["tips"]["standard"])
+        return {"maxFeePerGas": 2 * snap["base_fee"] + tip, "maxPriorityFeePerGas": tip}
+
+    def bump(self, w3, previous: dict, speed: str = "fast") -> dict:
+        """Fees cho replacement: >= previous * FEE_BUMP cho mọi field, và không thấp hơn thị trường hiện tại"""
+        current = self.get_fees(w3, speed)
+        if "gasPrice" in previous or "gasPrice" in current:
+            prev = previous.get("gasPrice") or previous.get("maxFeePerGas") or 0
+            cur = current.get("gasPrice") or current.get("maxFeePerGas")
+            return {"gasPrice": max(int(prev * FEE_BUMP) + 1, cur)}
+        return {
+            key: max(int(previous[key] * FEE_BUMP) + 1, current[key])
+            for key in ("maxFeePerGas", "maxPriorityFeePerGas")
+        }
+
+
+class GasEstimator:
+    def __init__(self, margin: float = GAS_LIMIT_MARGIN):
+        self.margin = margin
+
+    def gas_limit(self, fn, sender: str) -> int:
+        """
+        Gas limit cho contract call: estimate_gas với đúng calldata và state hiện tại, cộng margin.
+        Call sẽ revert (vd. không đủ số dư khả dụng) -> estimate_gas raise, transaction không được gửi.
+        """
+        estimate = fn.estimate_gas({"from": sender})
+        return int(estimate * (1 + self.margin))
+
+
+# Dùng chung trong process
+fee_oracle = FeeOracle()
+gas_estimates = GasEstimator()
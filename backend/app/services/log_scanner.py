@@ -0,0 +1,238 @@
+"""
+Quét eth_getLogs theo từng chunk block với kích thước tự điều chỉnh.
+
+RPC providers từ chối (hoặc timeout) khi range quá lớn / quá nhiều kết quả.
+LogRangeScanner chia [from_block, to_block] thành các chunk, tăng kích thước chunk
+sau mỗi lần thành công và giảm một nửa khi provider báo lỗi giới hạn range / kết quả.
+Lỗi rate limit (HTTP 429...) không đổi kích thước chunk: chờ backoff (Retry-After nếu có,
+tăng gấp đôi từ LOG_SCAN_RATE_LIMIT_BACKOFF giây) rồi thử lại, tối đa LOG_SCAN_RATE_LIMIT_RETRIES lần.
+"""
+import asyncio
+import logging
+import time
+
+import requests
+
+from ..config import (
+    LOG_SCAN_INITIAL_CHUNK,
+    LOG_SCAN_MIN_CHUNK,
+    LOG_SCAN_MAX_CHUNK,
+    LOG_SCAN_CONCURRENCY,
+    LOG_SCAN_RATE_LIMIT_RETRIES,
+    LOG_SCAN_RATE_LIMIT_BACKOFF,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+# Các thông báo lỗi provider trả về khi range / số kết quả vượt giới hạn
+# (Infura, Alchemy, QuickNode, geth, erigon, public Sepolia nodes...).
+# Chỉ các câu cụ thể: "limit" / "exceed" / "too many" chung chung cũng khớp lỗi rate limit.
+_RANGE_LIMIT_MARKERS = (
+    "query returned more than",
+    "block range",
+    "range is too large",
+    "range too large",
+    "response size",
+    "too many results",
+    "too many logs",
+    "more than 10000 results",
+    "is limited to a",
+    "query timeout",
+    "context deadline exceeded",
+)
+
+# Provider đang throttle (HTTP 429, "rate limit exceeded"...): chia nhỏ chunk chỉ làm tăng số request.
+# Không dùng substring như "429" / "capacity": message lỗi range chứa hex block range (vd. 0x44A429).
+_RATE_LIMIT_MARKERS = (
+    "rate limit",
+    "too many requests",
+    "request rate",
+)
+
+# JSON-RPC error code "limit exceeded" (message không rõ ràng -> coi là giới hạn range)
+_RANGE_LIMIT_CODES = (-32005, -32602)
+
+
+def _error_message(exc: Exception) -> tuple[int | None, str]:
+    payload = exc.args[0] if exc.args else None
+    if isinstance(payload, dict):
+        return payload.get("code"), str(payload.get("message", "")).lower()
+    return None, str(exc).lower()
+
+
+def _is_range_limit(code: int | None, message: str) -> bool:
+    if any(marker in message for marker in _RANGE_LIMIT_MARKERS):
+        return True
+    # -32005 cũng là code rate limit của Infura: message nói rõ rate limit thì không phải range
+    return code in _RANGE_LIMIT_CODES and not any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """True nếu provider từ chối vì rate limit (thử lại sau, giữ nguyên chunk)"""
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    code, message = _error_message(exc)
+    if _is_range_limit(code, message):
+        return False
+    return any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+def is_range_limit_error(exc: Exception) -> bool:
+    """True nếu lỗi cho thấy range quá lớn và nên thử lại với chunk nhỏ hơn"""
+    if isinstance(exc, (requests.exceptions.Timeout, TimeoutError)):
+        return True
+    if getattr(getattr(exc, "response", None), "status_code", None) == 429:
+        return False
+    return _is_range_limit(*_error_message(exc))
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Retry-After (giây) của response 429, nếu có"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LogRangeScanner:
+    """
+    Adaptive chunked eth_getLogs.
+
+    The chunk size is kept on the instance, so a long-lived scanner (the poller,
+    a service) remembers the largest range the provider accepts between calls.
+    """
+
+    def __init__(
+        self,
+        w3,
+        initial_chunk: int = LOG_SCAN_INITIAL_CHUNK,
+        min_chunk: int = LOG_SCAN_MIN_CHUNK,
+        max_chunk: int = LOG_SCAN_MAX_CHUNK,
+        growth: float = 2.0,
+    ):
+        self.w3 = w3
+        self.min_chunk = max(1, int(min_chunk))
+        self.max_chunk = max(self.min_chunk, int(max_chunk))
+        self.chunk_size = min(self.max_chunk, max(self.min_chunk, int(initial_chunk)))
+        self.growth = growth
+        # Kích thước nhỏ nhất từng bị từ chối; không tăng vượt quá mức này cho đến khi
+        # đủ số lần thành công liên tiếp (giới hạn theo số kết quả có thể thay đổi)
+        self._ceiling: int | None = None
+        self._successes = 0
+        self.rate_limit_retries = LOG_SCAN_RATE_LIMIT_RETRIES
+        self.rate_limit_backoff = LOG_SCAN_RATE_LIMIT_BACKOFF
+
+    def _backoff(self, exc: Exception, attempt: int) -> float:
+        """Số giây chờ trước lần thử lại thứ `attempt` sau lỗi rate limit; raise khi hết lượt"""
+        if attempt > self.rate_limit_retries:
+            raise exc
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = self.rate_limit_backoff * 2 ** (attempt - 1)
+        return min(delay, 60.0)
+
+    def _grow(self) -> None:
+        self._successes += 1
+        if self._ceiling is not None and self._successes >= 10:
+            self._ceiling = None
+        limit = self.max_chunk if self._ceiling is None else max(self.min_chunk, self._ceiling - 1)
+        self.chunk_size = min(limit, max(self.chunk_size + 1, int(self.chunk_size * self.growth)))
+
+    def _shrink(self) -> None:
+        self._ceiling = self.chunk_size if self._ceiling is None else min(self._ceiling, self.chunk_size)
+        self._successes = 0
+        self.chunk_size = max(self.min_chunk, self.chunk_size // 2)
+
+    def iter_chunks(self, filter_params: dict, from_block: int, to_block: int):
+        """
+        Yield (start, end, logs) cho từng chunk đã quét thành công, theo thứ tự block tăng dần.
+
+        filter_params: các key của eth_getLogs ngoài fromBlock/toBlock (address, topics).
+        Raise lỗi gốc nếu không phải lỗi giới hạn, hoặc khi chunk đã nhỏ nhất mà vẫn lỗi.
+        """
+        start = int(from_block)
+        to_block = int(to_block)
+        throttled = 0
+        while start <= to_block:
+            end = min(to_block, start + self.chunk_size - 1)
+            try:
+                logs = self.w3.eth.get_logs({**filter_params, "fromBlock": start, "toBlock": end})
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    throttled += 1
+                    delay = self._backoff(e, throttled)
+                    logger.info(f"get_logs {start}-{end} rate limited ({e}); retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                if not is_range_limit_error(e) or end == start or self.chunk_size <= self.min_chunk:
+                    raise
+                self._shrink()
+                logger.info(f"get_logs {start}-{end} rejected ({e}); chunk size -> {self.chunk_size}")
+                continue
+
+            yield start, end, logs
+            start = end + 1
+            throttled = 0
+            self._grow()
+
+    def scan(self, filter_params: dict, from_block: int, to_block: int) -> list:
+        """Quét toàn bộ [from_block, to_block] và trả về tất cả logs"""
+        logs = []
+        for _, _, chunk_logs in self.iter_chunks(filter_params, from_block, to_block):
+            logs.extend(chunk_logs)
+        return logs
+
+
+class AsyncLogRangeScanner(LogRangeScanner):
+    """
+    LogRangeScanner cho AsyncWeb3: các chunk của một range được query đồng thời
+    (tối đa `concurrency` request), chunk bị từ chối được chia đôi và query lại.
+    """
+
+    def __init__(self, w3, concurrency: int = LOG_SCAN_CONCURRENCY, **kwargs):
+        super().__init__(w3, **kwargs)
+        self.concurrency = max(1, int(concurrency))
+
+    async def _get_logs(self, semaphore, filter_params: dict, start: int, end: int) -> list:
+        throttled = 0
+        while True:
+            async with semaphore:
+                try:
+                    logs = await self.w3.eth.get_logs({**filter_params, "fromBlock": start, "toBlock": end})
+                    self._grow()
+                    return list(logs)
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        throttled += 1
+                        delay = self._backoff(e, throttled)
+                    elif not is_range_limit_error(e) or end == start or end - start + 1 <= self.min_chunk:
+                        raise
+                    else:
+                        self._shrink()
+                        logger.info(f"get_logs {start}-{end} rejected ({e}); chunk size -> {self.chunk_size}")
+                        break
+            # Chờ ngoài semaphore để các chunk khác không bị giữ chỗ
+            logger.info(f"get_logs {start}-{end} rate limited; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        mid = (start + end) // 2
+        left, right = await asyncio.gather(
+            self._get_logs(semaphore, filter_params, start, mid),
+            self._get_logs(semaphore, filter_params, mid + 1, end),
+        )
+        return left + right
+
+    async def scan(self, filter_params: dict, from_block: int, to_block: int) -> list:
+        """Quét [from_block, to_block]; logs trả về theo thứ tự block tăng dần"""
+        ranges = []
+        start = int(from_block)
+        while start <= int(to_block):
+            end = min(int(to_block), start + self.chunk_size - 1)
+            ranges.append((start, end))
+            start = end + 1
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chunks = await asyncio.gather(*(self._get_logs(semaphore, filter_params, s, e) for s, e in ranges))
+        return [log for chunk in chunks for log in chunk]
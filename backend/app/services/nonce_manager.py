@@ -0,0 +1,155 @@
+"""
+Cấp nonce local cho các signer của backend (DEPLOYER_PRIVATE_KEY).
+
+Trước đây mỗi transaction gọi get_transaction_count(..., 'pending') rồi tăng gas khi gặp
+"replacement transaction underpriced"; hai request gửi cùng lúc sẽ lấy trùng nonce.
+NonceManager giữ nonce kế tiếp cho mỗi signer trong bộ nhớ, cấp nonce dưới lock
+(an toàn giữa threads; phần async chỉ await RPC ngoài lock), nên có thể gửi
+nhiều transaction liên tiếp mà không đụng nonce.
+
+Đồng bộ với chain:
+- lần đầu và tối đa mỗi NONCE_SYNC_INTERVAL giây: lấy pending count từ node;
+  node cao hơn (signer được dùng ở nơi khác) -> nhảy lên;
+- node thấp hơn và transaction đã gửi lâu hơn NONCE_DROP_TIMEOUT vẫn chưa được
+  node biết (bị drop khỏi mempool) -> hạ về pending count của node;
+- nonce đã cấp nhưng gửi thất bại được release và cấp lại trước (không để lại gap);
+- lỗi "nonce too low" -> resync bắt buộc. "replacement transaction underpriced" KHÔNG phải
+  nonce cũ: node đang giữ một transaction của ta với nonce này (có thể từ lần gửi trước
+  tưởng là lỗi), nên nonce không được cấp lại cho transaction khác.
+"""
+import logging
+import threading
+import time
+
+from ..config import NONCE_SYNC_INTERVAL, NONCE_DROP_TIMEOUT
+
+logger = logging.getLogger("uvicorn.error")
+
+# Lỗi cho thấy nonce local đã cũ (đã được dùng bởi transaction khác)
+_STALE_NONCE_MARKERS = ("nonce too low", "already been used")
+
+
+def is_stale_nonce_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return any(marker in message for marker in _STALE_NONCE_MARKERS)
+
+
+def is_underpriced_error(exc: Exception) -> bool:
+    """Node đã có một transaction khác của ta với cùng nonce (nonce đang bị chiếm, không phải cũ)"""
+    return "replacement transaction underpriced" in str(exc).lower()
+
+
+def is_already_known_error(exc: Exception) -> bool:
+    """Node đã có đúng transaction này (gửi lại cùng raw tx) -> coi như đã gửi"""
+    message = str(exc).lower()
+    return "already known" in message or "known transaction" in message
+
+
+class _SignerState:
+    def __init__(self):
+        self.next_nonce: int | None = None
+        self.reserved: set[int] = set()  # nonce đã cấp, đang build / sign / gửi
+        self.released: set[int] = set()  # nonce đã cấp nhưng không gửi được -> cấp lại trước
+        self.sent: dict[int, float] = {}  # nonce -> thời điểm gửi (chưa thấy node xác nhận)
+        self.last_sync = 0.0
+
+
+class NonceManager:
+    def __init__(self):
+        self._signers: dict[str, _SignerState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, address: str) -> _SignerState:
+        key = address.lower()
+        if key not in self._signers:
+            self._signers[key] = _SignerState()
+        return self._signers[key]
+
+    def _needs_sync(self, address: str, force: bool) -> bool:
+        with self._lock:
+            state = self._state(address)
+            return force or state.next_nonce is None or time.monotonic() - state.last_sync >= NONCE_SYNC_INTERVAL
+
+    def _merge_chain_count(self, address: str, chain_pending: int) -> None:
+        """Gộp pending count của node vào state local (gọi khi đang giữ lock)"""
+        state = self._state(address)
+        now = time.monotonic()
+        state.last_sync = now
+        # Các nonce < chain_pending đã được node biết
+        state.sent = {n: t for n, t in state.sent.items() if n >= chain_pending}
+        state.released = {n for n in state.released if n >= chain_pending}
+
+        if state.next_nonce is None or chain_pending > state.next_nonce:
+            if state.next_nonce is not None:
+                logger.info(f"Nonce for {address} advanced externally: {state.next_nonce} -> {chain_pending}")
+            state.next_nonce = chain_pending
+            state.released.clear()
+        elif chain_pending < state.next_nonce:
+            oldest_sent = min(state.sent.values()) if state.sent else None
+            if oldest_sent is not None and now - oldest_sent >= NONCE_DROP_TIMEOUT:
+                # Transaction đã gửi nhưng node không còn biết -> bị drop, lấp gap
+                logger.warning(f"Nonce gap for {address}: local next={state.next_nonce}, node pending={chain_pending}; resyncing")
+                state.next_nonce = chain_pending
+                state.sent.clear()
+                state.released.clear()
+            elif oldest_sent is None and not state.released and not state.reserved:
+                # Không có transaction nào đang chờ mà node vẫn thấp hơn (vd. node khác sau failover)
+                state.next_nonce = chain_pending
+
+    def _take(self, address: str) -> int:
+        state = self._state(address)
+        if state.released:
+            nonce = min(state.released)
+            state.released.discard(nonce)
+        else:
+            nonce = state.next_nonce
+            state.next_nonce += 1
+        state.reserved.add(nonce)
+        return nonce
+
+    def allocate(self, w3, address: str, force_sync: bool = False) -> int:
+        """Nonce kế tiếp cho address (Web3 sync)"""
+        if self._needs_sync(address, force_sync):
+            chain_pending = w3.eth.get_transaction_count(address, "pending")
+            with self._lock:
+                self._merge_chain_count(address, chain_pending)
+        with self._lock:
+            return self._take(address)
+
+    async def allocate_async(self, w3, address: str, force_sync: bool = False) -> int:
+        """Như allocate nhưng với AsyncWeb3 (RPC được await ngoài lock)"""
+        if self._needs_sync(address, force_sync):
+            chain_pending = await w3.eth.get_transaction_count(address, "pending")
+            with self._lock:
+                self._merge_chain_count(address, chain_pending)
+        with self._lock:
+            return self._take(address)
+
+    def mark_sent(self, address: str, nonce: int) -> None:
+        with self._lock:
+            state = self._state(address)
+            state.reserved.discard(nonce)
+            state.sent[nonce] = time.monotonic()
+
+    def release(self, address: str, nonce: int) -> None:
+        """Transaction với nonce này không được gửi -> cấp lại cho transaction kế tiếp"""
+        with self._lock:
+            state = self._state(address)
+            state.reserved.discard(nonce)
+            if state.next_nonce is not None and nonce == state.next_nonce - 1:
+                state.next_nonce -= 1
+            else:
+                state.released.add(nonce)
+
+    def invalidate(self, address: str) -> None:
+        """Nonce local không còn đúng: lần allocate sau sẽ resync từ node"""
+        with self._lock:
+            state = self._state(address)
+            state.next_nonce = None
+            state.reserved.clear()
+            state.released.clear()
+            state.sent.clear()
+
+
+# Nonce manager dùng chung trong process
+nonce_manager = NonceManager()
@@ -0,0 +1,173 @@
+"""
+Đối soát tổng donation / withdrawal trong DB với raised / withdrawn trên contract.
+
+Mỗi lần chạy:
+- tổng wei chính xác theo campaign trong DB: một query GROUP BY (chỉ event tới checkpoint của ingester);
+- raised / withdrawn on-chain của mọi campaign: một Multicall3 / JSON-RPC batch, đọc tại
+  cùng block checkpoint nên event chưa đủ confirmations không bị tính là lệch;
+- campaign lệch quá RECONCILE_TOLERANCE_WEI và DB thiếu tiền -> backfill chỉ event của campaign
+  đó (topic1 filter) từ DEPLOY_BLOCK tới checkpoint, nếu campaign chưa có backfill đang chạy.
+  Không tự backfill khi chưa đặt DEPLOY_BLOCK (sẽ quét từ block 0), hoặc khi job backfill gần nhất
+  của campaign đã xong mà sai lệch vẫn y như lúc tạo job (quét lại cũng không sửa được): chỉ báo cáo.
+DB dư (vd. event bị reorg mà chưa rollback) chỉ được báo cáo, không tự xoá.
+
+Chạy định kỳ mỗi RECONCILE_INTERVAL giây (0 = tắt) và qua POST /api/v1/admin/reconcile.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlmodel import Session
+from web3 import Web3
+
+from ..config import DISASTER_FUND_ADDRESS, DEPLOY_BLOCK, RECONCILE_INTERVAL, RECONCILE_TOLERANCE_WEI, RECONCILE_AUTO_BACKFILL
+from ..crud import (
+    get_campaign_event_totals,
+    get_indexer_checkpoint,
+    get_active_backfill_campaigns,
+    get_last_reconcile_backfills,
+    create_audit_log,
+)
+from ..database import engine
+from ..models import AuditLog
+from .backfill import plan_backfill, start_backfill_thread
+from .db_writer import db_writer
+from .wei_backfill import wei_backfill_pending
+from .web3_service import make_service
+
+logger = logging.getLogger("uvicorn.error")
+
+_last_report: dict | None = None
+_run_lock = threading.Lock()
+
+
+def reconcile_campaigns(requested_by: str = "system", backfill: bool = RECONCILE_AUTO_BACKFILL) -> dict:
+    """Chạy một lần đối soát; trả về report (cũng được lưu cho GET /admin/reconcile)"""
+    global _last_report
+    if wei_backfill_pending():
+        # Tổng SQL chưa tính được rows cũ chưa có amount_gwei / amount_wei_rem
+        raise RuntimeError("Wei backfill is still running; reconciliation postponed")
+    if not _run_lock.acquire(blocking=False):
+        raise RuntimeError("Reconciliation is already running")
+    try:
+        started = time.monotonic()
+        svc = make_service()
+        contract_address = Web3.to_checksum_address(DISASTER_FUND_ADDRESS)
+
+        with Session(engine) as session:
+            cp = get_indexer_checkpoint(session, contract_address)
+            # So sánh tại checkpoint: DB đã có đủ mọi event tới block này
+            block = cp.last_block if cp else svc.w3.eth.block_number
+            totals = get_campaign_event_totals(session, max_block=block if cp else None)
+            backfilling = get_active_backfill_campaigns(session)
+            last_backfills = get_last_reconcile_backfills(session)
+
+        onchain = svc.get_campaigns_onchain([t["onchain_id"] for t in totals], block=block)
+
+        drifted = []
+        missing_onchain = []
+        for t in totals:
+            state = onchain.get(t["onchain_id"])
+            if state is None:
+                missing_onchain.append(t["campaign_id"])
+                continue
+            raised_diff = state["raised_wei"] - t["donated_wei"]
+            withdrawn_diff = state["withdrawn_wei"] - t["withdrawn_wei"]
+            if abs(raised_diff) <= RECONCILE_TOLERANCE_WEI and abs(withdrawn_diff) <= RECONCILE_TOLERANCE_WEI:
+                continue
+            drifted.append({
+                "campaign_id": t["campaign_id"],
+                "onchain_id": t["onchain_id"],
+                "onchain_raised_wei": str(state["raised_wei"]),
+                "db_raised_wei": str(t["donated_wei"]),
+                "raised_diff_wei": str(raised_diff),
+                "onchain_withdrawn_wei": str(state["withdrawn_wei"]),
+                "db_withdrawn_wei": str(t["withdrawn_wei"]),
+                "withdrawn_diff_wei": str(withdrawn_diff),
+                "donation_count": t["donation_count"],
+                "withdrawal_count": t["withdrawal_count"],
+                # DB thiếu event -> backfill được; DB dư -> cần kiểm tra thủ công
+                "db_missing_events": raised_diff > RECONCILE_TOLERANCE_WEI or withdrawn_diff > RECONCILE_TOLERANCE_WEI,
+                "backfill_job_id": None,
+                "backfill_running": t["onchain_id"] in backfilling,
+                "backfill_skipped": None,
+            })
+
+        for item in drifted:
+            if not backfill or not item["db_missing_events"]:
+                continue
+            if item["backfill_running"]:
+                continue
+            if DEPLOY_BLOCK is None:
+                item["backfill_skipped"] = "DEPLOY_BLOCK is not set"
+                continue
+            drift = f"{item['raised_diff_wei']}/{item['withdrawn_diff_wei']}"
+            previous = last_backfills.get(item["onchain_id"])
+            if previous is not None and previous.status == "completed" and previous.drift == drift:
+                item["backfill_skipped"] = f"backfill job {previous.id} completed with the same drift"
+                continue
+            try:
+                job = plan_backfill(
+                    from_block=DEPLOY_BLOCK,
+                    to_block=block,
+                    requested_by=requested_by,
+                    onchain_campaign_id=item["onchain_id"],
+                    drift=drift,
+                )
+                start_backfill_thread(job.id)
+                item["backfill_job_id"] = job.id
+                item["backfill_running"] = True
+            except Exception as e:
+                logger.error(f"Reconciliation backfill for campaign {item['campaign_id']} failed to start: {e}")
+
+        report = {
+            "checked_at": datetime.utcnow().isoformat(),
+            "block": block,
+            "campaigns_checked": len(totals),
+            "campaigns_drifted": len(drifted),
+            "drifted": drifted,
+            "missing_onchain": missing_onchain,
+            "duration_ms": int((time.monotonic() - started) * 1000),
+            "requested_by": requested_by,
+        }
+        _last_report = report
+
+        if drifted:
+            logger.warning(f"Reconciliation at block {block}: {len(drifted)}/{len(totals)} campaigns drifted")
+            try:
+                db_writer.submit(create_audit_log, audit_log=AuditLog(
+                    action="reconciliation_drift",
+                    username=requested_by,
+                    details=f"block={block}, campaigns={[d['campaign_id'] for d in drifted]}, "
+                            f"backfills={[d['backfill_job_id'] for d in drifted if d['backfill_job_id']]}",
+                ))
+            except Exception as e:
+                logger.warning(f"Failed to write audit log for reconciliation: {e}")
+        else:
+            logger.info(f"Reconciliation at block {block}: {len(totals)} campaigns match")
+        return report
+    finally:
+        _run_lock.release()
+
+
+def last_reconciliation_report() -> dict | None:
+    return _last_report
+
+
+def reconciliation_job(interval: float = RECONCILE_INTERVAL) -> None:
+    logger.info(f"Reconciliation job started (every {interval}s)")
+    while True:
+        time.sleep(interval)
+        try:
+            reconcile_campaigns()
+        except Exception as e:
+            logger.error(f"Reconciliation error: {e}")
+
+
+def start_reconciliation_thread(interval: float = RECONCILE_INTERVAL) -> bool:
+    """Chạy đối soát định kỳ trong daemon thread; False nếu tắt (interval <= 0) hoặc thiếu config"""
+    if interval <= 0 or not DISASTER_FUND_ADDRESS:
+        return False
+    threading.Thread(target=reconciliation_job, args=(interval,), daemon=True, name="reconciliation").start()
+    return True
@@ -0,0 +1,375 @@
+"""
+RPC provider nhiều endpoint (RPC_URLS) với health scoring, failover và hedged reads.
+
+Mỗi endpoint có EndpointHealth (EWMA latency + EWMA error rate + cooldown sau lỗi liên tiếp),
+dùng chung trong process theo URL, nên mọi Web3 instance (service, poller, backfill)
+cùng biết endpoint nào đang chậm / lỗi.
+
+- Mỗi request đi tới endpoint có score tốt nhất; lỗi kết nối / timeout / HTTP 429, 5xx
+  / JSON-RPC rate limit -> thử endpoint kế tiếp.
+- Read methods được hedge: nếu endpoint đầu chưa trả lời sau hedge delay (hoặc lỗi), gửi cùng
+  request tới endpoint kế tiếp và lấy response thành công tới trước.
+- JSON-RPC error bình thường (revert, range quá lớn...) được trả về nguyên vẹn, không failover.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from aiohttp import ClientTimeout
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, AsyncHTTPProvider
+from web3.providers.base import JSONBaseProvider
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3._utils.request import async_make_post_request
+
+from ..config import RPC_URLS, RPC_TIMEOUT, RPC_POOL_SIZE, RPC_HEDGE_DELAY_MS, RPC_ERROR_COOLDOWN
+
+logger = logging.getLogger("uvicorn.error")
+
+# Các method chỉ đọc: an toàn để gửi đồng thời tới hai endpoint
+HEDGED_METHODS = frozenset({
+    "eth_blockNumber",
+    "eth_call",
+    "eth_chainId",
+    "eth_estimateGas",
+    "eth_feeHistory",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getBlockByHash",
+    "eth_getBlockByNumber",
+    "eth_getCode",
+    "eth_getLogs",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "eth_maxPriorityFeePerGas",
+    "net_version",
+    "web3_clientVersion",
+})
+
+# Chỉ các câu cụ thể (HTTP 429 được xử lý theo status code): lỗi range quá lớn phải trả về nguyên vẹn
+_RATE_LIMIT_MARKERS = ("rate limit", "too many requests", "request rate")
+
+# Số request đồng thời tối đa cho một read (primary + một hedge)
+MAX_IN_FLIGHT = 2
+
+# EWMA weight cho mẫu mới
+_ALPHA = 0.2
+# Số lỗi liên tiếp trước khi endpoint bị đưa vào cooldown
+_MAX_CONSECUTIVE_ERRORS = 3
+
+
+class EndpointHealth:
+    """Latency / error rate của một endpoint (thread-safe)"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency_ms = 100.0  # EWMA
+        self.error_rate = 0.0  # EWMA của 0/1
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, latency_ms: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.latency_ms += _ALPHA * (latency_ms - self.latency_ms)
+            self.error_rate *= 1 - _ALPHA
+            self.consecutive_errors = 0
+            self.cooldown_until = 0.0
+
+    def record_error(self, latency_ms: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.latency_ms += _ALPHA * (max(latency_ms, self.latency_ms) - self.latency_ms)
+            self.error_rate += _ALPHA * (1 - self.error_rate)
+            self.consecutive_errors += 1
+            if self.consecutive_errors >= _MAX_CONSECUTIVE_ERRORS:
+                self.cooldown_until = time.monotonic() + RPC_ERROR_COOLDOWN
+
+    def score(self) -> float:
+        """Càng nhỏ càng tốt; endpoint đang cooldown luôn xếp sau"""
+        penalty = 1e9 if time.monotonic() < self.cooldown_until else 0.0
+        return penalty + self.latency_ms * (1 + 10 * self.error_rate)
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "latency_ms": round(self.latency_ms, 1),
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "cooling_down": time.monotonic() < self.cooldown_until,
+        }
+
+
+# Health dùng chung theo URL trong process
+_health: dict[str, EndpointHealth] = {}
+_health_lock = threading.Lock()
+
+
+def get_endpoint_health(url: str) -> EndpointHealth:
+    with _health_lock:
+        if url not in _health:
+            _health[url] = EndpointHealth(url)
+        return _health[url]
+
+
+def rpc_health_snapshot() -> list[dict]:
+    with _health_lock:
+        endpoints = list(_health.values())
+    return sorted((h.snapshot() for h in endpoints), key=lambda s: s["url"])
+
+
+# Keep-alive HTTP session dùng chung theo URL. web3 cache session theo từng thread,
+# nên mỗi thread (request handler, poller, backfill worker) sẽ mở connection + TLS riêng;
+# session ở đây dùng chung một urllib3 pool cho mọi thread.
+_sessions: dict[tuple[str, int], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_http_session(url: str, pool_size: int = RPC_POOL_SIZE) -> requests.Session:
+    key = (url, pool_size)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+# Thread pool cho hedged reads dùng chung trong process (theo pool size), tạo khi cần.
+# make_reader_web3() tạo provider mới mỗi lần gọi (vd. mỗi range backfill), nên provider không giữ pool riêng.
+# Đủ cho pool_size read đồng thời (primary + hedge mỗi read), bằng số connection của session mỗi endpoint.
+_hedge_executors: dict[int, ThreadPoolExecutor] = {}
+_hedge_executors_lock = threading.Lock()
+
+
+def get_hedge_executor(pool_size: int = RPC_POOL_SIZE) -> ThreadPoolExecutor:
+    with _hedge_executors_lock:
+        executor = _hedge_executors.get(pool_size)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, pool_size) * MAX_IN_FLIGHT, thread_name_prefix="rpc-hedge")
+            _hedge_executors[pool_size] = executor
+        return executor
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider gửi request qua session keep-alive dùng chung (get_http_session)"""
+
+    def __init__(self, endpoint_uri: str, request_kwargs: dict | None = None, pool_size: int = RPC_POOL_SIZE):
+        super().__init__(endpoint_uri, request_kwargs={"timeout": RPC_TIMEOUT, **(request_kwargs or {})})
+        self.session = get_http_session(self.endpoint_uri, pool_size)
+
+    def post(self, data) -> bytes:
+        response = self.session.post(self.endpoint_uri, data=data, **self.get_request_kwargs())
+        response.raise_for_status()
+        return response.content
+
+    def make_request(self, method, params):
+        return self.decode_rpc_response(self.post(self.encode_rpc_request(method, params)))
+
+    def make_batch_request(self, payload: str) -> bytes:
+        return self.post(payload)
+
+
+def _is_rate_limited(response) -> bool:
+    error = response.get("error") if isinstance(response, dict) else None
+    if not error:
+        return False
+    message = str(error.get("message", "") if isinstance(error, dict) else error).lower()
+    return any(marker in message for marker in _RATE_LIMIT_MARKERS)
+
+
+def _hedge_delay(health: EndpointHealth) -> float:
+    """Giây chờ trước khi hedge: không ngắn hơn RPC_HEDGE_DELAY_MS, và ~2x latency thường thấy"""
+    return max(RPC_HEDGE_DELAY_MS, 2 * health.latency_ms) / 1000
+
+
+class _Endpoint:
+    def __init__(self, url: str, request_kwargs: dict, pool_size: int):
+        self.url = url
+        self.health = get_endpoint_health(url)
+        self.provider = PooledHTTPProvider(url, request_kwargs=request_kwargs, pool_size=pool_size)
+
+
+class MultiEndpointProvider(JSONBaseProvider):
+    """Web3 provider định tuyến mỗi request tới endpoint khoẻ nhất trong RPC_URLS"""
+
+    def __init__(self, endpoint_uris: list[str], request_kwargs: dict | None = None, pool_size: int = RPC_POOL_SIZE):
+        if not endpoint_uris:
+            raise ValueError("RPC_URLS is empty")
+        self.endpoints = [_Endpoint(url, request_kwargs or {}, pool_size) for url in endpoint_uris]
+        # Một endpoint (không hedge được) -> request chạy thẳng trên thread của caller
+        self._executor = get_hedge_executor(pool_size) if len(self.endpoints) > 1 else None
+        super().__init__()
+
+    def __str__(self) -> str:
+        return f"RPC connection {', '.join(e.url for e in self.endpoints)}"
+
+    def ranked_endpoints(self) -> list[_Endpoint]:
+        return sorted(self.endpoints, key=lambda e: e.health.score())
+
+    def _call(self, endpoint: _Endpoint, send):
+        """Gọi send(endpoint) và ghi nhận health; raise nếu endpoint nên bị bỏ qua"""
+        started = time.monotonic()
+        try:
+            response = send(endpoint)
+        except Exception:
+            endpoint.health.record_error((time.monotonic() - started) * 1000)
+            raise
+        elapsed = (time.monotonic() - started) * 1000
+        if _is_rate_limited(response):
+            endpoint.health.record_error(elapsed)
+            raise RuntimeError(f"{endpoint.url} rate limited: {response['error']}")
+        endpoint.health.record_success(elapsed)
+        return response
+
+    def _send_with_failover(self, method: str, send):
+        remaining = self.ranked_endpoints()
+        last_error = None
+
+        if method not in HEDGED_METHODS or self._executor is None:
+            # Write (eth_sendRawTransaction...) hoặc chỉ có một endpoint: tuần tự trên thread
+            # của caller, chỉ failover khi endpoint lỗi
+            for endpoint in remaining:
+                try:
+                    return self._call(endpoint, send)
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"RPC {method} failed on {endpoint.url}: {e}")
+            raise last_error
+
+        # Read: tối đa MAX_IN_FLIGHT request đồng thời; endpoint kế tiếp được thêm khi
+        # request đang chạy quá hedge delay hoặc bị lỗi. Response thành công đầu tiên thắng,
+        # request còn lại vẫn chạy xong và được ghi nhận health.
+        pending = set()
+        launched = None
+        while pending or remaining:
+            if remaining and len(pending) < MAX_IN_FLIGHT:
+                launched = remaining.pop(0)
+                pending.add(self._executor.submit(self._call, launched, send))
+            timeout = _hedge_delay(launched.health) if remaining and len(pending) < MAX_IN_FLIGHT else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+                logger.warning(f"RPC {method} failed: {last_error}")
+        raise last_error
+
+    def make_request(self, method, params):
+        return self._send_with_failover(method, lambda e: e.provider.make_request(method, params))
+
+    def make_batch_request(self, payload: str) -> bytes:
+        """Raw JSON-RPC batch (chỉ gồm read methods) trên endpoint khoẻ nhất, có failover"""
+        return self._send_with_failover("eth_getBlockByNumber", lambda e: e.provider.make_batch_request(payload))
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(e.provider.is_connected() for e in self.ranked_endpoints())
+
+
+class _AsyncEndpoint:
+    def __init__(self, url: str, request_kwargs: dict):
+        self.url = url
+        self.health = get_endpoint_health(url)
+        self.provider = AsyncHTTPProvider(url, request_kwargs=request_kwargs)
+
+
+class AsyncMultiEndpointProvider(AsyncJSONBaseProvider):
+    """Bản async của MultiEndpointProvider cho AsyncWeb3 (hedging bằng asyncio tasks)"""
+
+    def __init__(self, endpoint_uris: list[str], request_kwargs: dict | None = None):
+        if not endpoint_uris:
+            raise ValueError("RPC_URLS is empty")
+        request_kwargs = {"timeout": ClientTimeout(total=RPC_TIMEOUT), **(request_kwargs or {})}
+        self.endpoints = [_AsyncEndpoint(url, request_kwargs) for url in endpoint_uris]
+        super().__init__()
+
+    def __str__(self) -> str:
+        return f"Async RPC connection {', '.join(e.url for e in self.endpoints)}"
+
+    async def _call(self, endpoint: _AsyncEndpoint, send):
+        started = time.monotonic()
+        try:
+            response = await send(endpoint)
+        except Exception:
+            endpoint.health.record_error((time.monotonic() - started) * 1000)
+            raise
+        elapsed = (time.monotonic() - started) * 1000
+        if _is_rate_limited(response):
+            endpoint.health.record_error(elapsed)
+            raise RuntimeError(f"{endpoint.url} rate limited: {response['error']}")
+        endpoint.health.record_success(elapsed)
+        return response
+
+    async def _send_with_failover(self, method: str, send):
+        remaining = sorted(self.endpoints, key=lambda e: e.health.score())
+        last_error = None
+
+        if method not in HEDGED_METHODS:
+            for endpoint in remaining:
+                try:
+                    return await self._call(endpoint, send)
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"RPC {method} failed on {endpoint.url}: {e}")
+            raise last_error
+
+        pending = set()
+        launched = None
+        try:
+            while pending or remaining:
+                if remaining and len(pending) < MAX_IN_FLIGHT:
+                    launched = remaining.pop(0)
+                    pending.add(asyncio.ensure_future(self._call(launched, send)))
+                timeout = _hedge_delay(launched.health) if remaining and len(pending) < MAX_IN_FLIGHT else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"RPC {method} failed: {last_error}")
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def make_request(self, method, params):
+        async def send(e):
+            return await e.provider.make_request(method, params)
+        return await self._send_with_failover(method, send)
+
+    async def make_batch_request(self, payload: str) -> bytes:
+        async def send(e):
+            return await async_make_post_request(e.url, payload, **dict(e.provider.get_request_kwargs()))
+        return await self._send_with_failover("eth_getBlockByNumber", send)
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        for e in self.endpoints:
+            if await e.provider.is_connected():
+                return True
+        return False
+
+
+def make_rpc_provider(endpoint_uris: list[str] | None = None, pool_size: int = RPC_POOL_SIZE):
+    """PooledHTTPProvider cho một endpoint, MultiEndpointProvider khi có nhiều endpoint"""
+    urls = endpoint_uris or RPC_URLS
+    if len(urls) == 1:
+        return PooledHTTPProvider(urls[0], pool_size=pool_size)
+    return MultiEndpointProvider(urls, pool_size=pool_size)
+
+
+def make_async_rpc_provider(endpoint_uris: list[str] | None = None):
+    urls = endpoint_uris or RPC_URLS
+    if len(urls) == 1:
+        return AsyncHTTPProvider(urls[0], request_kwargs={"timeout": ClientTimeout(total=RPC_TIMEOUT)})
+    return AsyncMultiEndpointProvider(urls)
@@ -0,0 +1,381 @@
+"""
+Transaction outbox cho các transaction server-signed (withdraw, setActive).
+
+Route chỉ ghi một intent (TxOutbox, status=queued) và trả về id ngay; không route nào
+chờ wait_for_transaction_receipt trên event loop nữa.
+
+TxOutboxWorker (daemon thread):
+- gửi các intent queued theo thứ tự (nonce từ nonce_manager); raw tx được sign một lần và lưu
+  (nonce, raw_tx, tx_hash) TRƯỚC khi broadcast, lỗi gửi chỉ retry đúng raw tx đó tới
+  TX_MAX_SEND_ATTEMPTS lần; chỉ sign lại với nonce mới khi node báo nonce đã dùng mà không biết
+  hash nào của intent (nonce bị transaction khác chiếm, raw tx cũ không thể được mine);
+- giao các intent sent cho receipt-watcher pool (TX_WATCHER_WORKERS threads):
+  receipt của mọi hash đã gửi (bản gốc + replacements) được kiểm tra không chặn;
+  đủ TX_CONFIRMATIONS -> confirmed (hoặc failed nếu revert);
+  chưa được mine sau TX_REPLACE_AFTER giây -> gửi replacement cùng nonce với
+  maxFeePerGas / maxPriorityFeePerGas cao hơn 12.5% (fee_oracle.bump), tối đa TX_MAX_REPLACEMENTS lần.
+Gas limit từ estimate_gas của từng call, fees từ fee oracle.
+Khi confirmed: withdraw được ghi WithdrawLog từ FundsWithdrawn trong receipt,
+set_active cập nhật status campaign. Intent queued / sent được tiếp tục sau restart.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlmodel import Session
+from web3.exceptions import TransactionNotFound
+
+from ..config import (
+    TX_WATCHER_WORKERS,
+    TX_WATCH_INTERVAL,
+    TX_CONFIRMATIONS,
+    TX_REPLACE_AFTER,
+    TX_MAX_REPLACEMENTS,
+    TX_MAX_SEND_ATTEMPTS,
+)
+from ..crud import create_tx_intent, get_tx_intent, list_tx_intents, update_tx_intent, update_campaign_status
+from ..database import engine
+from ..models import TxOutbox
+from .db_writer import db_writer
+from .fee_oracle import fee_oracle, gas_estimates
+from .nonce_manager import nonce_manager, is_stale_nonce_error, is_already_known_error
+from .campaign_reader import campaign_state
+from .web3_service import make_service, insert_event_rows, withdraw_rows_from_receipt
+
+logger = logging.getLogger("uvicorn.error")
+
+# kind -> contract call từ payload
+TX_CALLS = {
+    "withdraw": lambda contract, p: contract.functions.withdraw(p["onchain_id"], int(p["amount_wei"])),
+    "set_active": lambda contract, p: contract.functions.setActive(p["onchain_id"], bool(p["active"])),
+}
+
+
+def _fee_cap(fees: dict) -> int | None:
+    return fees.get("maxFeePerGas", fees.get("gasPrice"))
+
+
+def tx_intent_dict(intent: TxOutbox) -> dict:
+    return {
+        "id": intent.id,
+        "kind": intent.kind,
+        "campaign_id": intent.campaign_id,
+        "status": intent.status,
+        "tx_hash": intent.tx_hash,
+        "tx_hashes": json.loads(intent.tx_hashes or "[]"),
+        "nonce": intent.nonce,
+        "gas_price": intent.gas_price,
+        "fees": json.loads(intent.fees or "{}"),
+        "send_attempts": intent.send_attempts,
+        "replacements": intent.replacements,
+        "block_number": intent.block_number,
+        "error": intent.error,
+        "payload": json.loads(intent.payload or "{}"),
+        "requested_by": intent.requested_by,
+        "created_at": intent.created_at.isoformat() if intent.created_at else None,
+        "sent_at": intent.sent_at.isoformat() if intent.sent_at else None,
+        "confirmed_at": intent.confirmed_at.isoformat() if intent.confirmed_at else None,
+    }
+
+
+class TxOutboxWorker:
+    def __init__(self, watchers: int = TX_WATCHER_WORKERS, interval: float = TX_WATCH_INTERVAL):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, watchers), thread_name_prefix="tx-watcher")
+        # intent id đang được một watcher xử lý
+        self._watching: set[int] = set()
+        self._watching_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @staticmethod
+    def _intent(kind: str, payload: dict, campaign_id, onchain_campaign_id, requested_by) -> TxOutbox:
+        if kind not in TX_CALLS:
+            raise ValueError(f"Unknown transaction kind: {kind}")
+        return TxOutbox(
+            kind=kind,
+            campaign_id=campaign_id,
+            onchain_campaign_id=onchain_campaign_id,
+            payload=json.dumps(payload),
+            requested_by=requested_by,
+        )
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        campaign_id: int | None = None,
+        onchain_campaign_id: int | None = None,
+        requested_by: str | None = None,
+    ) -> TxOutbox:
+        """Ghi intent vào outbox (qua db_writer) và đánh thức worker"""
+        intent = self._intent(kind, payload, campaign_id, onchain_campaign_id, requested_by)
+        intent = db_writer.run(create_tx_intent, intent=intent)
+        self._wake.set()
+        return intent
+
+    async def enqueue_async(
+        self,
+        kind: str,
+        payload: dict,
+        campaign_id: int | None = None,
+        onchain_campaign_id: int | None = None,
+        requested_by: str | None = None,
+    ) -> TxOutbox:
+        """Như enqueue nhưng await commit mà không chặn event loop (dùng trong route async)"""
+        intent = self._intent(kind, payload, campaign_id, onchain_campaign_id, requested_by)
+        intent = await db_writer.run_async(create_tx_intent, intent=intent)
+        self._wake.set()
+        return intent
+
+    # ---------------- sending ----------------
+
+    def _send_failed(self, intent: TxOutbox, error: Exception, attempts: int, status: str | None = None) -> None:
+        if status is None:
+            status = "failed" if attempts >= TX_MAX_SEND_ATTEMPTS else "queued"
+        logger.warning(f"Outbox tx {intent.id} ({intent.kind}) send attempt {attempts} failed: {error}")
+        db_writer.run(update_tx_intent, intent.id, status=status, send_attempts=attempts, error=str(error))
+
+    def _sign(self, svc, intent: TxOutbox) -> TxOutbox | None:
+        """Cấp nonce, sign và lưu raw tx vào intent (chưa broadcast). None -> chưa có gì được gửi."""
+        address = svc.account.address
+        nonce = None
+        try:
+            fn = TX_CALLS[intent.kind](svc._contract(), json.loads(intent.payload))
+            # estimate_gas cũng là pre-check: call sẽ revert thì không được sign / gửi
+            gas = gas_estimates.gas_limit(fn, address)
+            fees = fee_oracle.get_fees(svc.w3)
+            nonce = nonce_manager.allocate(svc.w3, address)
+            raw_tx, tx_hex = svc.sign_contract_tx(fn, gas, fees, nonce)
+            return db_writer.run(
+                update_tx_intent, intent.id,
+                nonce=nonce, raw_tx=raw_tx, tx_hash=tx_hex, tx_hashes=json.dumps([tx_hex]),
+                gas_price=_fee_cap(fees), fees=json.dumps(fees),
+            )
+        except Exception as e:
+            if nonce is not None:
+                nonce_manager.release(address, nonce)
+            self._send_failed(intent, e, intent.send_attempts + 1)
+            return None
+
+    def _known_tx(self, svc, intent: TxOutbox) -> bool | None:
+        """Node có biết (mempool hoặc đã mine) một hash đã sign của intent không; None nếu không hỏi được node"""
+        for tx_hash in json.loads(intent.tx_hashes or "[]") or [intent.tx_hash]:
+            try:
+                if svc.w3.eth.get_transaction(tx_hash) is not None:
+                    return True
+            except TransactionNotFound:
+                continue
+            except Exception as e:
+                logger.warning(f"Outbox tx {intent.id}: eth_getTransactionByHash failed: {e}")
+                return None
+        return False
+
+    def _send(self, intent_id: int) -> bool:
+        """
+        Gửi một intent queued. Raw tx được sign MỘT lần và lưu trước khi broadcast; mọi lần
+        retry (kể cả sau restart) chỉ gửi lại đúng raw tx đó, nên một lỗi gửi mơ hồ (timeout
+        sau khi node đã nhận) không thể tạo ra transaction thứ hai với nonce khác.
+        False -> raw tx chưa lên node, dừng gửi các intent sau để giữ thứ tự nonce.
+        """
+        with Session(engine) as session:
+            intent = get_tx_intent(session, intent_id)
+            session.expunge(intent)
+
+        try:
+            svc = make_service()
+        except Exception as e:
+            self._send_failed(intent, e, intent.send_attempts + 1)
+            return False
+
+        if intent.raw_tx is None:
+            intent = self._sign(svc, intent)
+            if intent is None:
+                return True
+
+        address = svc.account.address
+        attempts = intent.send_attempts + 1
+        try:
+            svc.broadcast_raw(intent.raw_tx)
+        except Exception as e:
+            if is_stale_nonce_error(e) or is_already_known_error(e):
+                nonce_manager.invalidate(address)
+                known = self._known_tx(svc, intent)
+                if known:
+                    # Chính raw tx này đã lên node: watcher chờ receipt
+                    self._send_failed(intent, e, attempts, status="sent")
+                    return True
+                if known is False:
+                    # Nonce bị transaction khác chiếm: raw tx này không bao giờ được mine -> lần sau sign lại
+                    # với nonce mới thay vì để watcher replace cùng nonce đã dùng
+                    db_writer.run(
+                        update_tx_intent, intent_id,
+                        nonce=None, raw_tx=None, tx_hash=None, tx_hashes="[]", gas_price=None, fees="{}",
+                    )
+                self._send_failed(intent, e, attempts)
+                return False
+            if attempts >= TX_MAX_SEND_ATTEMPTS:
+                known = self._known_tx(svc, intent)
+                if known:
+                    # Node đã nhận raw tx dù báo lỗi -> chờ receipt như bình thường
+                    nonce_manager.mark_sent(address, intent.nonce)
+                    self._send_failed(intent, e, attempts, status="sent")
+                    return True
+                if known is None:
+                    # Không biết raw tx đã lên node chưa: giữ nonce, thử lại ở vòng sau
+                    self._send_failed(intent, e, attempts - 1)
+                    return False
+                nonce_manager.release(address, intent.nonce)
+            self._send_failed(intent, e, attempts)
+            return False
+
+        nonce_manager.mark_sent(address, intent.nonce)
+        db_writer.run(
+            update_tx_intent, intent_id,
+            status="sent", send_attempts=attempts, sent_at=datetime.utcnow(), error=None,
+        )
+        logger.info(f"Outbox tx {intent_id} ({intent.kind}) sent: nonce={intent.nonce}, tx={intent.tx_hash}")
+        return True
+
+    # ---------------- receipt watching ----------------
+
+    def _replace(self, svc, intent: TxOutbox) -> None:
+        """Gửi lại cùng nonce với fees cao hơn (transaction chưa được mine quá lâu)"""
+        previous = json.loads(intent.fees or "{}") or {"gasPrice": intent.gas_price or 0}
+        fees = fee_oracle.bump(svc.w3, previous)
+        try:
+            fn = TX_CALLS[intent.kind](svc._contract(), json.loads(intent.payload))
+            gas = gas_estimates.gas_limit(fn, svc.account.address)
+            raw_tx, tx_hex = svc.sign_contract_tx(fn, gas, fees, intent.nonce)
+        except Exception as e:
+            logger.warning(f"Outbox tx {intent.id} replacement could not be signed: {e}")
+            return
+        # Hash của replacement được lưu trước khi broadcast để watcher luôn thấy nó
+        hashes = json.loads(intent.tx_hashes or "[]") + [tx_hex]
+        db_writer.run(
+            update_tx_intent, intent.id,
+            raw_tx=raw_tx, tx_hash=tx_hex, tx_hashes=json.dumps(hashes), gas_price=_fee_cap(fees),
+            fees=json.dumps(fees), replacements=intent.replacements + 1, sent_at=datetime.utcnow(),
+        )
+        try:
+            svc.broadcast_raw(raw_tx)
+        except Exception as e:
+            # "nonce too low": một bản đã được mine, vòng sau sẽ thấy receipt
+            logger.warning(f"Outbox tx {intent.id} replacement failed: {e}")
+            return
+        logger.info(f"Outbox tx {intent.id} replaced with {tx_hex} (fees={fees})")
+
+    def _on_confirmed(self, svc, intent: TxOutbox, receipt) -> None:
+        """Ghi kết quả on-chain vào DB ngay khi confirmed"""
+        w3 = svc.w3
+        withdraw_rows = withdraw_rows_from_receipt(w3, receipt) if intent.kind == "withdraw" else []
+
+        def write(session: Session) -> None:
+            if withdraw_rows:
+                insert_event_rows(session, [], withdraw_rows)
+            elif intent.kind == "set_active" and intent.campaign_id is not None:
+                active = bool(json.loads(intent.payload).get("active"))
+                update_campaign_status(session, intent.campaign_id, "active" if active else "closed")
+
+            update_tx_intent(
+                session, intent.id, commit=False,
+                status="confirmed", tx_hash=w3.to_hex(receipt["transactionHash"]),
+                block_number=receipt["blockNumber"], confirmed_at=datetime.utcnow(), error=None,
+            )
+
+        db_writer.run(write)
+        if intent.onchain_campaign_id is not None:
+            campaign_state.invalidate([intent.onchain_campaign_id])
+
+    def _watch(self, intent_id: int, head: int) -> None:
+        try:
+            with Session(engine) as session:
+                intent = get_tx_intent(session, intent_id)
+                session.expunge(intent)
+            if intent.status != "sent":
+                return
+
+            svc = make_service()
+            receipt = None
+            for tx_hex in json.loads(intent.tx_hashes or "[]"):
+                try:
+                    receipt = svc.w3.eth.get_transaction_receipt(tx_hex)
+                    break
+                except TransactionNotFound:
+                    continue
+
+            if receipt is not None:
+                if head - receipt["blockNumber"] + 1 < TX_CONFIRMATIONS:
+                    return
+                if receipt["status"] == 1:
+                    self._on_confirmed(svc, intent, receipt)
+                    logger.info(f"Outbox tx {intent_id} confirmed in block {receipt['blockNumber']}")
+                else:
+                    db_writer.run(
+                        update_tx_intent, intent_id, status="failed", block_number=receipt["blockNumber"],
+                        tx_hash=svc.w3.to_hex(receipt["transactionHash"]), error="Transaction reverted",
+                    )
+                    logger.warning(f"Outbox tx {intent_id} reverted")
+                return
+
+            # Chưa được mine
+            waited = (datetime.utcnow() - intent.sent_at).total_seconds() if intent.sent_at else 0
+            if waited < TX_REPLACE_AFTER:
+                return
+            if intent.replacements < TX_MAX_REPLACEMENTS:
+                self._replace(svc, intent)
+            elif svc.w3.eth.get_transaction_count(svc.account.address, "latest") > intent.nonce:
+                # Nonce đã được dùng bởi transaction khác mà không có hash nào của ta được mine
+                db_writer.run(update_tx_intent, intent_id, status="failed", error="Transaction dropped (nonce reused)")
+        except Exception as e:
+            logger.warning(f"Outbox tx {intent_id} watch error: {e}")
+        finally:
+            with self._watching_lock:
+                self._watching.discard(intent_id)
+
+    # ---------------- loop ----------------
+
+    def run_once(self) -> None:
+        with Session(engine) as session:
+            queued = [i.id for i in list_tx_intents(session, statuses=["queued"])]
+            sent = [i.id for i in list_tx_intents(session, statuses=["sent"], limit=1000)]
+
+        # Gửi tuần tự: nonce tăng dần theo thứ tự enqueue
+        for intent_id in queued:
+            if not self._send(intent_id):
+                break
+
+        if not sent:
+            return
+        head = make_service().w3.eth.block_number
+        for intent_id in sent:
+            with self._watching_lock:
+                if intent_id in self._watching:
+                    continue
+                self._watching.add(intent_id)
+            self._pool.submit(self._watch, intent_id, head)
+
+    def run(self) -> None:
+        logger.info("Transaction outbox worker started")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Transaction outbox error: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, daemon=True, name="tx-outbox")
+            self._thread.start()
+
+
+# Outbox worker dùng chung trong process
+tx_outbox = TxOutboxWorker()
+
+
+def start_tx_outbox_thread() -> None:
+    tx_outbox.start()
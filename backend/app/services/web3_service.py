@@ -1,64 +1,140 @@
 import json
 import logging
-from pathlib import Path
+from hexbytes import HexBytes
 from web3 import Web3
+from web3._utils.events import get_event_data
 from eth_account import Account
 import threading
 import time
 from datetime import datetime
 
-from sqlmodel import Session, select
+from sqlmodel import Session
 from ..database import engine
-from ..models import Donation, WithdrawLog
-
-from ..config import RPC_URL, DEPLOYER_PRIVATE_KEY, CHAIN_ID, DISASTER_FUND_ADDRESS
+from ..crud import (
+    get_indexer_checkpoint,
+    save_indexer_checkpoint,
+    bulk_insert_donations,
+    bulk_insert_withdraw_logs,
+    record_indexed_block,
+    get_indexed_blocks,
+    rollback_indexed_range,
+)
+from .log_scanner import LogRangeScanner
+from .block_cache import block_timestamps, fetch_block_headers
+from .campaign_resolver import campaign_resolver
+from .campaign_reader import campaign_state
+from .contract_registry import ABI_PATH, CONTRACT_ABI, ContractRegistry, contract_registry
+from .rpc_provider import make_rpc_provider
+from .nonce_manager import nonce_manager, is_stale_nonce_error, is_already_known_error, is_underpriced_error
+from .fee_oracle import fee_oracle, gas_estimates
+from .db_writer import db_writer
+from .. import config as app_config
+
+from ..config import (
+    RPC_URL,
+    RPC_URLS,
+    DEPLOYER_PRIVATE_KEY,
+    CHAIN_ID,
+    DISASTER_FUND_ADDRESS,
+    POLLER_START_BLOCK,
+    POLLER_MAX_BLOCKS_PER_CYCLE,
+    CONFIRMATION_DEPTH,
+    REORG_WINDOW,
+    INGESTION_MODE,
+    DEPLOY_BLOCK,
+)
 
 logger = logging.getLogger("uvicorn.error")
 
-def _find_abi_path() -> Path | None:
-    """
-    Find <repo_root>/abi/DisasterFund.json by walking up parent folders.
-    Your repo has: E:\\Disaster_Relief_Dapp\\abi\\DisasterFund.json
-    """
-    here = Path(__file__).resolve()
-    for p in here.parents:
-        candidate = p / "abi" / "DisasterFund.json"
-        if candidate.exists():
-            return candidate
-    return None
-
-ABI_PATH = _find_abi_path()
-CONTRACT_ABI = []
-if ABI_PATH:
-    artifact = json.loads(ABI_PATH.read_text(encoding="utf-8"))
-    CONTRACT_ABI = artifact.get("abi", [])
-
 class Web3Service:
-    def __init__(self, rpc_url: str, private_key: str, chain_id: int):
-        if not rpc_url:
+    def __init__(self, rpc_url: str, private_key: str, chain_id: int, rpc_urls: list[str] | None = None):
+        rpc_urls = rpc_urls or ([rpc_url] if rpc_url else [])
+        if not rpc_urls:
             raise ValueError("RPC_URL is missing")
         if not private_key:
             raise ValueError("DEPLOYER_PRIVATE_KEY is missing")
 
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+        # Keep-alive session pool dùng chung; nhiều endpoint -> failover / hedging (xem rpc_provider)
+        self.w3 = Web3(make_rpc_provider(rpc_urls, pool_size=app_config.RPC_POOL_SIZE))
         if not self.w3.is_connected():
-            raise RuntimeError("Cannot connect to RPC_URL")
+            raise RuntimeError("Cannot connect to any RPC endpoint (RPC_URL / RPC_URLS)")
 
         self.chain_id = int(chain_id)
         self.account = Account.from_key(private_key)
+        self.log_scanner = LogRangeScanner(self.w3)
+        self._contract_obj = None
 
     def _contract(self):
-        if not DISASTER_FUND_ADDRESS:
-            raise ValueError("DISASTER_FUND_ADDRESS is missing")
-        if not CONTRACT_ABI:
-            raise ValueError(
-                "Contract ABI not found. Expected abi/DisasterFund.json at repo root. "
-                f"ABI_PATH tried: {ABI_PATH}"
-            )
-        return self.w3.eth.contract(
-            address=Web3.to_checksum_address(DISASTER_FUND_ADDRESS),
-            abi=CONTRACT_ABI,
-        )
+        # Service được dùng chung nên contract object cũng chỉ tạo một lần (ABI từ registry)
+        if self._contract_obj is None:
+            self._contract_obj = contract_registry().contract(self.w3)
+        return self._contract_obj
+
+    def sign_contract_tx(self, fn, gas: int, fees: dict, nonce: int) -> tuple[str, str]:
+        """Build và sign contract call (không gửi). Trả về (raw tx hex, tx hash hex)."""
+        tx = fn.build_transaction({
+            "from": self.account.address,
+            "nonce": nonce,
+            "chainId": self.chain_id,
+            "gas": gas,
+            **fees,
+        })
+        signed = self.account.sign_transaction(tx)
+        raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
+        return self.w3.to_hex(raw), self.w3.to_hex(signed.hash)
+
+    def broadcast_raw(self, raw_tx: str) -> None:
+        """Gửi raw tx đã sign; gửi lại đúng raw tx này nhiều lần là an toàn (cùng hash)"""
+        try:
+            self.w3.eth.send_raw_transaction(raw_tx)
+        except Exception as e:
+            if not is_already_known_error(e):
+                raise
+
+    def _sign_and_send(self, fn, gas: int, fees: dict, nonce: int):
+        raw_tx, tx_hash = self.sign_contract_tx(fn, gas, fees, nonce)
+        self.broadcast_raw(raw_tx)
+        return HexBytes(tx_hash)
+
+    def send_contract_tx(self, fn, gas: int | None = None, fees: dict | None = None, nonce: int | None = None):
+        """
+        Build, sign và gửi contract call. Trả về (tx hash, nonce, fees).
+
+        gas=None: estimate_gas cho chính call này (xem fee_oracle.gas_estimates), cũng là pre-check revert.
+        fees=None: maxFeePerGas / maxPriorityFeePerGas từ fee oracle (gasPrice trên chain legacy).
+        nonce=None: nonce từ nonce_manager; nonce cũ (đã bị transaction khác dùng) -> resync và
+        thử lại một lần với nonce mới, thay vì tăng gas price để replace.
+        nonce cho trước: replacement của transaction đã gửi (cùng nonce, fees cao hơn).
+        """
+        logger = logging.getLogger("uvicorn.error")
+        address = self.account.address
+        if gas is None:
+            gas = gas_estimates.gas_limit(fn, address)
+        if fees is None:
+            fees = fee_oracle.get_fees(self.w3)
+        if nonce is not None:
+            tx_hash = self._sign_and_send(fn, gas, fees, nonce)
+            logger.info(f"Replacement sent: nonce={nonce}, fees={fees}, tx={self.w3.to_hex(tx_hash)}")
+            return tx_hash, nonce, fees
+
+        for attempt in range(2):
+            nonce = nonce_manager.allocate(self.w3, address, force_sync=attempt > 0)
+            try:
+                tx_hash = self._sign_and_send(fn, gas, fees, nonce)
+            except Exception as e:
+                if is_stale_nonce_error(e) and attempt == 0:
+                    logger.warning(f"Nonce {nonce} already used for {address}: {e}; resyncing")
+                    nonce_manager.invalidate(address)
+                    continue
+                if is_underpriced_error(e):
+                    # Node đang giữ transaction khác của ta với nonce này: không cấp lại nonce
+                    nonce_manager.mark_sent(address, nonce)
+                else:
+                    nonce_manager.release(address, nonce)
+                raise
+            nonce_manager.mark_sent(address, nonce)
+            logger.info(f"Transaction sent: nonce={nonce}, gas={gas}, fees={fees}, tx={self.w3.to_hex(tx_hash)}")
+            return tx_hash, nonce, fees
 
     def create_campaign(self, title: str, description: str, goal_eth: float) -> tuple[str, int | None]:
         # Pre-checks: ensure contract exists at address and deployer has balance
@@ -80,23 +156,10 @@ class Web3Service:
         goal_wei = self.w3.to_wei(goal_eth, "ether")
         contract = self._contract()
         try:
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-
-            tx = contract.functions.createCampaign(title, description, goal_wei).build_transaction({
-                "from": self.account.address,
-                "nonce": nonce,
-                "chainId": self.chain_id,
-                "gas": 300000,
-                "gasPrice": self.w3.eth.gas_price,
-            })
+            tx_hash, _, _ = self.send_contract_tx(contract.functions.createCampaign(title, description, goal_wei))
         except Exception as e:
-            logger.exception("Failed to build createCampaign transaction: %s", e)
+            logger.exception("Failed to send createCampaign transaction: %s", e)
             raise
-
-        signed = self.account.sign_transaction(tx)
-
-        raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
-        tx_hash = self.w3.eth.send_raw_transaction(raw)
         tx_hex = self.w3.to_hex(tx_hash)
 
         # wait for receipt and try to parse CampaignCreated event to get on-chain campaignId
@@ -145,162 +208,124 @@ class Web3Service:
             # If waiting or parsing failed, return tx hash with None onchain id
             return tx_hex, None
 
-    def get_donation_events(self, campaign_onchain_id: int, from_block: int = 0) -> list[dict]:
+    def _get_campaign_events(
+        self, event_name: str, campaign_onchain_id: int, from_block: int | None, to_block: int | None
+    ) -> list[tuple[dict, int]]:
+        """
+        Logs của event_name cho một campaign: campaignId là indexed (topic1) nên filter
+        ngay trên node, chỉ logs của campaign này được trả về và decode.
+        from_block=None: DEPLOY_BLOCK nếu có, nếu không 40,000 block gần nhất.
+        """
+        logger = logging.getLogger("uvicorn.error")
+        registry = contract_registry()
+        event_abi = registry.events.get(event_name)
+        if not event_abi:
+            raise ValueError(f"{event_name} event ABI not found")
+
+        latest_block = self.w3.eth.block_number if to_block is None else to_block
+        if from_block is None:
+            from_block = DEPLOY_BLOCK if DEPLOY_BLOCK is not None else max(0, latest_block - 40000)
+        if from_block > latest_block:
+            return []
+
+        logger.info(f"Querying {event_name} events for campaign onchain_id={campaign_onchain_id}, blocks {from_block}-{latest_block}")
+        logs = self.log_scanner.scan({
+            "address": registry.address,
+            "topics": [
+                registry.topics[event_name],
+                campaign_topic(campaign_onchain_id),  # uint256 campaignId, padded 32 bytes
+            ]
+        }, from_block, latest_block)
+
+        events = []
+        for log in logs:
+            try:
+                events.append(get_event_data(self.w3.codec, event_abi, log))
+            except Exception as e:
+                logger.warning(f"Failed to decode {event_name} log {log.get('transactionHash', 'unknown')}: {e}")
+
+        # Lấy timestamp cho tất cả block một lần (cache + batch request), thử lại một lần các block thiếu
+        block_numbers = {ev['blockNumber'] for ev in events}
+        timestamps = block_timestamps.get_many(self.w3, block_numbers)
+        missing = block_numbers - set(timestamps)
+        if missing:
+            timestamps.update(block_timestamps.get_many(self.w3, missing))
+            missing = block_numbers - set(timestamps)
+        if missing:
+            # Không bỏ event: caller resume từ block của event cuối đã lưu nên event bị bỏ sẽ mất hẳn
+            raise RuntimeError(f"Missing block timestamps for blocks {sorted(missing)}")
+        logger.info(f"Found {len(events)} {event_name} events for campaign onchain_id={campaign_onchain_id}")
+        return [(ev, timestamps[ev['blockNumber']]) for ev in events]
+
+    def get_donation_events(
+        self, campaign_onchain_id: int, from_block: int | None = None, to_block: int | None = None
+    ) -> list[dict]:
         """
-        Lấy tất cả DonationReceived events cho một campaign
+        Lấy DonationReceived events cho một campaign từ from_block (vd. block cuối đã index)
         
         Returns:
             List of dicts với keys: campaignId, donor, amount, tx_hash, block_number, timestamp
-        """
-        contract = self._contract()
-        
-        # Lấy event ABI cho DonationReceived
-        donation_event_abi = next(
-            (abi for abi in CONTRACT_ABI if abi.get('name') == 'DonationReceived' and abi.get('type') == 'event'),
-            None
-        )
-        if not donation_event_abi:
-            raise ValueError("DonationReceived event ABI not found")
-        
-        # Tính toán topic hash cho DonationReceived
-        # Đảm bảo có prefix 0x
-        event_signature_hash = self.w3.keccak(text="DonationReceived(uint256,address,uint256)")
-        event_signature_hash_hex = self.w3.to_hex(event_signature_hash)
 
-        try:
-            # Lấy block number hiện tại
-            latest_block = self.w3.eth.block_number
-            # Giới hạn range để tránh lỗi RPC node
-            _from_block = max(0, latest_block - 40000)  # Query 40,000 blocks ngược về
-
-            logging.getLogger("uvicorn.error").info(f"Querying donation events for campaign onchain_id={campaign_onchain_id}, from_block={_from_block}")
-            
-            # Query tất cả DonationReceived events trước (không filter campaignId)
-            # Sau đó filter trong code để tránh lỗi format topic
-            logs = self.w3.eth.get_logs({
-                "fromBlock": _from_block,
-                "toBlock": "latest",
-                "address": Web3.to_checksum_address(DISASTER_FUND_ADDRESS),
-                "topics": [
-                    event_signature_hash_hex,  # Chỉ filter theo event signature (có prefix 0x)
-                ]
-            })
-            
-            logging.getLogger("uvicorn.error").info(f"Found {len(logs)} total DonationReceived events")
-            
-            donations = []
-            for log in logs:
-                try:
-                    # Decode log entry
-                    from web3._utils.events import get_event_data
-                    event_data = get_event_data(self.w3.codec, donation_event_abi, log)
-                    
-                    # Filter theo campaignId trong code
-                    event_campaign_id = event_data['args']['campaignId']
-                    if event_campaign_id != campaign_onchain_id:
-                        continue  # Skip events không phải cho campaign này
-                    
-                    # Get transaction details để lấy timestamp
-                    block = self.w3.eth.get_block(event_data['blockNumber'])
-                    
-                    # Chuẩn hoá tx_hash luôn có prefix 0x để dùng với Etherscan
-                    tx_hash_raw = event_data['transactionHash']
-                    tx_hash = self.w3.to_hex(tx_hash_raw)
-
-                    donations.append({
-                        'campaignId': event_campaign_id,
-                        'donor': event_data['args']['donor'],
-                        'amount': event_data['args']['amount'],  # wei
-                        'amount_eth': float(self.w3.from_wei(event_data['args']['amount'], 'ether')),  # ETH
-                        'tx_hash': tx_hash,
-                        'block_number': event_data['blockNumber'],
-                        'timestamp': block['timestamp']
-                    })
-                except Exception as e:
-                    logging.getLogger("uvicorn.error").warning(f"Failed to decode log {log.get('transactionHash', 'unknown')}: {e}")
-                    continue
-            
-            logging.getLogger("uvicorn.error").info(f"Filtered to {len(donations)} donations for campaign onchain_id={campaign_onchain_id}")
-            
-            return donations
-        except Exception as e:
-            logging.getLogger("uvicorn.error").error(f"Error getting donation events: {e}")
-            return []
+        Raises lỗi RPC / thiếu block timestamp (không trả về [] như thể không có event)
+        """
+        return [
+            {
+                'campaignId': ev['args']['campaignId'],
+                'donor': ev['args']['donor'],
+                'amount': ev['args']['amount'],  # wei
+                'amount_eth': float(self.w3.from_wei(ev['args']['amount'], 'ether')),  # ETH
+                # Chuẩn hoá tx_hash luôn có prefix 0x để dùng với Etherscan
+                'tx_hash': self.w3.to_hex(ev['transactionHash']),
+                'block_number': ev['blockNumber'],
+                'timestamp': ts,
+            }
+            for ev, ts in self._get_campaign_events("DonationReceived", campaign_onchain_id, from_block, to_block)
+        ]
 
-    def withdraw(self, campaign_onchain_id: int, amount_eth: float) -> str:
+    def withdraw(self, campaign_onchain_id: int, amount_wei: int) -> dict:
         """
-        Rút tiền từ campaign (server-signed)
+        Rút tiền từ campaign (server-signed), chờ receipt
         
         Args:
             campaign_onchain_id: On-chain campaign ID
-            amount_eth: Số tiền muốn rút (ETH)
+            amount_wei: Số tiền muốn rút (wei, số nguyên chính xác)
         
         Returns:
-            Transaction hash
+            Dict với keys: tx_hash, status (confirmed / failed / pending), block_number, gas_used,
+            withdrawals (rows WithdrawLog decode từ FundsWithdrawn trong receipt, dùng cho insert_event_rows)
         """
         contract = self._contract()
-        
-        amount_wei = self.w3.to_wei(amount_eth, "ether")
-        
-        # Get nonce including pending transactions to avoid replacement issues
-        nonce = self.w3.eth.get_transaction_count(self.account.address, 'pending')
-        
-        # Get current gas price and increase by 20% to ensure transaction is accepted
-        # This helps avoid "replacement transaction underpriced" errors
-        base_gas_price = self.w3.eth.gas_price
-        gas_price = int(base_gas_price * 1.2)  # Increase by 20%
-        
         logger = logging.getLogger("uvicorn.error")
-        logger.info(f"Building withdraw transaction: nonce={nonce}, gas_price={gas_price} (base={base_gas_price})")
-        
-        tx = contract.functions.withdraw(campaign_onchain_id, amount_wei).build_transaction({
-            "from": self.account.address,
-            "nonce": nonce,
-            "chainId": self.chain_id,
-            "gas": 200000,
-            "gasPrice": gas_price,
-        })
-        
-        signed = self.account.sign_transaction(tx)
-        raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
-        
+
+        # Nonce từ nonce_manager: các withdraw / setActive đồng thời không đụng nonce
         try:
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            tx_hex = self.w3.to_hex(tx_hash)
-            logger.info(f"Withdraw transaction sent: {tx_hex}")
+            tx_hash, _, _ = self.send_contract_tx(contract.functions.withdraw(campaign_onchain_id, amount_wei))
         except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Failed to send withdraw transaction: {error_msg}")
-            
-            # If it's a replacement transaction error, try with higher gas price
-            if "replacement transaction underpriced" in error_msg.lower() or "underpriced" in error_msg.lower():
-                logger.warning("Retrying with higher gas price (50% increase)...")
-                gas_price = int(base_gas_price * 1.5)  # Increase by 50%
-                
-                tx = contract.functions.withdraw(campaign_onchain_id, amount_wei).build_transaction({
-                    "from": self.account.address,
-                    "nonce": nonce,
-                    "chainId": self.chain_id,
-                    "gas": 200000,
-                    "gasPrice": gas_price,
-                })
-                
-                signed = self.account.sign_transaction(tx)
-                raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
-                tx_hash = self.w3.eth.send_raw_transaction(raw)
-                tx_hex = self.w3.to_hex(tx_hash)
-                logger.info(f"Withdraw transaction sent with higher gas price: {tx_hex}")
-            else:
-                raise  # Re-raise if it's a different error
+            logger.error(f"Failed to send withdraw transaction: {e}")
+            raise
+        tx_hex = self.w3.to_hex(tx_hash)
+        logger.info(f"Withdraw transaction sent: {tx_hex}")
+        result = {"tx_hash": tx_hex, "status": "pending", "block_number": None, "gas_used": None, "withdrawals": []}
         
         # Wait for receipt
         try:
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            logger.info(f"Withdraw successful: campaign_id={campaign_onchain_id}, amount={amount_eth} ETH, tx={tx_hex}")
         except Exception as e:
             logger.warning(f"Withdraw tx sent but receipt wait failed: {e}")
-        
-        return tx_hex
+            return result
+
+        result["block_number"] = receipt["blockNumber"]
+        result["gas_used"] = receipt.get("gasUsed")
+        if receipt["status"] != 1:
+            logger.error(f"Withdraw reverted: campaign_id={campaign_onchain_id}, tx={tx_hex}")
+            result["status"] = "failed"
+            return result
+
+        # FundsWithdrawn lấy thẳng từ receipt, không quét lại chain
+        result["status"] = "confirmed"
+        result["withdrawals"] = withdraw_rows_from_receipt(self.w3, receipt)
+        logger.info(f"Withdraw successful: campaign_id={campaign_onchain_id}, amount={self.w3.from_wei(amount_wei, 'ether')} ETH, tx={tx_hex}")
+        return result
 
     def set_active(self, campaign_onchain_id: int, active: bool) -> str:
         """
@@ -315,47 +340,9 @@ class Web3Service:
         """
         contract = self._contract()
         
-        # Get nonce including pending transactions
-        nonce = self.w3.eth.get_transaction_count(self.account.address, 'pending')
-        
-        # Increase gas price by 20% to avoid replacement issues
-        base_gas_price = self.w3.eth.gas_price
-        gas_price = int(base_gas_price * 1.2)
-        
         logger = logging.getLogger("uvicorn.error")
-        
-        tx = contract.functions.setActive(campaign_onchain_id, active).build_transaction({
-            "from": self.account.address,
-            "nonce": nonce,
-            "chainId": self.chain_id,
-            "gas": 100000,
-            "gasPrice": gas_price,
-        })
-        
-        signed = self.account.sign_transaction(tx)
-        raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
-        
-        try:
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            tx_hex = self.w3.to_hex(tx_hash)
-        except Exception as e:
-            error_msg = str(e)
-            if "replacement transaction underpriced" in error_msg.lower() or "underpriced" in error_msg.lower():
-                logger.warning("Retrying setActive with higher gas price...")
-                gas_price = int(base_gas_price * 1.5)
-                tx = contract.functions.setActive(campaign_onchain_id, active).build_transaction({
-                    "from": self.account.address,
-                    "nonce": nonce,
-                    "chainId": self.chain_id,
-                    "gas": 100000,
-                    "gasPrice": gas_price,
-                })
-                signed = self.account.sign_transaction(tx)
-                raw = getattr(signed, "rawTransaction", None) or getattr(signed, "raw_transaction")
-                tx_hash = self.w3.eth.send_raw_transaction(raw)
-                tx_hex = self.w3.to_hex(tx_hash)
-            else:
-                raise
+        tx_hash, _, _ = self.send_contract_tx(contract.functions.setActive(campaign_onchain_id, active))
+        tx_hex = self.w3.to_hex(tx_hash)
         
         # Wait for receipt
         try:
@@ -371,118 +358,385 @@ class Web3Service:
         Lấy thông tin campaign từ blockchain
         
         Returns:
-            Dict với keys: owner, title, description, goal, raised, withdrawn, active
+            Dict với keys: owner, title, description, goal, raised, withdrawn, active (+ *_wei, block)
         """
-        contract = self._contract()
-        try:
-            result = contract.functions.getCampaign(campaign_onchain_id).call()
-            return {
-                "owner": result[0],
-                "title": result[1],
-                "description": result[2],
-                "goal": float(self.w3.from_wei(result[3], "ether")),
-                "raised": float(self.w3.from_wei(result[4], "ether")),
-                "withdrawn": float(self.w3.from_wei(result[5], "ether")),
-                "active": result[6],
-            }
-        except Exception as e:
-            logging.getLogger("uvicorn.error").error(f"Error getting campaign onchain: {e}")
-            raise
+        state = self.get_campaigns_onchain([campaign_onchain_id]).get(int(campaign_onchain_id))
+        if state is None:
+            logging.getLogger("uvicorn.error").error(f"Error getting campaign onchain: {campaign_onchain_id} not found")
+            raise ValueError(f"Campaign {campaign_onchain_id} not found on-chain")
+        return state
+
+    def get_campaigns_onchain(self, campaign_onchain_ids, block: int | None = None) -> dict[int, dict]:
+        """
+        State on-chain của nhiều campaign: một Multicall3 eth_call (hoặc một JSON-RPC batch), cache theo block.
+        block: đọc tại block cụ thể, bỏ qua cache.
+        """
+        return campaign_state.read_many(self.w3, contract_registry(), campaign_onchain_ids, block=block)
 
-    def get_withdraw_events(self, campaign_onchain_id: int, from_block: int = 0) -> list[dict]:
+    def get_withdraw_events(
+        self, campaign_onchain_id: int, from_block: int | None = None, to_block: int | None = None
+    ) -> list[dict]:
         """
-        Lấy tất cả FundsWithdrawn events cho một campaign
+        Lấy FundsWithdrawn events cho một campaign từ from_block (vd. block cuối đã index)
         
         Returns:
             List of dicts với keys: campaignId, owner, amount, tx_hash, block_number, timestamp
+
+        Raises lỗi RPC / thiếu block timestamp (không trả về [] như thể không có event)
         """
-        contract = self._contract()
-        
-        # Lấy event ABI cho FundsWithdrawn
-        withdraw_event_abi = next(
-            (abi for abi in CONTRACT_ABI if abi.get('name') == 'FundsWithdrawn' and abi.get('type') == 'event'),
-            None
-        )
-        if not withdraw_event_abi:
-            raise ValueError("FundsWithdrawn event ABI not found")
-        
-        # Tính toán topic hash cho FundsWithdrawn
-        event_signature_hash = self.w3.keccak(text="FundsWithdrawn(uint256,address,uint256)")
-        event_signature_hash_hex = self.w3.to_hex(event_signature_hash)
+        return [
+            {
+                'campaignId': ev['args']['campaignId'],
+                'owner': ev['args']['owner'],
+                'amount': ev['args']['amount'],  # wei
+                'amount_eth': float(self.w3.from_wei(ev['args']['amount'], 'ether')),  # ETH
+                'tx_hash': self.w3.to_hex(ev['transactionHash']),
+                'block_number': ev['blockNumber'],
+                'timestamp': ts,
+            }
+            for ev, ts in self._get_campaign_events("FundsWithdrawn", campaign_onchain_id, from_block, to_block)
+        ]
+
+def campaign_topic(campaign_onchain_id: int) -> str:
+    """Topic cho indexed uint256 campaignId (32 bytes, big-endian)"""
+    return "0x" + int(campaign_onchain_id).to_bytes(32, "big").hex()
 
+
+# Web3Service dùng chung trong process (một provider + keep-alive session pool)
+_shared_service: Web3Service | None = None
+_shared_service_key: tuple | None = None
+_shared_service_lock = threading.Lock()
+
+
+def _service_config_key() -> tuple:
+    # Đọc từ module config lúc gọi để nhận thay đổi config (reload, tests)
+    return (
+        tuple(app_config.RPC_URLS),
+        app_config.DEPLOYER_PRIVATE_KEY,
+        app_config.CHAIN_ID,
+        app_config.RPC_POOL_SIZE,
+    )
+
+
+def make_service() -> Web3Service:
+    """
+    Web3Service dùng chung, thread-safe. Chỉ tạo lại khi config RPC / key / chain thay đổi;
+    lần tạo thất bại (RPC down) không được cache, lần gọi sau thử lại.
+    """
+    global _shared_service, _shared_service_key
+    key = _service_config_key()
+    with _shared_service_lock:
+        if _shared_service is None or _shared_service_key != key:
+            rpc_urls, private_key, chain_id, _ = key
+            _shared_service = Web3Service(
+                rpc_url=rpc_urls[0] if rpc_urls else None,
+                private_key=private_key,
+                chain_id=chain_id,
+                rpc_urls=list(rpc_urls),
+            )
+            _shared_service_key = key
+        return _shared_service
+
+
+def _load_poller_cursor(contract_address: str, head: int) -> int:
+    """
+    Block cuối cùng đã index cho contract.
+    Lần chạy đầu tiên (chưa có checkpoint) bắt đầu từ POLLER_START_BLOCK hoặc head hiện tại.
+    """
+    with Session(engine) as session:
+        cp = get_indexer_checkpoint(session, contract_address)
+        if cp:
+            return cp.last_block
+    start = max(0, head - CONFIRMATION_DEPTH) if POLLER_START_BLOCK is None else max(0, POLLER_START_BLOCK - 1)
+    db_writer.run(save_indexer_checkpoint, contract_address, start)
+    return start
+
+
+# Các event mà poller index (topic0 filter)
+INGESTED_EVENTS = ("DonationReceived", "FundsWithdrawn", "CampaignCreated")
+
+
+def decode_log(w3: Web3, decoders: dict[str, tuple[str, dict]], log) -> tuple[str, dict] | None:
+    """Decode log theo topic0; None nếu topic không có trong bảng decoder"""
+    topics = log.get("topics") or []
+    if not topics:
+        return None
+    entry = decoders.get(w3.to_hex(topics[0]).lower())
+    if entry is None:
+        return None
+    name, abi = entry
+    return name, get_event_data(w3.codec, abi, log)
+
+
+def _block_datetime(timestamps: dict[int, int], block_number: int) -> datetime | None:
+    ts = timestamps.get(block_number)
+    return datetime.fromtimestamp(ts) if ts is not None else None
+
+
+def _donation_row(w3: Web3, ev: dict, timestamps: dict[int, int]) -> dict:
+    args = ev.get("args", {})
+    campaign_id = int(args.get("campaignId") or 0)
+    amount_wei = int(args.get("amount") or 0)
+    return {
+        # campaign_id được map sang id local khi persist
+        "campaign_id": campaign_id,
+        "onchain_campaign_id": campaign_id,
+        "donor_address": args.get("donor"),
+        "amount_eth": float(w3.from_wei(amount_wei, "ether")),
+        "amount_wei": str(amount_wei),
+        "tx_hash": w3.to_hex(ev.get("transactionHash")),
+        "block_number": ev.get("blockNumber"),
+        "timestamp": _block_datetime(timestamps, ev.get("blockNumber")),
+    }
+
+
+def _withdraw_row(w3: Web3, ev: dict, timestamps: dict[int, int]) -> dict:
+    args = ev.get("args", {})
+    campaign_id = int(args.get("campaignId") or 0)
+    amount_wei = int(args.get("amount") or 0)
+    return {
+        "campaign_id": campaign_id,
+        "onchain_campaign_id": campaign_id,
+        "owner_address": args.get("owner"),
+        "amount_eth": float(w3.from_wei(amount_wei, "ether")),
+        "amount_wei": str(amount_wei),
+        "tx_hash": w3.to_hex(ev.get("transactionHash")),
+        "block_number": ev.get("blockNumber"),
+        "timestamp": _block_datetime(timestamps, ev.get("blockNumber")),
+    }
+
+
+def withdraw_rows_from_receipt(w3: Web3, receipt) -> list[dict]:
+    """Rows WithdrawLog từ các FundsWithdrawn log của contract trong một receipt"""
+    registry = contract_registry()
+    decoders = registry.decoders(("FundsWithdrawn",))
+    contract_address = registry.address.lower()
+    events = []
+    for log in receipt["logs"]:
+        if str(log.get("address", "")).lower() != contract_address:
+            continue
         try:
-            # Lấy block number hiện tại
-            latest_block = self.w3.eth.block_number
-            # Giới hạn range để tránh lỗi RPC node
-            _from_block = max(0, latest_block - 40000)  # Query 40,000 blocks ngược về
-
-            logging.getLogger("uvicorn.error").info(f"Querying withdraw events for campaign onchain_id={campaign_onchain_id}, from_block={_from_block}")
-            
-            # Query tất cả FundsWithdrawn events trước (không filter campaignId)
-            logs = self.w3.eth.get_logs({
-                "fromBlock": _from_block,
-                "toBlock": "latest",
-                "address": Web3.to_checksum_address(DISASTER_FUND_ADDRESS),
-                "topics": [
-                    event_signature_hash_hex,  # Chỉ filter theo event signature
-                ]
-            })
-            
-            logging.getLogger("uvicorn.error").info(f"Found {len(logs)} total FundsWithdrawn events")
-            
-            withdraws = []
-            for log in logs:
-                try:
-                    # Decode log entry
-                    from web3._utils.events import get_event_data
-                    event_data = get_event_data(self.w3.codec, withdraw_event_abi, log)
-                    
-                    # Filter theo campaignId trong code
-                    event_campaign_id = event_data['args']['campaignId']
-                    if event_campaign_id != campaign_onchain_id:
-                        continue  # Skip events không phải cho campaign này
-                    
-                    # Get transaction details để lấy timestamp
-                    block = self.w3.eth.get_block(event_data['blockNumber'])
-                    
-                    # Ensure tx_hash has 0x prefix - use w3.to_hex() to normalize
-                    tx_hash_raw = event_data['transactionHash']
-                    tx_hash = self.w3.to_hex(tx_hash_raw)
-                    
-                    withdraws.append({
-                        'campaignId': event_campaign_id,
-                        'owner': event_data['args']['owner'],
-                        'amount': event_data['args']['amount'],  # wei
-                        'amount_eth': float(self.w3.from_wei(event_data['args']['amount'], 'ether')),  # ETH
-                        'tx_hash': tx_hash,
-                        'block_number': event_data['blockNumber'],
-                        'timestamp': block['timestamp']
-                    })
-                except Exception as e:
-                    logging.getLogger("uvicorn.error").warning(f"Failed to decode withdraw log {log.get('transactionHash', 'unknown')}: {e}")
-                    continue
-            
-            logging.getLogger("uvicorn.error").info(f"Filtered to {len(withdraws)} withdraws for campaign onchain_id={campaign_onchain_id}")
-            
-            return withdraws
+            decoded = decode_log(w3, decoders, log)
         except Exception as e:
-            logging.getLogger("uvicorn.error").error(f"Error getting withdraw events: {e}")
-            return []
+            logging.getLogger("uvicorn.error").warning(f"Failed to decode receipt log: {e}")
+            continue
+        if decoded is not None and decoded[0] == "FundsWithdrawn":
+            events.append(decoded[1])
+    timestamps = block_timestamps.get_many(w3, [ev["blockNumber"] for ev in events])
+    return [_withdraw_row(w3, ev, timestamps) for ev in events]
 
-def make_service():
-    return Web3Service(rpc_url=RPC_URL, private_key=DEPLOYER_PRIVATE_KEY, chain_id=CHAIN_ID)
 
+def insert_event_rows(session: Session, donation_rows: list[dict], withdraw_rows: list[dict]) -> tuple[int, int]:
+    """
+    Map onchain_id -> campaign.id và bulk insert (bỏ qua tx_hash đã có). Không commit.
+    Trả về (số donations mới, số withdrawals mới).
+    """
+    # onchain_id -> campaign.id từ resolver trong bộ nhớ (không query theo từng event)
+    local_ids = {}
+    for onchain_id in {r["onchain_campaign_id"] for r in donation_rows + withdraw_rows}:
+        campaign_id = campaign_resolver.resolve(onchain_id, session)
+        if campaign_id is not None:
+            local_ids[onchain_id] = campaign_id
+
+    # Donation của campaign chưa liên kết giữ onchain_id làm campaign_id (như trước)
+    for r in donation_rows:
+        r["campaign_id"] = local_ids.get(r["onchain_campaign_id"], r["onchain_campaign_id"])
+    # Withdrawal chỉ lưu khi campaign có trong DB
+    withdraw_rows = [
+        {**r, "campaign_id": local_ids[r["onchain_campaign_id"]]}
+        for r in withdraw_rows
+        if r["onchain_campaign_id"] in local_ids
+    ]
+
+    return bulk_insert_donations(session, donation_rows), bulk_insert_withdraw_logs(session, withdraw_rows)
+
+
+def persist_ingested_events(
+    contract_address: str,
+    to_block: int,
+    donation_rows: list[dict],
+    withdraw_rows: list[dict],
+    to_block_hash: str | None = None,
+) -> tuple[int, int]:
+    """
+    Ghi toàn bộ donations/withdrawals của một vòng ingest và checkpoint trong MỘT transaction.
+    Rows trùng tx_hash bị bỏ qua. Trả về (số donations mới, số withdrawals mới).
+    to_block_hash (nếu có) được lưu để phát hiện reorg ở vòng sau.
+    Chạy trên db_writer (commit chung với các mutation khác đang chờ); chặn tới khi đã commit.
+    """
+    def write(session: Session) -> tuple[int, int]:
+        saved = insert_event_rows(session, donation_rows, withdraw_rows)
+        save_indexer_checkpoint(session, contract_address, to_block, commit=False)
+        if to_block_hash:
+            record_indexed_block(session, contract_address, to_block, to_block_hash, REORG_WINDOW)
+        return saved
 
-def start_donation_event_poller(poll_interval: int = 8):
+    saved_donations, saved_withdraws = db_writer.run(write)
+    # raised / withdrawn on-chain của các campaign này đã đổi
+    campaign_state.invalidate({r["onchain_campaign_id"] for r in donation_rows + withdraw_rows})
+    return saved_donations, saved_withdraws
+
+
+def find_reorg_ancestor(w3: Web3, contract_address: str, next_header: dict, last_checked: int) -> int | None:
     """
-    Start a blocking poller that queries DonationReceived events and saves them to the DB.
-    This is intended to be run in a background thread from application startup.
+    So sánh parentHash của block last_checked+1 với hash đã lưu của last_checked.
+    None nếu chain vẫn liên tục; ngược lại trả về block chung mới nhất (ancestor) để rollback.
     """
-    if not RPC_URL or not DISASTER_FUND_ADDRESS:
-        logging.getLogger("uvicorn.error").warning("RPC_URL or DISASTER_FUND_ADDRESS not set; skipping event poller")
-        return
+    known = load_indexed_hashes(contract_address)
+    if not is_reorg(known, next_header, last_checked):
+        return None
+
+    # Reorg: tìm block đã lưu mới nhất còn nằm trên chain canonical (một batch header request)
+    return pick_reorg_ancestor(known, fetch_block_headers(w3, sorted(known)))
+
+
+def load_indexed_hashes(contract_address: str) -> dict[int, str]:
+    with Session(engine) as session:
+        return {b.block_number: b.block_hash for b in get_indexed_blocks(session, contract_address)}
+
+
+def is_reorg(known: dict[int, str], next_header: dict, last_checked: int) -> bool:
+    return last_checked in known and next_header["parentHash"] != known[last_checked]
 
-    w3 = Web3(Web3.HTTPProvider(RPC_URL))
+
+def pick_reorg_ancestor(known: dict[int, str], canonical: dict[int, dict]) -> int:
+    """Block đã lưu mới nhất có hash trùng với chain canonical"""
+    for number in sorted(known, reverse=True):
+        header = canonical.get(number)
+        if header and header["hash"] == known[number]:
+            return number
+    # Reorg sâu hơn cửa sổ đã lưu: quay về trước block cũ nhất còn hash
+    return max(0, min(known) - 1)
+
+
+def rollback_to_ancestor(contract_address: str, ancestor_block: int) -> tuple[int, int]:
+    return db_writer.run(rollback_indexed_range, contract_address, ancestor_block)
+
+
+def plan_ingestion_window(last_checked: int, latest: int) -> tuple[int, int] | None:
+    """
+    (to_block, safe_head) của vòng ingest kế tiếp: chỉ block đã đủ CONFIRMATION_DEPTH confirmations,
+    tối đa POLLER_MAX_BLOCKS_PER_CYCLE block (phần còn lại quét ở vòng sau). None nếu chưa có block mới.
+    """
+    safe_head = latest - CONFIRMATION_DEPTH
+    if safe_head <= last_checked:
+        return None
+    return min(safe_head, last_checked + POLLER_MAX_BLOCKS_PER_CYCLE), safe_head
+
+
+def require_headers(headers: dict[int, dict], *blocks: int) -> None:
+    missing = [b for b in blocks if b not in headers]
+    if missing:
+        raise RuntimeError(f"Missing block headers for {'/'.join(str(b) for b in missing)}")
+
+
+def rollback_reorg(contract_address: str, ancestor: int, last_checked: int) -> None:
+    """Xoá event + hash đã index sau ancestor (reorg tại last_checked)"""
+    removed_donations, removed_withdraws = rollback_to_ancestor(contract_address, ancestor)
+    logger.warning(
+        f"Reorg detected at block {last_checked}: rolled back to {ancestor} "
+        f"({removed_donations} donations, {removed_withdraws} withdrawals removed)"
+    )
+
+
+def decode_ingested_logs(
+    w3: Web3, decoders: dict[str, tuple[str, dict]], logs: list, from_block: int, to_block: int, latest: int
+) -> list[tuple[str, dict]]:
+    """Decode logs của một vòng ingest; trả về các event có giá trị (DonationReceived / FundsWithdrawn)"""
+    logger.info(f"Polled blocks {from_block}-{to_block} (head={latest}), found {len(logs)} logs")
+    events = []
+    for log in logs:
+        try:
+            decoded = decode_log(w3, decoders, log)
+        except Exception as e:
+            logger.warning(f"Failed to decode event: {e}")
+            continue
+        if decoded is None:
+            continue
+        name, ev = decoded
+        if name == "CampaignCreated":
+            # onchain_id được lưu bởi create_campaign (update_onchain_info); ở đây chỉ ghi log
+            logger.info(f"CampaignCreated onchain_id={ev['args'].get('campaignId')} tx={w3.to_hex(ev['transactionHash'])}")
+            continue
+        events.append(decoded)
+    return events
+
+
+def build_ingested_rows(
+    w3: Web3, value_events: list[tuple[str, dict]], timestamps: dict[int, int]
+) -> tuple[list[dict], list[dict]]:
+    """(donation_rows, withdraw_rows); raise nếu thiếu timestamp (không advance checkpoint, vòng sau thử lại cả range)"""
+    missing = {ev["blockNumber"] for _, ev in value_events} - set(timestamps)
+    if missing:
+        raise RuntimeError(f"Missing block timestamps for blocks {sorted(missing)}")
+    donation_rows = [_donation_row(w3, ev, timestamps) for name, ev in value_events if name == "DonationReceived"]
+    withdraw_rows = [_withdraw_row(w3, ev, timestamps) for name, ev in value_events if name == "FundsWithdrawn"]
+    return donation_rows, withdraw_rows
+
+
+def persist_ingestion_window(
+    contract_address: str,
+    from_block: int,
+    to_block: int,
+    donation_rows: list[dict],
+    withdraw_rows: list[dict],
+    to_block_hash: str,
+) -> None:
+    """Donations + withdrawals + checkpoint của một vòng ingest: một transaction"""
+    saved_donations, saved_withdraws = persist_ingested_events(
+        contract_address, to_block, donation_rows, withdraw_rows, to_block_hash
+    )
+    if saved_donations or saved_withdraws:
+        logger.info(f"Saved {saved_donations} donations, {saved_withdraws} withdrawals from blocks {from_block}-{to_block}")
+
+
+class IngestionState:
+    """
+    Trạng thái ingest của một contract, dùng chung giữa các vòng poll và WebSocket mode.
+
+    Ở WebSocket mode, logs được push vào pushed_logs; mọi block > subscribed_from đã có
+    đủ logs trong buffer nên fetch_logs không cần gọi eth_getLogs cho các range đó.
+    """
+
+    def __init__(self, w3: Web3, registry: ContractRegistry, last_checked: int):
+        self.w3 = w3
+        self.contract_address = registry.address
+        self.decoders = registry.decoders(INGESTED_EVENTS)
+        self.log_filter = registry.log_filter(INGESTED_EVENTS)
+        self.scanner = LogRangeScanner(w3)
+        self.last_checked = last_checked
+        self.subscribed_from: int | None = None
+        self.pushed_logs: dict[tuple[str, int], dict] = {}
+        self.lock = threading.Lock()
+
+    def push_log(self, log) -> None:
+        """Log nhận từ subscription; removed=True (reorg) thì bỏ khỏi buffer"""
+        key = (self.w3.to_hex(log["transactionHash"]), int(log["logIndex"]))
+        with self.lock:
+            if log.get("removed"):
+                self.pushed_logs.pop(key, None)
+            elif log["blockNumber"] > self.last_checked:
+                self.pushed_logs[key] = log
+
+    def fetch_logs(self, from_block: int, to_block: int) -> list:
+        if self.subscribed_from is not None and from_block > self.subscribed_from:
+            with self.lock:
+                logs = [log for log in self.pushed_logs.values() if from_block <= log["blockNumber"] <= to_block]
+            return sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+        # Query logs from_block..to_block (chunked, adaptive range)
+        return self.scanner.scan(self.log_filter, from_block, to_block)
+
+    def mark_indexed(self, to_block: int) -> None:
+        """Cursor đã tới to_block: bỏ các pushed logs không còn cần"""
+        with self.lock:
+            self.last_checked = to_block
+            for key in [k for k, log in self.pushed_logs.items() if log["blockNumber"] <= to_block]:
+                del self.pushed_logs[key]
+
+
+def make_reader_web3() -> Web3:
+    """Web3 HTTP không cần private key, dùng cho các đường đọc event (poller, backfill)"""
+    w3 = Web3(make_rpc_provider())
     try:
         # add POA middleware if needed (Sepolia-like chains)
         from web3.middleware import geth_poa_middleware
@@ -490,154 +744,122 @@ def start_donation_event_poller(poll_interval: int = 8):
         w3.middleware_onion.inject(geth_poa_middleware, layer=0)
     except Exception:
         pass
+    return w3
+
+
+def make_ingestion_state() -> IngestionState | None:
+    """Web3 + decoder table + cursor cho ingest; None nếu thiếu cấu hình"""
+    logger = logging.getLogger("uvicorn.error")
+    if not RPC_URL or not DISASTER_FUND_ADDRESS:
+        logger.warning("RPC_URL or DISASTER_FUND_ADDRESS not set; skipping event poller")
+        return None
 
-    # Use ABI loaded above
+    w3 = make_reader_web3()
+
+    # Use ABI loaded by the contract registry
     if not CONTRACT_ABI:
-        logging.getLogger("uvicorn.error").warning("Contract ABI not loaded; event poller will not run")
-        return
+        logger.warning("Contract ABI not loaded; event poller will not run")
+        return None
 
-    # Find DonationReceived event ABI
-    donation_event_abi = next((a for a in CONTRACT_ABI if a.get("type") == "event" and a.get("name") == "DonationReceived"), None)
-    if not donation_event_abi:
-        logging.getLogger("uvicorn.error").warning("DonationReceived event ABI not found; poller will not run")
-        return
+    registry = contract_registry()
+    if "DonationReceived" not in registry.events:
+        logger.warning("DonationReceived event ABI not found; poller will not run")
+        return None
 
-    contract = w3.eth.contract(address=Web3.to_checksum_address(DISASTER_FUND_ADDRESS), abi=CONTRACT_ABI)
+    last_checked = _load_poller_cursor(registry.address, w3.eth.block_number)
+    return IngestionState(w3, registry, last_checked)
 
-    logger = logging.getLogger("uvicorn.error")
-    logger.info(f"Starting donation event poller for {DISASTER_FUND_ADDRESS}")
 
-    last_checked = w3.eth.block_number
-    while True:
+def run_ingestion_cycle(state: IngestionState, latest: int) -> bool:
+    """
+    Index một window block [last_checked+1, min(safe head, last_checked+MAX)].
+    Trả về True nếu vẫn còn block chưa index (caller chạy vòng tiếp ngay, không sleep).
+    Các bước không phải RPC dùng chung với AsyncDonationIngester.run_cycle.
+    """
+    w3 = state.w3
+    last_checked = state.last_checked
+    window = plan_ingestion_window(last_checked, latest)
+    if window is None:
+        return False
+    to_block, safe_head = window
+
+    # Header của block đầu (kiểm tra parentHash) và block cuối (lưu hash) trong một batch
+    headers = fetch_block_headers(w3, sorted({last_checked + 1, to_block}))
+    require_headers(headers, last_checked + 1, to_block)
+
+    ancestor = find_reorg_ancestor(w3, state.contract_address, headers[last_checked + 1], last_checked)
+    if ancestor is not None:
+        rollback_reorg(state.contract_address, ancestor, last_checked)
+        state.last_checked = ancestor
+        if state.subscribed_from is not None:
+            # Range bị rollback phải lấy lại bằng eth_getLogs
+            state.subscribed_from = max(state.subscribed_from, last_checked)
+        return True  # re-index ngay ở vòng sau
+
+    logs = state.fetch_logs(last_checked + 1, to_block)
+    value_events = decode_ingested_logs(w3, state.decoders, logs, last_checked + 1, to_block, latest)
+
+    # Một batch header request cho tất cả block có event trong vòng này
+    timestamps = block_timestamps.get_many(w3, [ev["blockNumber"] for _, ev in value_events])
+    donation_rows, withdraw_rows = build_ingested_rows(w3, value_events, timestamps)
+
+    persist_ingestion_window(
+        state.contract_address, last_checked + 1, to_block, donation_rows, withdraw_rows, headers[to_block]["hash"]
+    )
+    state.mark_indexed(to_block)
+    return to_block < safe_head
+
+
+def run_polling_loop(state: IngestionState, poll_interval: int, stop_after: float | None = None) -> None:
+    """Chạy các vòng poll HTTP; stop_after (giây) dùng khi poll tạm thời thay cho WebSocket"""
+    logger = logging.getLogger("uvicorn.error")
+    deadline = time.monotonic() + stop_after if stop_after is not None else None
+    while deadline is None or time.monotonic() < deadline:
+        catching_up = False
         try:
-            latest = w3.eth.block_number
-            if latest > last_checked:
-                from web3._utils.events import get_event_data
-
-                # Query logs from last_checked+1 to latest
-                logs = w3.eth.get_logs({
-                    "fromBlock": last_checked + 1,
-                    "toBlock": latest,
-                    "address": Web3.to_checksum_address(DISASTER_FUND_ADDRESS),
-                })
-
-                logger.info(f"Polled blocks {last_checked+1}-{latest}, found {len(logs)} logs")
-                for log in logs:
-                    try:
-                        ev = get_event_data(w3.codec, donation_event_abi, log)
-                        args = ev.get("args", {})
-                        campaign_id = int(args.get("campaignId") or 0)
-                        donor = args.get("donor")
-                        amount_wei = int(args.get("amount") or 0)
-                        tx_hash = w3.to_hex(ev.get("transactionHash"))
-                        block_number = ev.get("blockNumber")
-
-                        amount_eth = float(w3.from_wei(amount_wei, "ether"))
-
-                        # Persist to DB if not exists
-                        with Session(engine) as session:
-                            exists = session.exec(
-                                select(Donation).where(Donation.tx_hash == tx_hash)
-                            ).first()
-                            if exists:
-                                logger.debug(f"Donation already exists: {tx_hash}")
-                            else:
-                                # Get block timestamp
-                                try:
-                                    blk = w3.eth.get_block(block_number)
-                                    ts = datetime.fromtimestamp(blk["timestamp"]) if blk and blk.get("timestamp") else None
-                                except Exception:
-                                    ts = None
-
-                                d = Donation(
-                                    campaign_id=campaign_id,
-                                    onchain_campaign_id=campaign_id,
-                                    donor_address=donor,
-                                    amount_eth=amount_eth,
-                                    amount_wei=str(amount_wei),
-                                    tx_hash=tx_hash,
-                                    block_number=block_number,
-                                    timestamp=ts,
-                                )
-                                session.add(d)
-                                session.commit()
-                                logger.info(f"Saved donation {tx_hash} campaign={campaign_id} amount={amount_eth} ETH")
-                                
-                                # Try to find local campaign_id from onchain_id
-                                from ..models import Campaign
-                                local_campaign = session.exec(
-                                    select(Campaign).where(Campaign.onchain_id == campaign_id)
-                                ).first()
-                                if local_campaign:
-                                    d.campaign_id = local_campaign.id
-                                    session.add(d)
-                                    session.commit()
-
-                    except Exception as e:
-                        logger.warning(f"Failed to decode/log event: {e}")
-                        continue
-                
-                # Also check for FundsWithdrawn events
-                withdraw_event_abi = next((a for a in CONTRACT_ABI if a.get("type") == "event" and a.get("name") == "FundsWithdrawn"), None)
-                if withdraw_event_abi:
-                    for log in logs:
-                        try:
-                            from web3._utils.events import get_event_data
-                            ev = get_event_data(w3.codec, withdraw_event_abi, log)
-                            args = ev.get("args", {})
-                            withdraw_campaign_id = int(args.get("campaignId") or 0)
-                            owner = args.get("owner")
-                            amount_wei = int(args.get("amount") or 0)
-                            tx_hash = w3.to_hex(ev.get("transactionHash"))
-                            block_number = ev.get("blockNumber")
-                            
-                            amount_eth = float(w3.from_wei(amount_wei, "ether"))
-                            
-                            # Check if already exists
-                            with Session(engine) as session:
-                                exists = session.exec(
-                                    select(WithdrawLog).where(WithdrawLog.tx_hash == tx_hash)
-                                ).first()
-                                if exists:
-                                    continue
-                                
-                                # Find local campaign
-                                from ..models import Campaign
-                                local_campaign = session.exec(
-                                    select(Campaign).where(Campaign.onchain_id == withdraw_campaign_id)
-                                ).first()
-                                
-                                if local_campaign:
-                                    try:
-                                        blk = w3.eth.get_block(block_number)
-                                        ts = datetime.fromtimestamp(blk["timestamp"]) if blk and blk.get("timestamp") else None
-                                    except Exception:
-                                        ts = None
-                                    
-                                    wl = WithdrawLog(
-                                        campaign_id=local_campaign.id,
-                                        onchain_campaign_id=withdraw_campaign_id,
-                                        owner_address=owner,
-                                        amount_eth=amount_eth,
-                                        amount_wei=str(amount_wei),
-                                        tx_hash=tx_hash,
-                                        block_number=block_number,
-                                        timestamp=ts,
-                                    )
-                                    session.add(wl)
-                                    session.commit()
-                                    logger.info(f"Saved withdraw {tx_hash} campaign={local_campaign.id} amount={amount_eth} ETH")
-                                    
-                        except Exception as e:
-                            # Not a withdraw event, skip
-                            continue
-
-                last_checked = latest
-
+            catching_up = run_ingestion_cycle(state, state.w3.eth.block_number)
         except Exception as e:
             logger.error(f"Donation poller error: {e}")
+            catching_up = False
+
+        if not catching_up:
+            time.sleep(poll_interval)
+
+
+def start_donation_event_poller(poll_interval: int = 8):
+    """
+    Start a blocking poller that queries DonationReceived events and saves them to the DB.
+    This is intended to be run in a background thread from application startup.
+
+    The cursor is persisted per contract address (IndexerCheckpoint), so a restart resumes
+    from the last indexed block. While behind head the poller catches up in windows of
+    POLLER_MAX_BLOCKS_PER_CYCLE blocks without sleeping between them.
+
+    Only blocks with CONFIRMATION_DEPTH confirmations are indexed. The hash of each cycle's
+    last block is stored (IndexedBlock); when the next block's parentHash no longer matches,
+    events after the common ancestor are rolled back and re-indexed.
+
+    Logs are fetched with a single topic0 filter over INGESTED_EVENTS and dispatched
+    through a topic -> decoder table, so each log is decoded exactly once.
+
+    With INGESTION_MODE=ws, logs are pushed over a WebSocket subscription instead
+    (see ws_ingester) and polling is only used while the socket is down.
+    """
+    state = make_ingestion_state()
+    if state is None:
+        return
+
+    logger = logging.getLogger("uvicorn.error")
+    logger.info(f"Starting donation event poller for {DISASTER_FUND_ADDRESS} (mode={INGESTION_MODE})")
+    logger.info(f"Donation poller resuming after block {state.last_checked}")
+
+    if INGESTION_MODE == "ws":
+        from .ws_ingester import run_ws_ingestion
+
+        run_ws_ingestion(state, poll_interval)
+        return
 
-        time.sleep(poll_interval)
+    run_polling_loop(state, poll_interval)
 
 
 def start_donation_event_poller_thread(poll_interval: int = 8):
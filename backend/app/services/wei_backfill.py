@@ -0,0 +1,61 @@
+"""
+Điền amount_gwei / amount_wei_rem cho donation / withdrawlog ghi trước khi có hai cột này.
+
+Chạy online: mỗi batch WEI_BACKFILL_BATCH rows (duyệt theo id) là một mutation ngắn trên
+db_writer, nên ingest và API vẫn chạy bình thường trong lúc backfill. Rows mới đã có giá trị
+khi insert. Các tổng tính bằng SQL (reconciliation, rebuild campaign_totals) chờ backfill xong.
+"""
+import logging
+import threading
+
+from sqlmodel import Session
+
+from ..config import WEI_BACKFILL_BATCH
+from ..crud import backfill_wei_parts, has_pending_wei_parts
+from ..database import engine
+from ..models import Donation, WithdrawLog
+from .db_writer import db_writer
+
+logger = logging.getLogger("uvicorn.error")
+
+_pending: bool | None = None
+_run_lock = threading.Lock()
+
+
+def wei_backfill_pending() -> bool:
+    """Còn rows chưa có amount_gwei / amount_wei_rem (kiểm tra DB một lần, sau đó theo backfill)"""
+    global _pending
+    if _pending is None:
+        with Session(engine) as session:
+            _pending = has_pending_wei_parts(session)
+    return _pending
+
+
+def run_wei_backfill(batch_size: int = WEI_BACKFILL_BATCH) -> int:
+    """Backfill mọi bảng (blocking); trả về số batch đã chạy"""
+    global _pending
+    with _run_lock:
+        batches = 0
+        for model in (Donation, WithdrawLog):
+            after_id = 0
+            while after_id is not None:
+                after_id = db_writer.run(backfill_wei_parts, model, after_id, batch_size)
+                batches += 1
+        _pending = False
+        logger.info(f"Wei backfill completed ({batches} batches)")
+        return batches
+
+
+def start_wei_backfill_thread() -> bool:
+    """Chạy backfill nền nếu còn rows cũ; False nếu không cần"""
+    if not wei_backfill_pending():
+        return False
+
+    def target():
+        try:
+            run_wei_backfill()
+        except Exception as e:
+            logger.error(f"Wei backfill error: {e}")
+
+    threading.Thread(target=target, daemon=True, name="wei-backfill").start()
+    return True
@@ -0,0 +1,103 @@
+"""
+WebSocket ingestion mode (INGESTION_MODE=ws).
+
+Subscribe eth_subscribe("logs") cho contract và eth_subscribe("newHeads").
+Logs được push vào IngestionState; mỗi new head chạy cùng vòng ingest như poller
+(confirmation depth, reorg check, bulk persist) nhưng lấy logs từ buffer thay vì eth_getLogs.
+Khi socket mất kết nối, fallback về chunked HTTP polling rồi thử kết nối lại.
+
+Chạy thử với local dev node: `npx hardhat node` rồi đặt WS_RPC_URL=ws://127.0.0.1:8545.
+"""
+import asyncio
+import json
+import logging
+
+import websockets
+from web3._utils.method_formatters import log_entry_formatter
+
+from ..config import WS_RPC_URL, WS_RECONNECT_INTERVAL
+from .web3_service import IngestionState, run_ingestion_cycle, run_polling_loop
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def _catch_up(state: IngestionState, head: int) -> None:
+    """Chạy các vòng ingest cho tới khi cursor bắt kịp safe head"""
+    try:
+        while run_ingestion_cycle(state, head):
+            pass
+    except Exception as e:
+        logger.error(f"WebSocket ingestion cycle error: {e}")
+
+
+async def _subscribe(ws, request_id: int, params: list, state: IngestionState, logs_sub: str | None) -> str:
+    await ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": "eth_subscribe", "params": params}))
+    while True:
+        msg = json.loads(await ws.recv())
+        if msg.get("id") == request_id:
+            if "error" in msg:
+                raise RuntimeError(f"eth_subscribe {params[0]} failed: {msg['error']}")
+            return msg["result"]
+        # Log notification có thể tới trước response của subscription kế tiếp
+        sub_params = msg.get("params") or {}
+        if logs_sub and sub_params.get("subscription") == logs_sub:
+            state.push_log(log_entry_formatter(sub_params["result"]))
+
+
+async def _ws_session(state: IngestionState, ws_url: str) -> None:
+    async with websockets.connect(ws_url, ping_interval=20, ping_timeout=20, max_size=None) as ws:
+        logs_sub = await _subscribe(ws, 1, ["logs", state.log_filter], state, None)
+        heads_sub = await _subscribe(ws, 2, ["newHeads"], state, logs_sub)
+
+        # Mọi block sau head hiện tại sẽ có logs đầy đủ qua subscription
+        state.subscribed_from = await asyncio.to_thread(lambda: state.w3.eth.block_number)
+        logger.info(f"WebSocket ingestion subscribed at block {state.subscribed_from}")
+
+        # Ingest chạy ở worker riêng để reader không bao giờ bị chặn (ping/pong, buffer)
+        latest = {"head": state.subscribed_from}
+        wake = asyncio.Event()
+        wake.set()
+
+        async def worker():
+            while True:
+                await wake.wait()
+                wake.clear()
+                await asyncio.to_thread(_catch_up, state, latest["head"])
+
+        worker_task = asyncio.create_task(worker())
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                if msg.get("method") != "eth_subscription":
+                    continue
+                sub_params = msg.get("params") or {}
+                if sub_params.get("subscription") == logs_sub:
+                    state.push_log(log_entry_formatter(sub_params["result"]))
+                elif sub_params.get("subscription") == heads_sub:
+                    latest["head"] = int(sub_params["result"]["number"], 16)
+                    wake.set()
+        finally:
+            worker_task.cancel()
+
+
+def run_ws_ingestion(state: IngestionState, poll_interval: int) -> None:
+    """Blocking: WebSocket ingestion với fallback polling khi socket bị ngắt"""
+    if not WS_RPC_URL:
+        logger.warning("INGESTION_MODE=ws but WS_RPC_URL is not set; falling back to polling")
+        run_polling_loop(state, poll_interval)
+        return
+
+    while True:
+        try:
+            asyncio.run(_ws_session(state, WS_RPC_URL))
+            logger.warning("WebSocket ingestion connection closed")
+        except Exception as e:
+            logger.error(f"WebSocket ingestion error: {e}")
+
+        state.subscribed_from = None
+        with state.lock:
+            state.pushed_logs.clear()
+
+        # Fallback: chunked polling cho tới lần reconnect sau
+        logger.info(f"Falling back to polling for {WS_RECONNECT_INTERVAL}s before reconnecting")
+        run_polling_loop(state, poll_interval, stop_after=WS_RECONNECT_INTERVAL)
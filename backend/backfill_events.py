@@ -0,0 +1,62 @@
+"""
+Backfill lịch sử DonationReceived / FundsWithdrawn từ block deploy contract
+Chạy: python backfill_events.py [--from-block N] [--to-block M] [--workers K]
+Resume job bị dừng: python backfill_events.py --resume JOB_ID
+"""
+import argparse
+import threading
+import time
+
+from app.database import init_db
+from app.services.backfill import plan_backfill, run_backfill_job, backfill_progress
+
+
+def _print_progress(job_id: int) -> None:
+    p = backfill_progress(job_id)
+    print(
+        f"   ⏳ {p['progress_percent']:.1f}% "
+        f"({p['blocks_done']}/{p['blocks_total']} blocks, "
+        f"{p['ranges_completed']}/{p['ranges_total']} ranges, "
+        f"{p['donations_saved']} donations, {p['withdrawals_saved']} withdrawals)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel historical event backfill")
+    parser.add_argument("--from-block", type=int, default=None, help="mặc định DEPLOY_BLOCK")
+    parser.add_argument("--to-block", type=int, default=None, help="mặc định checkpoint của poller")
+    parser.add_argument("--workers", type=int, default=None, help="mặc định BACKFILL_WORKERS")
+    parser.add_argument("--resume", type=int, default=None, metavar="JOB_ID", help="resume job đã có")
+    args = parser.parse_args()
+
+    init_db()
+    if args.resume is not None:
+        job_id = args.resume
+        if backfill_progress(job_id) is None:
+            print(f"❌ Backfill job {job_id} không tồn tại")
+            return
+    else:
+        job = plan_backfill(args.from_block, args.to_block, args.workers, requested_by="cli")
+        job_id = job.id
+    p = backfill_progress(job_id)
+    print(f"📦 Backfill job {job_id}: blocks {p['from_block']}-{p['to_block']}, "
+          f"{p['ranges_total']} ranges, {p['workers']} workers")
+
+    started = time.monotonic()
+    worker = threading.Thread(target=run_backfill_job, args=(job_id,))
+    worker.start()
+    while worker.is_alive():
+        worker.join(timeout=10)
+        _print_progress(job_id)
+
+    p = backfill_progress(job_id)
+    elapsed = time.monotonic() - started
+    if p["status"] == "completed":
+        print(f"\n✅ Backfill hoàn tất trong {elapsed:.0f}s")
+    else:
+        print(f"\n❌ Backfill {p['status']}: {p['error']}")
+        print(f"💡 Chạy lại: python backfill_events.py --resume {job_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -89,7 +89,54 @@ def migrate():
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_withdrawlog_campaign_id ON withdrawlog(campaign_id)")
         except sqlite3.OperationalError as e:
             print(f"   ⚠️ Lỗi khi tạo withdrawlog: {e}")
-        
+
+        # Index cho các query donation / withdraw log / audit log
+        print("\n4. Kiểm tra indexes...")
+        try:
+            cursor.execute("PRAGMA table_info(donation)")
+            donation_columns = [row[1] for row in cursor.fetchall()]
+            if "donor_address_lower" not in donation_columns:
+                print("   ➕ Thêm column: donor_address_lower")
+                cursor.execute("ALTER TABLE donation ADD COLUMN donor_address_lower TEXT")
+            cursor.execute("UPDATE donation SET donor_address_lower = lower(donor_address) WHERE donor_address_lower IS NULL")
+            indexes = [
+                ("ix_donation_donor_address_lower_timestamp", "donation(donor_address_lower, timestamp)"),
+                ("ix_donation_campaign_id_timestamp", "donation(campaign_id, timestamp)"),
+                ("ix_donation_campaign_id_donor_address", "donation(campaign_id, donor_address)"),
+                ("ix_withdrawlog_campaign_id_timestamp", "withdrawlog(campaign_id, timestamp)"),
+                ("ix_auditlog_timestamp_action_username", "auditlog(timestamp, action, username)"),
+            ]
+            for name, target in indexes:
+                try:
+                    cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+                    print(f"   ✅ Index {name}")
+                except sqlite3.OperationalError as e:
+                    print(f"   ⚠️ Không tạo được index {name}: {e}")
+            cursor.execute("ANALYZE")
+        except sqlite3.OperationalError as e:
+            print(f"   ⚠️ Lỗi khi tạo indexes: {e}")
+
+        # Wei dạng hai INTEGER: amount_wei = amount_gwei * 10**9 + amount_wei_rem
+        print("\n5. Kiểm tra amount_gwei / amount_wei_rem...")
+        for table in ("donation", "withdrawlog"):
+            try:
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = [row[1] for row in cursor.fetchall()]
+                if not columns:
+                    continue
+                if "amount_gwei" not in columns:
+                    print(f"   ➕ Thêm columns: {table}.amount_gwei, {table}.amount_wei_rem")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN amount_gwei INTEGER")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN amount_wei_rem INTEGER")
+                rows = cursor.execute(f"SELECT id, amount_wei FROM {table} WHERE amount_gwei IS NULL").fetchall()
+                cursor.executemany(
+                    f"UPDATE {table} SET amount_gwei = ?, amount_wei_rem = ? WHERE id = ?",
+                    [(int(wei) // 10**9, int(wei) % 10**9, row_id) for row_id, wei in rows],
+                )
+                print(f"   ✅ {table}: điền {len(rows)} rows")
+            except sqlite3.OperationalError as e:
+                print(f"   ⚠️ Lỗi khi cập nhật {table}: {e}")
+
         # Commit changes
         conn.commit()
         print("\n✅ Migration hoàn tất!")
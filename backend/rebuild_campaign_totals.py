@@ -0,0 +1,31 @@
+"""
+Tính lại bảng campaign_totals từ donation / withdrawlog
+Chạy: python rebuild_campaign_totals.py [--campaign-id ID ...]
+"""
+import argparse
+import time
+
+from app.crud import rebuild_campaign_totals
+from app.database import init_db
+from app.services.db_writer import db_writer
+from app.services.wei_backfill import run_wei_backfill, wei_backfill_pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild campaign_totals from stored events")
+    parser.add_argument("--campaign-id", type=int, action="append", default=None, help="chỉ rebuild campaign này (lặp lại được)")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.monotonic()
+    if wei_backfill_pending():
+        # Tổng SQL cần amount_gwei / amount_wei_rem của mọi row
+        print("🔢 Điền amount_gwei / amount_wei_rem cho rows cũ...")
+        run_wei_backfill()
+    # Qua db_writer: cùng transaction, không chen giữa một batch ingest
+    count = db_writer.run(rebuild_campaign_totals, args.campaign_id)
+    print(f"✅ Rebuilt campaign_totals for {count} campaigns in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
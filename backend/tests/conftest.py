@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# app.database tạo engine lúc import: trỏ sang database tạm trước khi test import app
+_TMP_DIR = tempfile.mkdtemp(prefix="relief-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(_TMP_DIR) / 'app.db'}")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
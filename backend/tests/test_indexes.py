@@ -0,0 +1,67 @@
+"""
+Các index composite (donation, withdrawlog, auditlog) phải được SQLite dùng cho chính
+các query trong crud: chạy query trên schema tạm, lấy SQL thật rồi EXPLAIN QUERY PLAN.
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlmodel import Session, SQLModel
+
+from app import crud
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'indexes.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _query_plan(engine, run) -> str:
+    """Chạy run(session), trả về EXPLAIN QUERY PLAN của câu SELECT cuối cùng nó gửi tới SQLite"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with Session(engine) as session:
+            run(session)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize(
+    "run, index",
+    [
+        (lambda db: crud.get_donations_by_donor(db, "0xAbC0000000000000000000000000000000000001"),
+         "ix_donation_donor_address_lower_timestamp"),
+        (lambda db: crud.get_donations_by_campaign_id(db, 1), "ix_donation_campaign_id_timestamp"),
+        (lambda db: crud.get_withdraw_logs_by_campaign(db, 1), "ix_withdrawlog_campaign_id_timestamp"),
+        (lambda db: crud.get_audit_logs(db), "ix_auditlog_timestamp_action_username"),
+        (lambda db: crud.get_audit_logs(db, action="withdraw", username="admin"),
+         "ix_auditlog_timestamp_action_username"),
+    ],
+    ids=["donor-history", "campaign-timeline", "withdraw-log", "audit-log", "audit-log-filtered"],
+)
+def test_query_uses_index(engine, run, index):
+    plan = _query_plan(engine, run)
+    assert index in plan, plan
+    # ORDER BY timestamp được index phục vụ, không sort tạm
+    assert "USE TEMP B-TREE" not in plan, plan
+
+
+def test_campaign_donor_index_covers_donor_lookup(engine):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT COUNT(DISTINCT donor_address) FROM donation WHERE campaign_id = ?", (1,)
+        ).fetchall()
+    plan = "\n".join(row[-1] for row in rows)
+    assert "ix_donation_campaign_id_donor_address" in plan, plan
@@ -0,0 +1,59 @@
+"""
+Phân loại lỗi eth_getLogs: range quá lớn -> chia đôi chunk, rate limit -> backoff giữ nguyên chunk.
+"""
+import requests
+
+from app.services.log_scanner import LogRangeScanner, is_range_limit_error, is_rate_limit_error
+
+# Payload thật của Infura: hex block range chứa "429"
+INFURA_RANGE_ERROR = {
+    "code": -32005,
+    "message": "query returned more than 10000 results. Try with this block range [0x44A3C1, 0x44A429].",
+}
+
+
+class _Eth:
+    def __init__(self, max_range: int):
+        self.max_range = max_range
+        self.calls = []
+
+    def get_logs(self, params):
+        self.calls.append((params["fromBlock"], params["toBlock"]))
+        if params["toBlock"] - params["fromBlock"] + 1 > self.max_range:
+            raise ValueError(INFURA_RANGE_ERROR)
+        return [{"blockNumber": params["fromBlock"]}]
+
+
+class _W3:
+    def __init__(self, max_range: int):
+        self.eth = _Eth(max_range)
+
+
+def test_infura_range_error_is_range_limit_not_rate_limit():
+    exc = ValueError(INFURA_RANGE_ERROR)
+    assert is_range_limit_error(exc)
+    assert not is_rate_limit_error(exc)
+
+
+def test_rate_limit_errors():
+    response = requests.Response()
+    response.status_code = 429
+    http_429 = requests.exceptions.HTTPError("429 Client Error: Too Many Requests", response=response)
+    assert is_rate_limit_error(http_429) and not is_range_limit_error(http_429)
+
+    infura_rate = ValueError({"code": -32005, "message": "daily request count exceeded, request rate limited"})
+    assert is_rate_limit_error(infura_rate) and not is_range_limit_error(infura_rate)
+
+
+def test_scanner_halves_chunk_on_infura_range_error():
+    w3 = _W3(max_range=100)
+    scanner = LogRangeScanner(w3, initial_chunk=1000, min_chunk=10, max_chunk=1000)
+    scanner.rate_limit_retries = 0
+
+    logs = scanner.scan({}, 1, 400)
+
+    accepted = [(a, b) for a, b in w3.eth.calls if b - a + 1 <= 100]
+    assert w3.eth.calls[0] == (1, 400)
+    assert [log["blockNumber"] for log in logs] == [a for a, _ in accepted]
+    assert accepted[0][0] == 1 and accepted[-1][1] == 400
+    assert all(prev[1] + 1 == cur[0] for prev, cur in zip(accepted, accepted[1:]))
@@ -0,0 +1,157 @@
+"""
+WebSocket ingestion (INGESTION_MODE=ws) trên một local dev node: subscribe -> vòng ingest
+chạy theo new head (logs lấy từ subscription, không eth_getLogs) -> fallback HTTP polling
+quét lại các block đã ingest mà không tạo row trùng.
+
+Cần một dev node có HTTP + WebSocket, vd. `npx hardhat node` hoặc `anvil`
+(DEV_NODE_RPC_URL / DEV_NODE_WS_URL, mặc định 127.0.0.1:8545); không có node thì skip.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+from sqlmodel import Session, select
+from web3 import Web3, HTTPProvider
+
+from app.config import CONFIRMATION_DEPTH
+from app.database import engine, init_db
+from app.models import Donation, IndexerCheckpoint
+from app.services import ws_ingester
+from app.services.contract_registry import ABI_PATH, ContractRegistry
+from app.services.web3_service import IngestionState, run_polling_loop
+
+DEV_NODE_RPC_URL = os.getenv("DEV_NODE_RPC_URL", "http://127.0.0.1:8545")
+DEV_NODE_WS_URL = os.getenv("DEV_NODE_WS_URL", "ws://127.0.0.1:8545")
+
+
+@pytest.fixture(scope="module")
+def w3():
+    w3 = Web3(HTTPProvider(DEV_NODE_RPC_URL, request_kwargs={"timeout": 5}))
+    try:
+        connected = w3.is_connected() and bool(w3.eth.accounts)
+    except Exception:
+        connected = False
+    if not connected:
+        pytest.skip(f"no local dev node with unlocked accounts at {DEV_NODE_RPC_URL}")
+    init_db()
+    return w3
+
+
+@pytest.fixture()
+def deployment(w3):
+    """DisasterFund mới deploy + một campaign; trả về (registry, onchain campaign id)"""
+    artifact = json.loads(ABI_PATH.read_text(encoding="utf-8"))
+    owner = w3.eth.accounts[0]
+    factory = w3.eth.contract(abi=artifact["abi"], bytecode=artifact["bytecode"])
+    receipt = w3.eth.wait_for_transaction_receipt(factory.constructor().transact({"from": owner}))
+    contract = w3.eth.contract(address=receipt["contractAddress"], abi=artifact["abi"])
+    w3.eth.wait_for_transaction_receipt(
+        contract.functions.createCampaign("ws test", "", Web3.to_wei(10, "ether")).transact({"from": owner})
+    )
+    return ContractRegistry(w3.eth.chain_id, receipt["contractAddress"], artifact["abi"]), contract.functions.campaignCount().call()
+
+
+class _WsSession:
+    """Chạy ws_ingester._ws_session trên event loop riêng (như run_ws_ingestion) và dừng được từ test"""
+
+    def __init__(self, state: IngestionState, url: str):
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(ws_ingester._ws_session(state, url))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.loop.run_until_complete(self.task)
+        except BaseException:
+            pass
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(10)
+
+
+def _wait_for(predicate, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _donate(w3, registry: ContractRegistry, campaign_id: int, amount_wei: int) -> str:
+    contract = w3.eth.contract(address=registry.address, abi=list(registry.abi))
+    tx_hash = contract.functions.donate(campaign_id).transact({"from": w3.eth.accounts[1], "value": amount_wei})
+    w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3.to_hex(tx_hash)
+
+
+def _mine(w3, blocks: int) -> None:
+    for _ in range(blocks):
+        w3.provider.make_request("evm_mine", [])
+
+
+def _stored(tx_hashes: list[str]) -> list[str]:
+    with Session(engine) as session:
+        return list(session.exec(select(Donation.tx_hash).where(Donation.tx_hash.in_(tx_hashes))).all())
+
+
+def _checkpoint(address: str) -> int | None:
+    with Session(engine) as session:
+        cp = session.exec(select(IndexerCheckpoint).where(IndexerCheckpoint.contract_address == address.lower())).first()
+        return cp.last_block if cp else None
+
+
+def test_ws_subscribe_ingest_and_http_fallback_without_duplicates(w3, deployment):
+    registry, campaign_id = deployment
+    start_block = w3.eth.block_number
+    state = IngestionState(w3, registry, start_block)
+
+    # Ghi lại mọi range eth_getLogs: ở WebSocket mode các block sau subscribed_from không được query
+    scanned = []
+    scan = state.scanner.scan
+    state.scanner.scan = lambda log_filter, a, b: scanned.append((a, b)) or scan(log_filter, a, b)
+
+    session = _WsSession(state, DEV_NODE_WS_URL)
+    try:
+        assert _wait_for(lambda: state.subscribed_from is not None), "eth_subscribe did not complete"
+        subscribed_from = state.subscribed_from
+
+        tx_hashes = [_donate(w3, registry, campaign_id, Web3.to_wei(v, "ether")) for v in ("1", "0.25")]
+        donated_at = w3.eth.block_number
+        # Mỗi block mới là một new head -> một vòng ingest; đủ confirmations thì donations được lưu
+        _mine(w3, CONFIRMATION_DEPTH)
+
+        assert _wait_for(lambda: sorted(_stored(tx_hashes)) == sorted(tx_hashes)), "donations not ingested from WebSocket"
+        assert _wait_for(lambda: (_checkpoint(registry.address) or 0) >= donated_at)
+        assert state.last_checked >= donated_at
+        assert all(b <= subscribed_from for _, b in scanned), scanned
+    finally:
+        session.stop()
+
+    # Socket mất: run_ws_ingestion reset state rồi poll HTTP
+    state.subscribed_from = None
+    with state.lock:
+        state.pushed_logs.clear()
+
+    tx_hashes.append(_donate(w3, registry, campaign_id, Web3.to_wei("0.5", "ether")))
+    _mine(w3, CONFIRMATION_DEPTH)
+    head = w3.eth.block_number
+
+    # Fallback quét lại cả các block subscription đã ingest
+    state.last_checked = start_block
+    scanned.clear()
+    run_polling_loop(state, poll_interval=0.2, stop_after=3)
+
+    assert scanned and scanned[0][0] == start_block + 1
+    assert state.last_checked == head - CONFIRMATION_DEPTH
+    stored = _stored(tx_hashes)
+    assert sorted(stored) == sorted(tx_hashes)
+    assert len(stored) == len(set(stored)) == 3
+    with Session(engine) as session:
+        rows = session.exec(select(Donation).where(Donation.tx_hash.in_(tx_hashes))).all()
+    assert sum(int(r.amount_wei) for r in rows) == Web3.to_wei("1.75", "ether")